@@ -1,17 +1,29 @@
-﻿import os
+﻿import asyncio
+import os
 import pathlib
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 
+from backend.cache import build_cache_from_env, make_cache_key
 from backend.extractor import IDCardExtractor
-from backend.contracts import router as contracts_router
-from backend.pdf import ensure_generated_dir
+from backend.ingestion import UnsupportedDocument, ingestion_key
+from backend.contracts import router as contracts_router, run_documents_gc_schedule
+from backend.pdf import shutdown_render_pool
+from backend.prompts import DOC_TYPE_PROMPTS, get_registry
 from backend.database import Base, engine
+from backend.docstore import DOCS_GC_INTERVAL
+from backend.jobs import JobContext, get_pool, register_handler, router as jobs_router
+from backend.metrics import CONTENT_TYPE, MetricsMiddleware, record_cache, render_metrics, stage
+from backend.normalization import normalize_record
 from backend.recruitment import router as recruitment_router
+from backend.search import ensure_search_index
+from backend.settings import get_settings, get_settings_manager
+from backend.static import REVALIDATE, PrecompressedFiles, versioned_html
+from backend.storage import aclose_http_clients
 
 
 app = FastAPI(title="ID Card Extractor", version="1.0.0")
@@ -23,84 +35,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Requêtes en cours et durées par route/étape, exposées sur /metrics
+app.add_middleware(MetricsMiddleware)
 
 load_dotenv()
 EXTRACTOR = IDCardExtractor(prompt_path=os.path.join("prompts", "id_card.prompt.md"))
+EXTRACT_CACHE = build_cache_from_env()
 
 def _load_prompt_for(doc_type: str) -> str:
-    name = {
-        "cni": "id_card.prompt.md",
-        "domicile": "domicile.prompt.md",
-        "secu": "secu.prompt.md",
-    }.get(doc_type, "id_card.prompt.md")
-    p = os.path.join("prompts", name)
-    try:
-        with open(p, "r", encoding="utf-8") as f:
-            return f.read()
-    except Exception:
-        with open(os.path.join("prompts", "id_card.prompt.md"), "r", encoding="utf-8") as f:
-            return f.read()
+    """Prompt préchargé du type de document (ValueError si le type est inconnu)."""
+    return get_registry().for_doc_type(doc_type).text
 
 
 def _normalize_fields(payload: dict) -> dict:
-    if not isinstance(payload, dict):
-        return payload
-    from datetime import datetime
-
-    def to_dd_mm_yyyy(value: str):
-        if not isinstance(value, str):
-            return value
-        raw = value.strip()
-        if not raw:
-            return raw
-        date_part = raw.split("T")[0].split(" ")[0]
-        fmts = [
-            "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d",
-            "%d.%m.%Y", "%Y.%m.%d", "%m/%d/%Y", "%d %m %Y",
-            "%d %b %Y", "%d %B %Y", "%Y%m%d",
-        ]
-        for fmt in fmts:
-            try:
-                dt = datetime.strptime(date_part, fmt)
-                return dt.strftime("%d/%m/%Y")
-            except Exception:
-                pass
-        import re
-        m = re.match(r"^\D*(\d{1,4})\D+(\d{1,2})\D+(\d{1,4})\D*$", date_part)
-        if m:
-            a, b, c = m.groups()
-            if len(a) == 4:
-                yyyy, mm, dd = a, b.zfill(2), c.zfill(2)
-            elif len(c) == 4:
-                dd, mm, yyyy = a.zfill(2), b.zfill(2), c
-            else:
-                return raw
-            try:
-                dt = datetime.strptime(f"{yyyy}-{mm}-{dd}", "%Y-%m-%d")
-                return dt.strftime("%d/%m/%Y")
-            except Exception:
-                return raw
-        return raw
-    for key in ("nationalite", "nationalité", "nationality"):
-        if key in payload and isinstance(payload[key], str):
-            val_norm = payload[key].strip().upper()
-            if val_norm in ("FRA", "FR"):
-                payload[key] = "Française"
-    # Dates → DD/MM/YYYY
-    date_keys_groups = [
-        ("date_naissance", "date de naissance", "birthdate", "dob"),
-        ("date_debut", "date debut", "start_date"),
-        ("date_expiration", "date expiration", "expiry", "expiration_date"),
-    ]
-    lower_to_key = {k.lower(): k for k in payload.keys()}
-    for group in date_keys_groups:
-        for k in group:
-            lk = k.lower()
-            if lk in lower_to_key:
-                real_key = lower_to_key[lk]
-                payload[real_key] = to_dd_mm_yyyy(payload[real_key])
-                break
-    return payload
+    return normalize_record(payload)
 
 
 @app.get("/health")
@@ -108,46 +56,163 @@ async def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Métriques au format texte Prometheus."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
+async def _extract_document(content: bytes, mime: str, doc_type: str, bypass_cache: bool = False) -> tuple[dict, str | None]:
+    """Extraction (avec cache) + normalisation. Retourne (données, en-tête Cache-Status)."""
+    system_prompt = _load_prompt_for(doc_type)
+    cache_key = make_cache_key(content, doc_type, system_prompt, EXTRACTOR.model, ingestion_key(content, mime))
+    # Backend SQLite: lectures/écritures disque hors de la boucle d'évènements
+    hit = None if bypass_cache else await asyncio.to_thread(EXTRACT_CACHE.get, cache_key)
+    if EXTRACT_CACHE.enabled:
+        record_cache("extract", "bypass" if bypass_cache else ("hit" if hit is not None else "miss"))
+    if hit is not None:
+        data, ttl = hit
+        cache_status = EXTRACT_CACHE.status_header(hit=True, ttl=ttl)
+    else:
+        data = await EXTRACTOR.aextract(content, mime, system_prompt=system_prompt, doc_type=doc_type)
+        stored = await asyncio.to_thread(EXTRACT_CACHE.set, cache_key, data)
+        cache_status = EXTRACT_CACHE.status_header(hit=False, stored=stored, bypass=bypass_cache)
+    with stage("normalize"):
+        data = _normalize_fields(data)
+    return data, (cache_status if EXTRACT_CACHE.enabled else None)
+
+
 @app.post("/extract")
-async def extract(file: UploadFile = File(...), doc_type: str = Form("cni")):
-    content = await file.read()
+async def extract(request: Request, file: UploadFile = File(...), doc_type: str = Form("cni")):
+    async with stage("upload_read"):
+        content = await file.read()
     if not content:
         raise HTTPException(status_code=400, detail="Fichier vide")
 
     mime = file.content_type or ""
+    if doc_type not in DOC_TYPE_PROMPTS:
+        raise HTTPException(status_code=400, detail=f"doc_type inconnu: {doc_type} ({', '.join(DOC_TYPE_PROMPTS)})")
 
     try:
-        system_prompt = _load_prompt_for(doc_type)
-        data = EXTRACTOR.extract(content, mime, system_prompt=system_prompt)
-        data = _normalize_fields(data)
-        return JSONResponse(content={"success": True, "data": data})
+        bypass = "no-cache" in (request.headers.get("cache-control") or "").lower()
+        data, cache_status = await _extract_document(content, mime, doc_type, bypass_cache=bypass)
+        headers = {"Cache-Status": cache_status} if cache_status else None
+        return JSONResponse(content={"success": True, "data": data}, headers=headers)
+    except UnsupportedDocument as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@register_handler("extract")
+async def _extract_job(job: dict, files: list, ctx: JobContext) -> dict:
+    """Travail asynchrone: params {"doc_type": "cni"} ou {"doc_types": ["cni", "secu", ...]}."""
+    params = job["params"]
+    doc_types = params.get("doc_types") or []
+
+    async def one(i: int, f: dict) -> dict:
+        doc_type = doc_types[i] if i < len(doc_types) else params.get("doc_type", "cni")
+        item = {"index": i, "fichier": f["filename"], "doc_type": doc_type}
+        try:
+            data, _ = await _extract_document(f["content"], f["mime"], doc_type)
+            item.update(success=True, data=data)
+        except Exception as e:
+            item.update(success=False, error=str(e))
+        await ctx.item_done(item)
+        return item
+
+    items = await asyncio.gather(*(one(i, f) for i, f in enumerate(files)))
+    return {"items": list(items)}
+
+
 # Mount des fichiers statiques en dernier pour ne pas intercepter les routes API
 BASE_DIR = pathlib.Path(__file__).parent.parent
 frontend_dir = BASE_DIR / "frontend"
 
+# Assets précompressés, versionnés (?v=) et cache navigateur; index.html revalidé par ETag
+assets_dir = frontend_dir / "assets"
+FRONTEND_ASSETS = PrecompressedFiles(str(assets_dir), url_prefix="/assets")
+FRONTEND_PAGES = PrecompressedFiles(str(frontend_dir), transform=versioned_html(FRONTEND_ASSETS), preload=False)
+FRONTEND_PAGES.get("index.html")
+
+
 @app.get("/")
-async def read_root():
+async def read_root(request: Request):
     """Serve index.html à la racine"""
-    return FileResponse(str(frontend_dir / "index.html"))
+    return FRONTEND_PAGES.response(request, "index.html", cache_control=REVALIDATE)
 
 # API Contracts
 app.include_router(contracts_router)
 app.include_router(recruitment_router)
+app.include_router(jobs_router)
 
 # Serve generated files
-generated_dir = ensure_generated_dir()
+generated_dir = get_settings().generated_dir
 app.mount("/files", StaticFiles(directory=str(generated_dir)), name="files")
 
 # Serve frontend static assets (images, CSS, JS)
-assets_dir = frontend_dir / "assets"
-app.mount("/assets", StaticFiles(directory=str(assets_dir)), name="assets")
+app.mount("/assets", FRONTEND_ASSETS, name="assets")
 
 
 @app.on_event("startup")
 def on_startup() -> None:
     # Crée les tables si elles n'existent pas (au démarrage de l'app)
     Base.metadata.create_all(bind=engine)
+    # Index de recherche des contrats (création + rattrapage des lignes manquantes)
+    ensure_search_index(engine)
+
+
+@app.on_event("startup")
+def watch_settings() -> None:
+    # Configuration déjà chargée à l'import; rechargement sur SIGHUP et sur modification de config.json
+    manager = get_settings_manager()
+    manager.start_watcher()
+    manager.install_sighup()
+
+
+@app.on_event("shutdown")
+def stop_settings_watcher() -> None:
+    get_settings_manager().stop_watcher()
+
+
+@app.on_event("startup")
+def load_prompts() -> None:
+    # Préchargement (erreur au démarrage plutôt qu'à la première requête) + rechargement à chaud
+    get_registry().start_watcher()
+
+
+@app.on_event("shutdown")
+def stop_prompts_watcher() -> None:
+    get_registry().stop_watcher()
+
+
+@app.on_event("startup")
+async def start_job_workers() -> None:
+    get_pool().start()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers() -> None:
+    await get_pool().stop()
+    shutdown_render_pool()
+
+
+_docs_gc_task = None
+
+
+@app.on_event("startup")
+async def start_documents_gc() -> None:
+    global _docs_gc_task
+    if DOCS_GC_INTERVAL > 0:
+        _docs_gc_task = asyncio.create_task(run_documents_gc_schedule(DOCS_GC_INTERVAL))
+
+
+@app.on_event("shutdown")
+async def stop_documents_gc() -> None:
+    if _docs_gc_task is not None:
+        _docs_gc_task.cancel()
+
+
+@app.on_event("shutdown")
+async def close_storage_clients() -> None:
+    await aclose_http_clients()
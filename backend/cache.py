@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Protocol, Tuple
+
+
+# Cache des résultats d'extraction: une même pièce (CNI, justificatif...) est
+# souvent ré-uploadée plusieurs fois; la clé dépend du contenu exact du fichier,
+# du type de document, du prompt, du modèle et du chemin d'ingestion (type
+# détecté, texte PDF ou images: voir ingestion.ingestion_key), donc toute
+# modification de l'un d'eux invalide naturellement les anciennes entrées.
+
+
+def make_cache_key(file_bytes: bytes, doc_type: str, prompt: str, model: str, ingestion: str = "") -> str:
+    h = hashlib.sha256()
+    for part in (doc_type.encode("utf-8"), prompt.encode("utf-8"), model.encode("utf-8"), ingestion.encode("utf-8")):
+        # Préfixe de longueur pour éviter les collisions par concaténation
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    h.update(hashlib.sha256(file_bytes).digest())
+    return h.hexdigest()
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Retourne (valeur JSON, secondes restantes) ou None."""
+        ...
+
+    def set(self, key: str, value: str) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+
+class MemoryCacheBackend:
+    """LRU en mémoire, borné en nombre d'entrées, avec expiration (TTL)."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 86400.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value, expires_at - now
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCacheBackend:
+    """Cache persistant sur disque (partagé entre workers d'une même machine).
+
+    Méthodes bloquantes: à appeler hors de la boucle d'évènements. Le ménage
+    (entrées expirées, surplus au-delà de max_entries) n'est pas fait à chaque
+    écriture: le nombre d'entrées est suivi localement et la table n'est
+    recomptée que lorsqu'il dépasse max_entries (elle est alors ramenée à 90 %)
+    ou toutes les `prune_interval` secondes, écritures des autres workers comprises.
+    """
+
+    def __init__(
+        self, path: str = "extract_cache.db", max_entries: int = 5000, ttl: float = 86400.0, prune_interval: float = 60.0
+    ) -> None:
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.prune_interval = float(prune_interval)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_extraction_cache_last_access ON extraction_cache (last_access)"
+        )
+        with self._lock:
+            self._prune(time.time())
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE extraction_cache SET last_access = ? WHERE key = ?", (now, key))
+            return value, expires_at - now
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            # Majorant (un remplacement compte aussi): corrigé au prochain ménage
+            self._count += 1
+            if self._count > self.max_entries or time.monotonic() - self._pruned_at >= self.prune_interval:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        self._conn.execute("DELETE FROM extraction_cache WHERE expires_at <= ?", (now,))
+        count = self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+        if count > self.max_entries:
+            # Marge sous la limite: pas de nouveau ménage à l'écriture suivante
+            keep = self.max_entries - self.max_entries // 10
+            self._conn.execute(
+                "DELETE FROM extraction_cache WHERE key IN ("
+                " SELECT key FROM extraction_cache ORDER BY last_access ASC LIMIT ?)",
+                (count - keep,),
+            )
+            count = keep
+        self._count = count
+        self._pruned_at = time.monotonic()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM extraction_cache")
+            self._count = 0
+
+
+class ExtractionCache:
+    """Façade sérialisant les résultats (dict) pour n'importe quel backend."""
+
+    name = "lab-assist-extract"
+
+    def __init__(self, backend: Optional[CacheBackend]) -> None:
+        self.backend = backend
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str) -> Optional[Tuple[dict, float]]:
+        if self.backend is None:
+            return None
+        try:
+            hit = self.backend.get(key)
+        except Exception:
+            return None
+        if hit is None:
+            return None
+        raw, ttl = hit
+        try:
+            # Toujours un nouvel objet: l'appelant peut le normaliser en place
+            return json.loads(raw), ttl
+        except Exception:
+            return None
+
+    def set(self, key: str, value: dict) -> bool:
+        if self.backend is None or not isinstance(value, dict) or "raw" in value:
+            # On ne met pas en cache une réponse non-JSON du modèle
+            return False
+        try:
+            self.backend.set(key, json.dumps(value, ensure_ascii=False))
+            return True
+        except Exception:
+            return False
+
+    def status_header(self, hit: bool, ttl: float | None = None, stored: bool = False, bypass: bool = False) -> str:
+        # Format RFC 9211 (Cache-Status)
+        if hit:
+            return f"{self.name}; hit; ttl={int(ttl or 0)}"
+        if bypass:
+            return f"{self.name}; fwd=request"
+        return f"{self.name}; fwd=miss" + ("; stored" if stored else "")
+
+
+def build_cache_from_env() -> ExtractionCache:
+    kind = (os.getenv("EXTRACT_CACHE_BACKEND") or "memory").strip().lower()
+    ttl = float(os.getenv("EXTRACT_CACHE_TTL") or 86400)
+    max_entries = int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES") or 512)
+    if kind in ("none", "off", "disabled", "0"):
+        return ExtractionCache(None)
+    if kind == "sqlite":
+        path = os.getenv("EXTRACT_CACHE_PATH") or "extract_cache.db"
+        return ExtractionCache(SQLiteCacheBackend(path=path, max_entries=max_entries, ttl=ttl))
+    return ExtractionCache(MemoryCacheBackend(max_entries=max_entries, ttl=ttl))
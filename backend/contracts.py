@@ -1,29 +1,55 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import csv
 import json
+import logging
+import os
+import zlib
+from datetime import date, datetime, time, timedelta
 from io import StringIO
-from typing import Optional
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import select, func, text, tuple_, update
 from sqlalchemy.orm import Session
 
-from .database import get_db
+from .database import SessionLocal, get_db
+from .docstore import DOCS_GC_INTERVAL, DOCS_RETENTION_DAYS, DocumentStore, etag_for
+from .jobs import JobContext, register_handler, submit
+from .metrics import stage
 from .models import Contract
-from .schemas import ContractCreate, ContractRead, ContractsListResponse
-from .pdf import generate_contract_pdf, ensure_generated_dir
+from .schemas import (
+    ContractBulkItemResult,
+    ContractCreate,
+    ContractRead,
+    ContractsBulkCreate,
+    ContractsBulkResponse,
+    ContractsListResponse,
+)
+from .pdf import (
+    agenerate_contract_pdf,
+    generate_contract_pdf,
+    generate_contract_pdfs,
+    render_contract_pdf,
+)
+from .search import search_filter
+from .settings import Settings, get_settings
+from .static import etag_matches
 
 
 # Création des tables déplacée dans l'événement startup de l'application
 
+logger = logging.getLogger(__name__)
+
 
 router = APIRouter(prefix="/contracts", tags=["contracts"])
 
 
-@router.post("", response_model=ContractRead)
-def create_contract(payload: ContractCreate, db: Session = Depends(get_db)):
-    c = Contract(
+def _new_contract(payload: ContractCreate) -> Contract:
+    return Contract(
         store=payload.store,
         prenom=payload.prenom,
         nom=payload.nom,
@@ -35,12 +61,10 @@ def create_contract(payload: ContractCreate, db: Session = Depends(get_db)):
         date_debut=payload.date_debut,
         status="created",
     )
-    db.add(c)
-    db.commit()
-    db.refresh(c)
 
-    # Generate PDF and update record
-    data = {
+
+def _pdf_data(c: Contract) -> dict:
+    return {
         "id": c.id,
         "store": c.store,
         "prenom": c.prenom,
@@ -52,27 +76,174 @@ def create_contract(payload: ContractCreate, db: Session = Depends(get_db)):
         "numero_secu": c.numero_secu,
         "date_debut": c.date_debut,
     }
+
+
+@router.post("", response_model=ContractRead)
+def create_contract(
+    payload: ContractCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    defer: bool = Query(False, description="Rendu du PDF en arrière-plan (statut created -> rendering -> generated/failed)"),
+):
+    c = _new_contract(payload)
+    db.add(c)
+    with stage("db_commit"):
+        db.commit()
+    db.refresh(c)
+
+    if defer:
+        _enqueue_render(c.id, response)
+        return _to_read(c)
+
+    # Generate PDF and update record
     try:
-        pdf_path = generate_contract_pdf(data)
+        pdf_path = generate_contract_pdf(_pdf_data(c))
         c.generated_doc_path = pdf_path
         c.status = "generated"
         db.add(c)
-        db.commit()
+        with stage("db_commit"):
+            db.commit()
         db.refresh(c)
     except Exception as e:
         # Remonte une erreur claire au client (JSON) et n'expose pas de fallback
-        from fastapi import HTTPException
         raise HTTPException(status_code=400, detail=str(e))
 
-    # Expose a URL path for the client
-    from pathlib import Path
-    gen_dir = ensure_generated_dir()
+    return _to_read(c)
+
+
+# --- Rendu différé ---
+
+def _enqueue_render(contract_id: int, response: Response) -> str:
+    job_id = submit("render_contract", {"contract_id": contract_id}, total=1)
+    # Suivi détaillé (tentatives, erreur) via GET /jobs/{id}
+    response.headers["X-Render-Job"] = job_id
+    response.status_code = 202
+    return job_id
+
+
+def _set_render_state(contract_id: int, status: str, pdf_path: Optional[str] = None) -> Optional[dict]:
+    """Met à jour le statut; retourne les données de rendu du contrat (None s'il n'existe plus)."""
+    db = SessionLocal()
     try:
-        rel = Path(pdf_path).resolve().relative_to(gen_dir.resolve())
-        url = f"/files/{rel.as_posix()}"
+        c = db.get(Contract, contract_id)
+        if c is None:
+            return None
+        c.status = status
+        if pdf_path is not None:
+            c.generated_doc_path = pdf_path
+        data = _pdf_data(c)
+        db.commit()
+        return data
+    finally:
+        db.close()
+
+
+@register_handler("render_contract", public=False, max_attempts=3)
+async def _render_contract_job(job: dict, files: List[dict], ctx: JobContext) -> dict:
+    contract_id = int(job["params"]["contract_id"])
+    data = await asyncio.to_thread(_set_render_state, contract_id, "rendering")
+    if data is None:
+        return {"contract_id": contract_id, "status": "deleted"}
+    try:
+        pdf_path = await agenerate_contract_pdf(data)
     except Exception:
-        url = None
+        # Dernière tentative: échec définitif; sinon le travail sera rejoué
+        last = job["attempts"] >= job["max_attempts"]
+        await asyncio.to_thread(_set_render_state, contract_id, "failed" if last else "created")
+        raise
+    await asyncio.to_thread(_set_render_state, contract_id, "generated", pdf_path)
+    await ctx.item_done({"index": 0, "contract_id": contract_id, "success": True})
+    return {"contract_id": contract_id, "status": "generated", "generated_doc_url": _doc_url(pdf_path)}
+
+
+@router.post("/{contract_id}/render", response_model=ContractRead, status_code=202)
+def render_contract(contract_id: int, response: Response, db: Session = Depends(get_db)):
+    """(Re)lance le rendu en arrière-plan, p.ex. après un statut failed."""
+    c = db.get(Contract, contract_id)
+    if not c:
+        raise HTTPException(status_code=404, detail="Contrat introuvable")
+    if c.status == "rendering":
+        raise HTTPException(status_code=409, detail="Rendu déjà en cours")
+    c.status = "created"
+    db.commit()
+    db.refresh(c)
+    _enqueue_render(c.id, response)
+    return _to_read(c)
+
+
+@register_handler("gc_documents", public=False)
+async def _gc_documents_job(job: dict, files: List[dict], ctx: JobContext) -> dict:
+    retention = float(job["params"].get("retention_days", DOCS_RETENTION_DAYS))
+    store = DocumentStore(get_settings().generated_dir)
+    return await asyncio.to_thread(store.collect_garbage, retention)
+
+
+@router.post("/documents/gc", status_code=202)
+def collect_documents(retention_days: float = Query(DOCS_RETENTION_DAYS, ge=0)):
+    """Supprime les PDF remplacés par un rendu plus récent depuis plus de `retention_days` jours."""
+    job_id = submit("gc_documents", {"retention_days": retention_days})
+    return {"job_id": job_id, "status": "queued"}
+
+
+async def run_documents_gc_schedule(interval: float = DOCS_GC_INTERVAL) -> None:
+    """Met en file un ramassage des documents toutes les `interval` secondes (tâche de fond)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(submit, "gc_documents", {})
+        except Exception:
+            logger.exception("contracts: planification du ramassage des documents impossible")
+
+
+@router.post("/bulk", response_model=ContractsBulkResponse)
+def create_contracts_bulk(payload: ContractsBulkCreate, db: Session = Depends(get_db)):
+    """Crée un lot de contrats (une transaction), rend les PDF en parallèle puis
+    met à jour les statuts en un seul UPDATE groupé."""
+    contracts = [_new_contract(item) for item in payload.items]
+    db.add_all(contracts)
+    db.flush()
+    # Lu avant le commit: après, chaque accès rechargerait la ligne
+    ids = [c.id for c in contracts]
+    pdf_inputs = [_pdf_data(c) for c in contracts]
+    with stage("db_commit"):
+        db.commit()
+
+    rendered = generate_contract_pdfs(pdf_inputs)
+
+    db.execute(
+        update(Contract),
+        [
+            {"id": cid, "status": "generated" if path else "failed", "generated_doc_path": path}
+            for cid, (path, _) in zip(ids, rendered)
+        ],
+    )
+    with stage("db_commit"):
+        db.commit()
+
+    by_id = {c.id: c for c in db.execute(select(Contract).where(Contract.id.in_(ids))).scalars()}
+    items = []
+    for i, (cid, (path, error)) in enumerate(zip(ids, rendered)):
+        items.append(ContractBulkItemResult(index=i, success=path is not None, contract=_to_read(by_id[cid]), error=error))
+    generated = sum(1 for it in items if it.success)
+    return ContractsBulkResponse(items=items, generated=generated, failed=len(items) - generated)
+
 
+def _doc_url(path: Optional[str], base: Optional[str] = None) -> Optional[str]:
+    if not path:
+        return None
+    # Déjà une URL (stockage objet, ou rendu à la demande PDF_SINK=stream)
+    if path.lower().startswith("http") or path.startswith("/contracts/"):
+        return path
+    base = base or get_settings().generated_base
+    full = os.path.abspath(path)
+    if not full.startswith(base + os.sep):
+        return None
+    return "/files/" + full[len(base) + 1:].replace(os.sep, "/")
+
+
+def _to_read(c, base: Optional[str] = None) -> ContractRead:
+    # c: objet Contract ou ligne de projection (mêmes noms de colonnes)
+    # base: generated_base de la configuration, résolu une fois par requête
     return ContractRead(
         id=c.id,
         store=c.store,
@@ -85,103 +256,168 @@ def create_contract(payload: ContractCreate, db: Session = Depends(get_db)):
         numero_secu=c.numero_secu,
         date_debut=c.date_debut,
         status=c.status,
-        generated_doc_url=url,
+        generated_doc_url=_doc_url(c.generated_doc_path, base),
         created_at=c.created_at,
     )
 
 
+def _encode_cursor(created_at: datetime, contract_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), contract_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, contract_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(contract_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+
+def _approximate_total(db: Session) -> Optional[int]:
+    """Estimation sans parcours de table (statistiques du planificateur / rowid max)."""
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            est = db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'contracts'"))
+            if est is not None and est >= 0:
+                return int(est)
+            return None
+        return int(db.scalar(select(func.max(Contract.id))) or 0)
+    except Exception:
+        return None
+
+
+_CONTRACT_COLUMNS = [
+    Contract.id,
+    Contract.store,
+    Contract.prenom,
+    Contract.nom,
+    Contract.date_naissance,
+    Contract.lieu_naissance,
+    Contract.adresse,
+    Contract.nationalite,
+    Contract.numero_secu,
+    Contract.date_debut,
+    Contract.status,
+    Contract.generated_doc_path,
+    Contract.created_at,
+]
+
+
 @router.get("", response_model=ContractsListResponse)
 def list_contracts(
     db: Session = Depends(get_db),
     store: Optional[str] = Query(None),
-    q: Optional[str] = Query(None, description="Recherche texte simple"),
+    q: Optional[str] = Query(None, description="Préfixes nom/prénom/adresse (sans accents) ou NIR complet"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Ignoré si cursor est fourni"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la page précédente"),
+    total_mode: Literal["exact", "approx", "none"] = Query("exact", description="Calcul du total"),
+    settings: Settings = Depends(get_settings),
 ):
-    stmt = select(Contract)
+    filters = []
     if store:
-        stmt = stmt.where(Contract.store == store)
-    if q:
-        like = f"%{q}%"
-        stmt = stmt.where(
-            (Contract.prenom.ilike(like))
-            | (Contract.nom.ilike(like))
-            | (Contract.numero_secu.ilike(like))
-            | (Contract.adresse.ilike(like))
-        )
-    total = db.scalar(select(func.count()).select_from(stmt.subquery()))
-    rows = db.execute(stmt.order_by(Contract.created_at.desc()).limit(limit).offset(offset)).scalars().all()
+        filters.append(Contract.store == store)
+    if q and q.strip():
+        filters.append(search_filter(q))
+
+    total = None
+    if total_mode == "approx" and not filters:
+        total = _approximate_total(db)
+    if total_mode == "exact" or (total_mode == "approx" and total is None):
+        total = db.scalar(select(func.count(Contract.id)).where(*filters)) or 0
+
+    # Pagination par clé (created_at, id): coût constant quelle que soit la profondeur
+    stmt = select(*_CONTRACT_COLUMNS).where(*filters)
+    if cursor:
+        stmt = stmt.where(tuple_(Contract.created_at, Contract.id) < _decode_cursor(cursor))
+    else:
+        stmt = stmt.offset(offset)
+    stmt = stmt.order_by(Contract.created_at.desc(), Contract.id.desc()).limit(limit + 1)
+    rows = db.execute(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    base = settings.generated_base
+    return ContractsListResponse(items=[_to_read(r, base) for r in rows], total=total, next_cursor=next_cursor)
 
-    items = []
-    for c in rows:
-        url = None
-        if c.generated_doc_path:
-            from pathlib import Path
-            gen_dir = ensure_generated_dir()
-            try:
-                rel = Path(c.generated_doc_path).resolve().relative_to(gen_dir.resolve())
-                url = f"/files/{rel.as_posix()}"
-            except Exception:
-                url = None
-        items.append(
-            ContractRead(
-                id=c.id,
-                store=c.store,
-                prenom=c.prenom,
-                nom=c.nom,
-                date_naissance=c.date_naissance,
-                lieu_naissance=c.lieu_naissance,
-                adresse=c.adresse,
-                nationalite=c.nationalite,
-                numero_secu=c.numero_secu,
-                date_debut=c.date_debut,
-                status=c.status,
-                generated_doc_url=url,
-                created_at=c.created_at,
-            )
-        )
-    return ContractsListResponse(items=items, total=total or 0)
+
+_CSV_BATCH_ROWS = 1000
+
+
+def _csv_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace("\n", " ")
+
+
+def _iter_export_rows(stmt):
+    # Session propre au générateur: la réponse est consommée après la fin de la
+    # dépendance get_db. yield_per => curseur serveur (psycopg) / fetchmany par lots.
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=_CSV_BATCH_ROWS))
+        for row in result:
+            yield row
+    finally:
+        db.close()
+
+
+def _iter_csv(rows):
+    buf = StringIO()
+    writer = csv.writer(buf, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow([col.key for col in _CONTRACT_COLUMNS])
+    n = 0
+    for row in rows:
+        writer.writerow([_csv_cell(v) for v in row])
+        n += 1
+        if n % _CSV_BATCH_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _iter_gzip(chunks):
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 => conteneur gzip
+    for chunk in chunks:
+        out = comp.compress(chunk)
+        if out:
+            yield out
+    yield comp.flush()
 
 
 @router.get("/export.csv")
-def export_csv(db: Session = Depends(get_db)):
-    rows = db.execute(select(Contract).order_by(Contract.created_at.desc())).scalars().all()
-    out = StringIO()
-    headers = [
-        "id",
-        "store",
-        "prenom",
-        "nom",
-        "date_naissance",
-        "lieu_naissance",
-        "adresse",
-        "nationalite",
-        "numero_secu",
-        "date_debut",
-        "status",
-        "generated_doc_path",
-        "created_at",
-    ]
-    out.write(",".join(headers) + "\n")
-    for c in rows:
-        vals = [
-            str(c.id),
-            c.store or "",
-            c.prenom or "",
-            c.nom or "",
-            c.date_naissance or "",
-            c.lieu_naissance or "",
-            (c.adresse or "").replace("\n", " "),
-            c.nationalite or "",
-            c.numero_secu or "",
-            c.date_debut or "",
-            c.status or "",
-            c.generated_doc_path or "",
-            c.created_at.isoformat() if c.created_at else "",
-        ]
-        out.write(",".join([f'"{v.replace("\"", "\"\"")}"' for v in vals]) + "\n")
-    out.seek(0)
-    return StreamingResponse(out, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=contracts.csv"})
+def export_csv(
+    store: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None, description="Créés à partir de (YYYY-MM-DD)"),
+    date_to: Optional[date] = Query(None, description="Créés jusqu'au (YYYY-MM-DD, inclus)"),
+    use_gzip: bool = Query(False, alias="gzip"),
+):
+    stmt = select(*_CONTRACT_COLUMNS)
+    if store:
+        stmt = stmt.where(Contract.store == store)
+    if date_from:
+        stmt = stmt.where(Contract.created_at >= datetime.combine(date_from, time.min))
+    if date_to:
+        stmt = stmt.where(Contract.created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+    stmt = stmt.order_by(Contract.created_at.desc(), Contract.id.desc())
+
+    body = _iter_csv(_iter_export_rows(stmt))
+    if use_gzip:
+        return StreamingResponse(
+            _iter_gzip(body),
+            media_type="application/gzip",
+            headers={"Content-Disposition": "attachment; filename=contracts.csv.gz"},
+        )
+    return StreamingResponse(body, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=contracts.csv"})
 
 
 @router.get("/{contract_id}", response_model=ContractRead)
@@ -189,29 +425,49 @@ def get_contract(contract_id: int, db: Session = Depends(get_db)):
     c = db.get(Contract, contract_id)
     if not c:
         raise HTTPException(status_code=404, detail="Contrat introuvable")
-    url = None
-    if c.generated_doc_path:
-        from pathlib import Path
-        gen_dir = ensure_generated_dir()
-        try:
-            rel = Path(c.generated_doc_path).resolve().relative_to(gen_dir.resolve())
-            url = f"/files/{rel.as_posix()}"
-        except Exception:
-            url = None
-    return ContractRead(
-        id=c.id,
-        store=c.store,
-        prenom=c.prenom,
-        nom=c.nom,
-        date_naissance=c.date_naissance,
-        lieu_naissance=c.lieu_naissance,
-        adresse=c.adresse,
-        nationalite=c.nationalite,
-        numero_secu=c.numero_secu,
-        date_debut=c.date_debut,
-        status=c.status,
-        generated_doc_url=url,
-        created_at=c.created_at,
-    )
+    return _to_read(c)
 
 
+@router.get("/{contract_id}/pdf")
+def get_contract_pdf(
+    contract_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings),
+):
+    """PDF du contrat: document conservé s'il existe, sinon rendu en mémoire à la demande.
+
+    Document indexé: ETag = sha256 du contenu (If-None-Match -> 304); Range /
+    If-Range pris en charge (reprise de téléchargement, aperçu page à page).
+    """
+    c = db.get(Contract, contract_id)
+    if not c:
+        raise HTTPException(status_code=404, detail="Contrat introuvable")
+    path = c.generated_doc_path or ""
+    if path.lower().startswith("http"):
+        return RedirectResponse(path, status_code=307)
+    doc = DocumentStore.current(db, contract_id)
+    if doc is not None and os.path.isfile(doc.path):
+        headers = {"ETag": etag_for(doc.sha256), "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), [headers["ETag"]]):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(
+            doc.path,
+            media_type="application/pdf",
+            filename=os.path.basename(doc.path),
+            content_disposition_type="inline",
+            headers=headers,
+        )
+    # Ancien rangement plat (non indexé)
+    if path and _doc_url(path, settings.generated_base) and os.path.isfile(path):
+        return FileResponse(path, media_type="application/pdf", filename=os.path.basename(path), content_disposition_type="inline")
+
+    try:
+        filename, data = render_contract_pdf(_pdf_data(c))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(
+        content=data,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="{filename}"'},
+    )
@@ -1,95 +1,304 @@
 from __future__ import annotations
 
+import asyncio
+import copy
+import hashlib
 import json
-from typing import List
+import re
+import unicodedata
+from typing import Awaitable, Callable, Dict, List, Optional, Union
 
-import fitz  # PyMuPDF
-from docx import Document
-from openai import OpenAI
+from .ingestion import document_parts
+from .llm import get_async_openai_client, get_openai_client, model_slot, run_blocking
+from .metrics import record_usage, stage
+from .prompts import get_registry, prompt_name_from_path
+from .scoring import rank_candidates
 
 
-def _pdf_to_png_bytes_list(pdf_bytes: bytes, max_pages: int = 2) -> List[bytes]:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    images: List[bytes] = []
-    try:
-        page_count = len(doc)
-        for i in range(min(page_count, max_pages)):
-            page = doc[i]
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
-            images.append(pix.tobytes("png"))
-    finally:
-        doc.close()
-    return images
-
-
-def _to_data_url(image_bytes: bytes, mime: str) -> str:
-    import base64
-    b64 = base64.b64encode(image_bytes).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+class CVAnalyzer:
+    def __init__(
+        self,
+        system_prompt_path: str,
+        model: str = "gpt-4o-mini",
+        extract_prompt_path: str = "prompts/cv_extract.prompt.md",
+    ) -> None:
+        # Textes servis par le registre (préchargés, rechargés à chaud)
+        self.system_prompt_name = prompt_name_from_path(system_prompt_path)
+        self.extract_prompt_name = prompt_name_from_path(extract_prompt_path)
+        self.client = get_openai_client()
+        self.aclient = get_async_openai_client()
+        self.model = model
 
+    @property
+    def system_prompt(self) -> str:
+        return get_registry().text(self.system_prompt_name)
 
-def _docx_to_text(docx_bytes: bytes) -> str:
-    from io import BytesIO
-    f = BytesIO(docx_bytes)
-    doc = Document(f)
-    parts = []
-    for p in doc.paragraphs:
-        txt = p.text.strip()
-        if txt:
-            parts.append(txt)
-    return "\n".join(parts)
+    @property
+    def extract_prompt(self) -> str:
+        return get_registry().text(self.extract_prompt_name)
 
+    def build_file_content(self, f: dict) -> List[dict]:
+        # f: {filename, content: bytes, mime: str}; type réel détecté sur le contenu
+        return document_parts(f["content"], filename=f.get("filename"), declared_mime=f.get("mime"), doc_type="cv")
 
-class CVAnalyzer:
-    def __init__(self, system_prompt_path: str, model: str = "gpt-4o-mini") -> None:
-        with open(system_prompt_path, "r", encoding="utf-8") as f:
-            self.system_prompt = f.read()
-        self.client = OpenAI()
-        self.model = model
-
+    @stage("document_prepare")
     def build_messages(self, role: str, criteria_payload: dict, files: List[dict]) -> list:
         # files: list of {filename, content: bytes, mime: str}
         user_content: List[dict] = [
             {"type": "text", "text": json.dumps({"role": role, "criteres": criteria_payload}, ensure_ascii=False)}
         ]
         for f in files:
-            mime = (f.get("mime") or "").lower()
-            name = f.get("filename") or "fichier"
-            if mime == "application/pdf":
-                for b in _pdf_to_png_bytes_list(f["content"], max_pages=2):
-                    user_content.append({"type": "image_url", "image_url": {"url": _to_data_url(b, "image/png")}})
-            elif mime.startswith("image/"):
-                user_content.append({"type": "image_url", "image_url": {"url": _to_data_url(f["content"], mime)}})
-            elif mime in ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"):
-                # Extract text
-                try:
-                    txt = _docx_to_text(f["content"]) or ""
-                    if txt.strip():
-                        user_content.append({"type": "text", "text": f"[DOCX:{name}]\n" + txt[:8000]})
-                except Exception:
-                    pass
-            else:
-                # Unknown -> try include as base64 text marker
-                user_content.append({"type": "text", "text": f"[FICHIER:{name}]"})
+            user_content.extend(self.build_file_content(f))
 
         return [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": user_content},
         ]
 
-    def analyze(self, role: str, criteria_payload: dict, files: List[dict]) -> dict:
-        messages = self.build_messages(role, criteria_payload, files)
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            response_format={"type": "json_object"},
-            messages=messages,
-            temperature=0.0,
-        )
+    @staticmethod
+    @stage("json_parse")
+    def _parse_completion(completion) -> dict:
         content = completion.choices[0].message.content
         try:
             return json.loads(content)
         except Exception:
             return {"raw": content}
 
+    def analyze(self, role: str, criteria_payload: dict, files: List[dict]) -> dict:
+        messages = self.build_messages(role, criteria_payload, files)
+        with stage("model_call"):
+            completion = self.client.chat.completions.create(
+                model=self.model,
+                response_format={"type": "json_object"},
+                messages=messages,
+                temperature=0.0,
+            )
+        record_usage(completion, self.model, "cv_analyze")
+        return rank_analysis(self._parse_completion(completion), criteria_payload)
+
+    async def aanalyze(self, role: str, criteria_payload: dict, files: List[dict]) -> dict:
+        # Rendu PDF / lecture DOCX dans le pool de threads, appel modèle asynchrone
+        messages = await run_blocking(self.build_messages, role, criteria_payload, files)
+        async with model_slot():
+            with stage("model_call"):
+                completion = await self.aclient.chat.completions.create(
+                    model=self.model,
+                    response_format={"type": "json_object"},
+                    messages=messages,
+                    temperature=0.0,
+                )
+        record_usage(completion, self.model, "cv_analyze")
+        return rank_analysis(self._parse_completion(completion), criteria_payload)
+
+    # --- Mode lot: une extraction par fichier, puis fusion/scoring locaux ---
+
+    @stage("document_prepare")
+    def build_file_messages(self, role: str, criteria_payload: dict, f: dict) -> Optional[list]:
+        parts = self.build_file_content(f)
+        if not parts:
+            return None
+        header = {"role": role, "criteres": criteria_payload, "fichier": f.get("filename") or "fichier"}
+        return [
+            {"role": "system", "content": self.extract_prompt},
+            {"role": "user", "content": [{"type": "text", "text": json.dumps(header, ensure_ascii=False)}, *parts]},
+        ]
+
+    async def aextract_candidate(self, role: str, criteria_payload: dict, f: dict) -> dict:
+        name = f.get("filename") or "fichier"
+        messages = await run_blocking(self.build_file_messages, role, criteria_payload, f)
+        if messages is None:
+            raise ValueError("Document illisible ou vide")
+        async with model_slot():
+            with stage("model_call"):
+                completion = await self.aclient.chat.completions.create(
+                    model=self.model,
+                    response_format={"type": "json_object"},
+                    messages=messages,
+                    temperature=0.0,
+                )
+        record_usage(completion, self.model, "cv_extract")
+        data = self._parse_completion(completion)
+        if "raw" in data:
+            raise ValueError("Réponse non JSON du modèle")
+        # Le modèle peut renvoyer {"candidat": {...}} ou directement l'objet
+        cand = data.get("candidat") if isinstance(data.get("candidat"), dict) else data
+        meta = cand.get("meta_document") if isinstance(cand.get("meta_document"), dict) else {}
+        meta["source_fichiers"] = [name]
+        cand["meta_document"] = meta
+        return cand
+
+    def extraction_context(self, role: str, criteria_payload: dict) -> str:
+        """Empreinte de tout ce qui, hors fichier, influence une extraction par fichier."""
+        h = hashlib.sha256()
+        h.update(json.dumps([self.model, self.extract_prompt, role, sorted(criteria_payload)], ensure_ascii=False).encode("utf-8"))
+        return h.hexdigest()
+
+    async def aextract_candidates(
+        self,
+        role: str,
+        criteria_payload: dict,
+        files: List[dict],
+        concurrency: int = 8,
+        known: Optional[Dict[str, dict]] = None,
+        on_result: Optional[Callable[[int, dict, Union[dict, BaseException]], Awaitable[None]]] = None,
+    ) -> List[Union[dict, BaseException]]:
+        """Extrait chaque fichier en parallèle (`concurrency` au plus).
+
+        `known` associe un sha256 de fichier à une extraction déjà connue: ces
+        fichiers ne sont pas renvoyés au modèle. Le résultat est aligné sur
+        `files`; un fichier en échec y figure sous forme d'exception.
+        `on_result(index, fichier, résultat)` est attendu à chaque fichier terminé.
+        """
+        sem = asyncio.Semaphore(max(1, concurrency))
+        known = known or {}
+
+        async def extract_one(f: dict):
+            cached = known.get(f.get("sha256") or "")
+            if cached is not None:
+                return copy.deepcopy(cached)
+            async with sem:
+                return await self.aextract_candidate(role, criteria_payload, f)
+
+        async def one(i: int, f: dict):
+            try:
+                res = await extract_one(f)
+            except Exception as e:
+                res = e
+            if on_result is not None:
+                await on_result(i, f, res)
+            if isinstance(res, BaseException):
+                raise res
+            return res
+
+        return await asyncio.gather(*(one(i, f) for i, f in enumerate(files)), return_exceptions=True)
+
+    async def aanalyze_batch(self, role: str, criteria_payload: dict, files: List[dict], concurrency: int = 8) -> dict:
+        """Analyse un lot de CV fichier par fichier (en parallèle, `concurrency` au plus).
+
+        Un fichier en échec n'invalide pas le lot: il est reporté dans "erreurs".
+        La déduplication et le score sont calculés localement.
+        """
+        results = await self.aextract_candidates(role, criteria_payload, files, concurrency=concurrency)
+        return merge_batch(role, criteria_payload, files, results)
+
+
+_analyzer: Optional[CVAnalyzer] = None
+
+
+def get_cv_analyzer() -> CVAnalyzer:
+    """Analyseur partagé (clients OpenAI et prompts du registre)."""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = CVAnalyzer(system_prompt_path="prompts/cv_analyzer.prompt.md")
+    return _analyzer
+
+
+def merge_batch(role: str, criteria_payload: dict, files: List[dict], results: List[Union[dict, BaseException]]) -> dict:
+    candidates: List[dict] = []
+    errors: List[dict] = []
+    for f, res in zip(files, results):
+        if isinstance(res, BaseException):
+            errors.append({"fichier": f.get("filename") or "fichier", "detail": str(res) or type(res).__name__})
+        else:
+            candidates.append(copy.deepcopy(res))
+
+    ranked = rank_candidates(merge_candidates(candidates), criteria_payload)
+    return {"role": role, "criteres": criteria_payload, "candidats": ranked, "erreurs": errors}
+
+
+def rank_analysis(result: dict, criteria_payload: dict) -> dict:
+    """Mode appel unique: score et ordre recalculés localement à partir des champs
+    structurés et des "evaluations" du modèle, comme en mode lot. Un re-classement
+    (/recruitment/rescore) avec les mêmes coefficients redonne donc le même ordre."""
+    if isinstance(result, dict) and isinstance(result.get("candidats"), list):
+        candidates = [c for c in result["candidats"] if isinstance(c, dict)]
+        result["candidats"] = rank_candidates(candidates, criteria_payload)
+        result["criteres"] = criteria_payload
+    return result
+
+
+def _fold(value) -> str:
+    if not isinstance(value, str):
+        return ""
+    txt = unicodedata.normalize("NFKD", value)
+    txt = "".join(ch for ch in txt if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", txt).strip().lower()
+
+
+def _phone_key(value) -> str:
+    digits = re.sub(r"\D", "", value or "") if isinstance(value, str) else ""
+    # 9 derniers chiffres: identiques avec ou sans indicatif (+33 6... / 06...)
+    return digits[-9:] if len(digits) >= 9 else ""
+
+
+def _dedup_keys(c: dict) -> List[str]:
+    keys = []
+    email = _fold(c.get("email"))
+    if email:
+        keys.append("email:" + email)
+    nom, tel = _fold(c.get("nom")), _phone_key(c.get("telephone"))
+    if nom and tel:
+        keys.append(f"nomtel:{nom}|{tel}")
+    return keys
+
+
+def _merge_pair(a: dict, b: dict) -> dict:
+    out = dict(a)
+    for k, v in b.items():
+        cur = out.get(k)
+        if k == "competences":
+            seen = {_fold(x) for x in (cur or [])}
+            out[k] = list(cur or []) + [x for x in (v or []) if _fold(x) not in seen]
+        elif k in ("diplomes", "langues"):
+            field = "libelle" if k == "diplomes" else "lang"
+            seen = {_fold((x or {}).get(field)) for x in (cur or []) if isinstance(x, dict)}
+            out[k] = list(cur or []) + [x for x in (v or []) if isinstance(x, dict) and _fold(x.get(field)) not in seen]
+        elif k == "experience_annees":
+            nums = [x for x in (cur, v) if isinstance(x, (int, float))]
+            out[k] = max(nums) if nums else None
+        elif k == "telephone":
+            # Privilégier le numéro avec indicatif
+            if not cur or (isinstance(v, str) and v.strip().startswith("+") and not str(cur).strip().startswith("+")):
+                out[k] = v or cur
+        elif k == "meta_document":
+            ma, mb = (cur or {}), (v or {})
+            out[k] = {
+                "source_fichiers": list(ma.get("source_fichiers") or []) + list(mb.get("source_fichiers") or []),
+                "date_cv": ma.get("date_cv") or mb.get("date_cv"),
+            }
+        elif k == "evaluations":
+            ev = dict(cur or {})
+            for ck, cv in (v or {}).items():
+                if isinstance(cv, (int, float)) and (not isinstance(ev.get(ck), (int, float)) or cv > ev[ck]):
+                    ev[ck] = cv
+            out[k] = ev
+        elif cur is None or cur == "" or cur == []:
+            out[k] = v
+    return out
+
 
+def merge_candidates(candidates: List[dict]) -> List[dict]:
+    """Fusionne les candidats partageant le même email OU le même nom+téléphone."""
+    merged: List[dict] = []
+    owner: dict = {}
+    for c in candidates:
+        keys = _dedup_keys(c)
+        targets = sorted({owner[k] for k in keys if k in owner})
+        if not targets:
+            idx = len(merged)
+            merged.append(c)
+        else:
+            idx = targets[0]
+            merged[idx] = _merge_pair(merged[idx], c)
+            # Un fichier peut relier deux groupes déjà constitués
+            for other in targets[1:]:
+                if merged[other] is not None:
+                    merged[idx] = _merge_pair(merged[idx], merged[other])
+                    for k, v in list(owner.items()):
+                        if v == other:
+                            owner[k] = idx
+                    merged[other] = None
+        for k in _dedup_keys(merged[idx]):
+            owner[k] = idx
+    return [c for c in merged if c is not None]
 
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+
+from .database import SessionLocal
+from .models import Contract, GeneratedDocument
+
+
+# Stockage local des PDF générés. Au lieu d'un seul dossier plat
+# (generated/contrat_<id>_<ts>.pdf, lent à lister au-delà de quelques dizaines
+# de milliers de fichiers), chaque document est rangé par mois puis par préfixe
+# d'empreinte:
+#
+#   generated/2026/10/3f/contrat_42_20261017_101500.pdf
+#
+# et indexé dans generated_documents (contrat, chemin, taille, sha256). Un
+# nouveau rendu remplace le précédent, qui est supprimé par collect_garbage()
+# une fois la durée de rétention écoulée.
+
+logger = logging.getLogger(__name__)
+
+# Durée de conservation des rendus remplacés (jours)
+DOCS_RETENTION_DAYS = float(os.getenv("DOCS_RETENTION_DAYS") or 30)
+# Intervalle du ramassage planifié (secondes); 0 le désactive (POST /contracts/documents/gc reste possible)
+DOCS_GC_INTERVAL = float(os.getenv("DOCS_GC_INTERVAL") or 86400)
+
+# Préfixe des fichiers de l'ancien rangement plat, à la racine de generated_dir
+_LEGACY_PREFIX = "contrat_"
+
+
+def etag_for(sha256: str) -> str:
+    return f'"{sha256}"'
+
+
+class DocumentStore:
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def shard_dir(self, digest: str, when: datetime) -> Path:
+        return self.root / f"{when:%Y}" / f"{when:%m}" / digest[:2]
+
+    def _write(self, filename: str, data: bytes, when: datetime) -> Tuple[Path, str]:
+        digest = hashlib.sha256(data).hexdigest()
+        folder = self.shard_dir(digest, when)
+        folder.mkdir(parents=True, exist_ok=True)
+        out_path = folder / filename
+        # Écriture atomique: un lecteur ne voit jamais de PDF tronqué
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tmp-", suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, out_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return out_path, digest
+
+    def put_many(self, items: Iterable[Tuple[int, str, bytes]]) -> List[str]:
+        """Écrit et indexe [(contract_id, filename, data)] en une transaction. Retourne les chemins."""
+        now = datetime.utcnow()
+        rows = []
+        written: List[Path] = []
+        try:
+            for contract_id, filename, data in items:
+                path, digest = self._write(filename, data, now)
+                written.append(path)
+                rows.append({"contract_id": contract_id, "path": str(path), "size": len(data), "sha256": digest, "created_at": now})
+            with SessionLocal() as db:
+                ids = [r["contract_id"] for r in rows]
+                if ids:
+                    # Même chemin réécrit (même nom et même contenu): l'ancienne ligne
+                    # désignerait le nouveau fichier, le ramassage le supprimerait
+                    db.execute(delete(GeneratedDocument).where(GeneratedDocument.path.in_([r["path"] for r in rows])))
+                    db.execute(
+                        update(GeneratedDocument)
+                        .where(GeneratedDocument.contract_id.in_(ids), GeneratedDocument.superseded_at.is_(None))
+                        .values(superseded_at=now)
+                    )
+                    db.execute(GeneratedDocument.__table__.insert(), rows)
+                db.commit()
+        except BaseException:
+            # Fichier sans ligne d'index: jamais servi ni ramassé, on ne le garde pas
+            for path in written:
+                path.unlink(missing_ok=True)
+            raise
+        return [r["path"] for r in rows]
+
+    def put(self, contract_id: int, filename: str, data: bytes) -> str:
+        return self.put_many([(contract_id, filename, data)])[0]
+
+    @staticmethod
+    def current(db, contract_id: int) -> Optional[GeneratedDocument]:
+        """Dernier rendu indexé du contrat (None: aucun, ou ancien rangement plat)."""
+        return db.execute(
+            select(GeneratedDocument)
+            .where(GeneratedDocument.contract_id == contract_id, GeneratedDocument.superseded_at.is_(None))
+            .order_by(GeneratedDocument.id.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+
+    def collect_garbage(self, retention_days: float = DOCS_RETENTION_DAYS, batch_size: int = 500) -> dict:
+        """Supprime les rendus remplacés depuis plus de `retention_days` jours, et les
+        fichiers de l'ancien rangement plat qui ne sont plus référencés par aucun contrat."""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        stats = {"documents": 0, "bytes": 0, "legacy_files": 0}
+
+        with SessionLocal() as db:
+            while True:
+                rows = db.execute(
+                    select(GeneratedDocument.id, GeneratedDocument.path, GeneratedDocument.size)
+                    .where(GeneratedDocument.superseded_at.is_not(None), GeneratedDocument.superseded_at < cutoff)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                for _, path, size in rows:
+                    try:
+                        os.unlink(path)
+                        stats["bytes"] += size
+                    except FileNotFoundError:
+                        pass
+                db.execute(delete(GeneratedDocument).where(GeneratedDocument.id.in_([r[0] for r in rows])))
+                db.commit()
+                stats["documents"] += len(rows)
+
+            # Ancien rangement: seuls les fichiers plats non référencés et assez anciens
+            referenced = {
+                os.path.abspath(p)
+                for (p,) in db.execute(select(Contract.generated_doc_path).where(Contract.generated_doc_path.is_not(None)))
+            }
+        if self.root.is_dir():
+            limit = time.time() - retention_days * 86400
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if not (entry.is_file() and entry.name.startswith(_LEGACY_PREFIX) and entry.name.endswith(".pdf")):
+                        continue
+                    st = entry.stat()
+                    if st.st_mtime < limit and os.path.abspath(entry.path) not in referenced:
+                        os.unlink(entry.path)
+                        stats["legacy_files"] += 1
+                        stats["bytes"] += st.st_size
+
+        logger.info(
+            "docstore: %d document(s) remplacé(s) et %d fichier(s) plat(s) supprimés (%d o)",
+            stats["documents"], stats["legacy_files"], stats["bytes"],
+        )
+        return stats
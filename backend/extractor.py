@@ -2,8 +2,10 @@
 import json
 from typing import List
 
-import fitz  # PyMuPDF
-from openai import OpenAI
+from .ingestion import document_parts
+from .llm import get_async_openai_client, get_openai_client, model_slot, run_blocking
+from .metrics import record_usage, stage
+from .prompts import get_registry, prompt_name_from_path
 
 
 class IDCardExtractor:
@@ -12,63 +14,64 @@ class IDCardExtractor:
     """
 
     def __init__(self, prompt_path: str, model: str = "gpt-4o-mini") -> None:
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            self.system_prompt = f.read()
-        # Le client lira OPENAI_API_KEY dans les variables d'environnement
-        self.client = OpenAI()
+        # Prompt par défaut, servi par le registre (préchargé, rechargé à chaud)
+        self.prompt_name = prompt_name_from_path(prompt_path)
+        # Clients partagés (voir backend/llm.py)
+        self.client = get_openai_client()
+        self.aclient = get_async_openai_client()
         self.model = model
 
-    @staticmethod
-    def _to_data_url(image_bytes: bytes, mime: str) -> str:
-        import base64
-        b64 = base64.b64encode(image_bytes).decode("utf-8")
-        return f"data:{mime};base64,{b64}"
+    @property
+    def system_prompt(self) -> str:
+        return get_registry().text(self.prompt_name)
 
-    @staticmethod
-    def _pdf_to_png_bytes_list(pdf_bytes: bytes, max_pages: int = 2) -> List[bytes]:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        images: List[bytes] = []
-        try:
-            page_count = len(doc)
-            for i in range(min(page_count, max_pages)):
-                page = doc[i]
-                # Rendu 2x pour une meilleure lisibilitÃ©
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
-                images.append(pix.tobytes("png"))
-        finally:
-            doc.close()
-        return images
+    @stage("document_prepare")
+    def _file_to_image_contents(self, file_bytes: bytes, mime: str, doc_type: str = "cni") -> List[dict]:
+        # Type détecté sur le contenu; PDF: pages retenues (texte ou rendu), image: préparée
+        return document_parts(file_bytes, declared_mime=mime, doc_type=doc_type)
 
-    def _file_to_image_contents(self, file_bytes: bytes, mime: str) -> List[dict]:
-        if mime == "application/pdf":
-            pngs = self._pdf_to_png_bytes_list(file_bytes)
-            return [
-                {"type": "image_url", "image_url": {"url": self._to_data_url(b, "image/png")}}
-                for b in pngs
-            ]
-        # Si pas d'image reconnue, fallback JPEG
-        if not mime or not mime.startswith("image/"):
-            mime = "image/jpeg"
-        return [{"type": "image_url", "image_url": {"url": self._to_data_url(file_bytes, mime)}}]
-
-    def extract(self, file_bytes: bytes, mime: str, system_prompt: str | None = None) -> dict:
+    def _build_messages(self, image_contents: List[dict], system_prompt: str | None) -> list:
         user_content = [
             {"type": "text", "text": "Extrait les champs demandés et réponds en JSON strict."},
-            *self._file_to_image_contents(file_bytes, mime),
+            *image_contents,
+        ]
+        return [
+            {"role": "system", "content": system_prompt or self.system_prompt},
+            {"role": "user", "content": user_content},
         ]
 
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt or self.system_prompt},
-                {"role": "user", "content": user_content},
-            ],
-            temperature=0.0,
-        )
-
+    @staticmethod
+    @stage("json_parse")
+    def _parse_completion(completion) -> dict:
         content = completion.choices[0].message.content
         try:
             return json.loads(content)
         except json.JSONDecodeError:
             return {"raw": content}
+
+    def extract(self, file_bytes: bytes, mime: str, system_prompt: str | None = None, doc_type: str = "cni") -> dict:
+        messages = self._build_messages(self._file_to_image_contents(file_bytes, mime, doc_type), system_prompt)
+        with stage("model_call"):
+            completion = self.client.chat.completions.create(
+                model=self.model,
+                response_format={"type": "json_object"},
+                messages=messages,
+                temperature=0.0,
+            )
+        record_usage(completion, self.model, "extract")
+        return self._parse_completion(completion)
+
+    async def aextract(self, file_bytes: bytes, mime: str, system_prompt: str | None = None, doc_type: str = "cni") -> dict:
+        """Variante asynchrone: rendu dans le pool de threads, appel modèle non bloquant."""
+        image_contents = await run_blocking(self._file_to_image_contents, file_bytes, mime, doc_type)
+        messages = self._build_messages(image_contents, system_prompt)
+        async with model_slot():
+            with stage("model_call"):
+                completion = await self.aclient.chat.completions.create(
+                    model=self.model,
+                    response_format={"type": "json_object"},
+                    messages=messages,
+                    temperature=0.0,
+                )
+        record_usage(completion, self.model, "extract")
+        return self._parse_completion(completion)
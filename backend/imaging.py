@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import base64
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from .metrics import stage
+
+try:  # optionnel: sans Pillow, les images partent telles quelles (comportement historique)
+    from PIL import Image, ImageChops, ImageOps
+except Exception:  # pragma: no cover
+    Image = None
+
+try:  # optionnel: photos HEIC/HEIF (iPhone), converties en JPEG/WebP avant envoi
+    from pillow_heif import register_heif_opener
+
+    register_heif_opener()
+    HEIF_SUPPORTED = Image is not None
+except Exception:  # pragma: no cover
+    HEIF_SUPPORTED = False
+
+
+# Préparation des images envoyées au modèle vision: une photo de téléphone
+# (4-12 Mpx) n'apporte rien de plus qu'une image de ~1600 px au modèle, mais
+# coûte en upload, en tokens et en latence. Étapes: orientation EXIF, rognage
+# des bordures unies, réduction du grand côté, ré-encodage JPEG/WebP.
+
+logger = logging.getLogger(__name__)
+
+# "low" | "high" | "auto": niveau de détail demandé au modèle
+IMAGE_DETAIL = (os.getenv("IMAGE_DETAIL") or "auto").lower()
+# Grand côté maximal (px) après réduction
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE") or 1600)
+# "jpeg" | "webp"
+IMAGE_FORMAT = (os.getenv("IMAGE_FORMAT") or "jpeg").lower()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY") or 85)
+IMAGE_CROP = (os.getenv("IMAGE_CROP") or "1").lower() not in ("0", "false", "no")
+
+# En détail "low", le modèle ne voit qu'une image 512x512: inutile d'envoyer plus
+LOW_DETAIL_EDGE = 512
+# Rendu PDF: jamais au-delà de 2x (ancien rendu fixe)
+PDF_MAX_ZOOM = 2.0
+# Pages d'un même PDF rendues en parallèle
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS") or 4)
+# Tolérance (0..255) pour considérer une bordure comme unie
+_CROP_TOLERANCE = 24
+
+_MIME = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+_page_executor: Optional[ThreadPoolExecutor] = None
+_page_executor_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+    detail: str = IMAGE_DETAIL
+    max_edge: int = IMAGE_MAX_EDGE
+    fmt: str = IMAGE_FORMAT
+    quality: int = IMAGE_QUALITY
+    crop: bool = IMAGE_CROP
+
+    @property
+    def target_edge(self) -> int:
+        return min(self.max_edge, LOW_DETAIL_EDGE) if self.detail == "low" else self.max_edge
+
+    @property
+    def mime(self) -> str:
+        return _MIME.get(self.fmt, "image/jpeg")
+
+
+DEFAULT_OPTIONS = ImageOptions()
+
+
+@stage("base64_encode")
+def to_data_url(image_bytes: bytes, mime: str) -> str:
+    b64 = base64.b64encode(image_bytes).decode("utf-8")
+    return f"data:{mime};base64,{b64}"
+
+
+def image_part(image_bytes: bytes, mime: str, opts: ImageOptions = DEFAULT_OPTIONS) -> dict:
+    """Bloc "image_url" du message, avec le niveau de détail configuré."""
+    return {"type": "image_url", "image_url": {"url": to_data_url(image_bytes, mime), "detail": opts.detail}}
+
+
+def _crop_borders(img):
+    """Rogne les bordures unies (fond de scanner, table...) autour du document."""
+    corner = img.getpixel((0, 0))
+    bg = Image.new(img.mode, img.size, corner)
+    diff = ImageChops.difference(img, bg).convert("L").point(lambda v: 255 if v > _CROP_TOLERANCE else 0)
+    bbox = diff.getbbox()
+    if not bbox:
+        return img
+    left, top, right, bottom = bbox
+    w, h = img.size
+    # Rognage négligeable, ou trop agressif pour être fiable: on garde l'image entière
+    kept = (right - left) * (bottom - top) / float(w * h)
+    if kept > 0.95 or kept < 0.2:
+        return img
+    pad = max(4, int(0.01 * max(w, h)))
+    return img.crop((max(0, left - pad), max(0, top - pad), min(w, right + pad), min(h, bottom + pad)))
+
+
+def _to_rgb(img):
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, (255, 255, 255))
+        flat.paste(img, mask=img.getchannel("A"))
+        return flat
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def _encode(img, opts: ImageOptions) -> bytes:
+    out = BytesIO()
+    if opts.fmt == "webp":
+        img.save(out, format="WEBP", quality=opts.quality, method=4)
+    else:
+        img.save(out, format="JPEG", quality=opts.quality, optimize=True)
+    return out.getvalue()
+
+
+def _resize(img, opts: ImageOptions):
+    w, h = img.size
+    scale = opts.target_edge / float(max(w, h))
+    if scale >= 1:
+        return img
+    return img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+
+
+@stage("image_prepare")
+def prepare_image(image_bytes: bytes, mime: str, opts: ImageOptions = DEFAULT_OPTIONS) -> Tuple[bytes, str]:
+    """Image prête à envoyer: (octets, mime). En cas d'échec, l'original est renvoyé."""
+    if Image is None:
+        return image_bytes, mime
+    try:
+        with Image.open(BytesIO(image_bytes)) as src:
+            img = ImageOps.exif_transpose(src)
+            size_in = img.size
+            img = _to_rgb(img)
+            if opts.crop:
+                img = _crop_borders(img)
+            img = _resize(img, opts)
+            out = _encode(img, opts)
+    except Exception as e:
+        logger.debug("imaging: image non traitée (%s), envoi de l'original", e)
+        return image_bytes, mime
+    if len(out) >= len(image_bytes) and img.size == size_in and mime in ("image/jpeg", "image/webp", "image/png"):
+        # Déjà compacte, même géométrie: inutile de perdre en qualité
+        return image_bytes, mime
+    logger.info(
+        "imaging: %dx%d %d o -> %dx%d %d o (%s q%d, detail=%s)",
+        size_in[0], size_in[1], len(image_bytes), img.size[0], img.size[1], len(out), opts.fmt, opts.quality, opts.detail,
+    )
+    return out, opts.mime
+
+
+@stage("pdf_rasterize")
+def _render_page(pdf_bytes: bytes, index: int, opts: ImageOptions) -> Tuple[bytes, str]:
+    # Un Document PyMuPDF ne doit pas être partagé entre threads: chaque rendu
+    # ouvre le sien sur les mêmes octets (analyse de la table xref seulement)
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        page = doc[index]
+        zoom = min(PDF_MAX_ZOOM, opts.target_edge / max(page.rect.width, page.rect.height, 1))
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    finally:
+        doc.close()
+    if Image is None:
+        return pix.tobytes("png"), "image/png"
+    img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    out = _encode(img, opts)
+    logger.info(
+        "imaging: page PDF %d -> %dx%d %d o (%s q%d, detail=%s)",
+        index + 1, pix.width, pix.height, len(out), opts.fmt, opts.quality, opts.detail,
+    )
+    return out, opts.mime
+
+
+def _page_pool() -> ThreadPoolExecutor:
+    global _page_executor
+    if _page_executor is None:
+        with _page_executor_lock:
+            if _page_executor is None:
+                _page_executor = ThreadPoolExecutor(max_workers=PDF_PAGE_WORKERS, thread_name_prefix="pdf-page")
+    return _page_executor
+
+
+def pdf_page_images(
+    pdf_bytes: bytes,
+    max_pages: int = 2,
+    opts: ImageOptions = DEFAULT_OPTIONS,
+    pages: Optional[List[int]] = None,
+) -> List[Tuple[bytes, str]]:
+    """Rend les pages demandées (par défaut les `max_pages` premières) à la résolution cible.
+
+    Plusieurs pages sont rendues en parallèle (rastérisation et encodage
+    relâchent en partie le GIL). Retourne [(octets, mime)] dans l'ordre des pages.
+    """
+    if pages is None:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            pages = list(range(min(len(doc), max_pages)))
+        finally:
+            doc.close()
+    if len(pages) <= 1 or PDF_PAGE_WORKERS <= 1:
+        return [_render_page(pdf_bytes, i, opts) for i in pages]
+    # Une copie du contexte par page: les rendus restent attribués à la requête (métriques)
+    ctx = contextvars.copy_context()
+    return list(_page_pool().map(lambda i: ctx.copy().run(_render_page, pdf_bytes, i, opts), pages))
+
+
+def image_parts(file_bytes: bytes, mime: str, max_pages: int = 2, opts: Optional[ImageOptions] = None) -> List[dict]:
+    """Blocs image d'un PDF (pages rendues) ou d'une image (préparée)."""
+    opts = opts or DEFAULT_OPTIONS
+    if mime == "application/pdf":
+        return [image_part(b, m, opts) for b, m in pdf_page_images(file_bytes, max_pages=max_pages, opts=opts)]
+    data, out_mime = prepare_image(file_bytes, mime, opts)
+    return [image_part(data, out_mime, opts)]
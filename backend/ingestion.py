@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import os
+import zipfile
+from io import BytesIO
+from typing import Iterator, List, Optional
+
+from docx import Document
+
+from .imaging import HEIF_SUPPORTED, image_parts
+from . import pdfdoc
+from .pdfdoc import pdf_parts
+
+
+# Ingestion commune des documents envoyés au modèle (pièces d'identité, CV):
+# type réel détecté sur les premiers octets (le content_type du navigateur est
+# souvent vide ou faux), puis blocs de message (texte, images). Un fichier qui
+# ne peut pas être transmis (type inconnu, image non reconnue...) est refusé
+# (UnsupportedDocument) plutôt que remplacé par une simple mention.
+
+PDF = "application/pdf"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MSWORD = "application/msword"
+
+# À incrémenter quand les blocs produits pour un même fichier changent
+# (invalide les résultats d'extraction mis en cache)
+INGESTION_VERSION = 1
+
+# Texte DOCX / texte brut transmis au modèle (caractères)
+DOCX_MAX_CHARS = int(os.getenv("DOCX_MAX_CHARS") or 32000)
+
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+
+def sniff_mime(data: bytes, declared: Optional[str] = None) -> str:
+    """Type MIME d'après la signature du fichier; `declared` n'est qu'un dernier recours."""
+    head = data[:32]
+    if head.startswith(b"%PDF-") or b"%PDF-" in data[:1024]:
+        return PDF
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in _HEIF_BRANDS:
+            return "image/heic"
+        if brand in (b"avif", b"avis"):
+            return "image/avif"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if head[:2] == b"BM":
+        return "image/bmp"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(BytesIO(data)) as z:
+                if "word/document.xml" in z.namelist():
+                    return DOCX
+        except zipfile.BadZipFile:
+            pass
+        return "application/zip"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return MSWORD
+    return (declared or "application/octet-stream").lower()
+
+
+def ingestion_key(data: bytes, declared_mime: Optional[str] = None) -> str:
+    """Ce qui, hors contenu du fichier, détermine les blocs envoyés au modèle:
+    type détecté (couche texte PDF ou images, DOCX...) et réglages du chemin PDF."""
+    mime = sniff_mime(data, declared_mime)
+    key = f"v{INGESTION_VERSION};{mime}"
+    if mime == PDF:
+        key += f";pdf_text={pdfdoc.PDF_TEXT_PATH}:{pdfdoc.PDF_TEXT_MIN_CHARS}"
+    return key
+
+
+def _docx_text(data: bytes, limit: int = DOCX_MAX_CHARS) -> str:
+    """Texte des paragraphes puis des tableaux (CV en colonnes), tronqué à `limit`."""
+    doc = Document(BytesIO(data))
+    out: List[str] = []
+    size = 0
+
+    def lines():
+        for p in doc.paragraphs:
+            yield p.text
+        for table in doc.tables:
+            for row in table.rows:
+                seen = []
+                for cell in row.cells:
+                    # Cellules fusionnées: python-docx renvoie la même cellule plusieurs fois
+                    if cell.text not in seen:
+                        seen.append(cell.text)
+                yield " | ".join(t.strip() for t in seen if t.strip())
+
+    for line in lines():
+        txt = line.strip()
+        if not txt:
+            continue
+        out.append(txt)
+        size += len(txt) + 1
+        if size >= limit:
+            break
+    return "\n".join(out)[:limit]
+
+
+class UnsupportedDocument(ValueError):
+    """Fichier que le pipeline ne sait pas transmettre au modèle (réponse HTTP 400)."""
+
+
+def iter_parts(data: bytes, filename: Optional[str] = None, declared_mime: Optional[str] = None, doc_type: Optional[str] = None) -> Iterator[dict]:
+    """Blocs de message (texte ou image) d'un document.
+
+    Le type est détecté et vérifié dès l'appel (UnsupportedDocument si le
+    fichier ne peut pas être transmis); les blocs sont calculés au premier
+    parcours. Un PDF est traité d'un coup: choix texte / images sur l'ensemble
+    des pages retenues, pages rendues en parallèle.
+    """
+    name = filename or "fichier"
+    mime = sniff_mime(data, declared_mime)
+    if mime == "image/heic" and not HEIF_SUPPORTED:
+        raise UnsupportedDocument(f"{name}: image HEIC non prise en charge sur ce serveur")
+    if mime.startswith("image/") and sniff_mime(data) != mime:
+        # Type annoncé par le navigateur, contenu non reconnu: rien de fiable à envoyer
+        raise UnsupportedDocument(f"{name}: image non reconnue ({mime})")
+    if not (mime in (PDF, DOCX) or mime.startswith(("image/", "text/"))):
+        raise UnsupportedDocument(f"{name}: type de fichier non pris en charge ({mime})")
+    return _parts(data, name, mime, doc_type)
+
+
+def _parts(data: bytes, name: str, mime: str, doc_type: Optional[str]) -> Iterator[dict]:
+    if mime == PDF:
+        parts, _ = pdf_parts(data, doc_type=doc_type)
+        yield from parts
+    elif mime.startswith("image/"):
+        yield from image_parts(data, mime)
+    elif mime == DOCX:
+        try:
+            txt = _docx_text(data)
+        except Exception as e:
+            raise UnsupportedDocument(f"{name}: document Word illisible") from e
+        if not txt.strip():
+            raise UnsupportedDocument(f"{name}: document Word sans texte")
+        yield {"type": "text", "text": f"[DOCX:{name}]\n" + txt}
+    else:
+        txt = data[:DOCX_MAX_CHARS * 4].decode("utf-8", errors="replace")[:DOCX_MAX_CHARS]
+        yield {"type": "text", "text": f"[TEXTE:{name}]\n" + txt}
+
+
+def document_parts(data: bytes, filename: Optional[str] = None, declared_mime: Optional[str] = None, doc_type: Optional[str] = None) -> List[dict]:
+    return list(iter_parts(data, filename=filename, declared_mime=declared_mime, doc_type=doc_type))
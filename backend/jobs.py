@@ -0,0 +1,573 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .metrics import set_endpoint
+
+
+# File de travaux sans broker externe: une base SQLite locale (jobs, fichiers
+# uploadés, évènements de progression) et un pool de workers asyncio dans le
+# process de l'application. Les clients postent un travail, récupèrent un id,
+# puis suivent la progression par polling (GET /jobs/{id}) ou SSE.
+# jobs.db peut être partagé par plusieurs process (workers uvicorn, redémarrage
+# progressif): un travail en cours est tenu par un bail (claimed_by +
+# heartbeat_at) renouvelé pendant son exécution; seuls les baux expirés sont
+# remis en file, périodiquement.
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH") or "jobs.db"
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS") or 4)
+# Au-delà, POST /jobs répond 503 (le client réessaie plus tard)
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED") or 100)
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL") or 1.0)
+# Bail d'un travail en cours (s): sans battement depuis ce délai, il est repris
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS") or 60)
+JOBS_HEARTBEAT_INTERVAL = float(os.getenv("JOBS_HEARTBEAT_INTERVAL") or 15)
+# Période de recherche des baux expirés
+JOBS_REAP_INTERVAL = float(os.getenv("JOBS_REAP_INTERVAL") or 30)
+# Délai avant la 2e tentative (doublé à chaque tentative)
+JOBS_RETRY_BACKOFF = float(os.getenv("JOBS_RETRY_BACKOFF") or 5.0)
+
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class JobQueue:
+    def __init__(self, path: str = JOBS_DB_PATH, worker_id: Optional[str] = None) -> None:
+        self.path = path
+        # Titulaire des baux pris par ce process
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 1,
+                run_after REAL NOT NULL,
+                claimed_by TEXT,
+                heartbeat_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after);
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                filename TEXT,
+                mime TEXT,
+                content BLOB NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS job_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_job_events_job_id ON job_events (job_id, id);
+            """
+        )
+        # Base créée avant les baux
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, decl in (("claimed_by", "TEXT"), ("heartbeat_at", "REAL")):
+            if name not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+                except sqlite3.OperationalError:
+                    # Ajoutée entre-temps par un autre process
+                    pass
+
+    def enqueue(self, kind: str, params: dict, files: List[dict] = (), max_attempts: int = 1, total: Optional[int] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, status, params, total, max_attempts, run_after, created_at, updated_at)"
+                    " VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(params, ensure_ascii=False), len(files) if total is None else total,
+                     max(1, max_attempts), now, now, now),
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_files (job_id, idx, filename, mime, content) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, i, f.get("filename"), f.get("mime"), f["content"]) for i, f in enumerate(files)],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self, kinds: List[str]) -> Optional[dict]:
+        """Passe le plus ancien travail prêt en 'running' sous bail de ce process et le retourne."""
+        if not kinds:
+            return None
+        now = time.time()
+        marks = ",".join("?" for _ in kinds)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? AND kind IN ({marks})"
+                    " ORDER BY run_after, created_at LIMIT 1",
+                    (now, *kinds),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, claimed_by = ?,"
+                        " heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                        (self.worker_id, now, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        job["status"] = "running"
+        job["attempts"] += 1
+        return job
+
+    def load_files(self, job_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename, mime, content FROM job_files WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+        return [{"filename": r["filename"], "mime": r["mime"] or "", "content": bytes(r["content"])} for r in rows]
+
+    def add_event(self, job_id: str, type_: str, data: dict, item_done: bool = False) -> bool:
+        """Publie un évènement. Un résultat partiel (item_done) n'est enregistré que
+        si ce process tient encore le bail; retourne False sinon."""
+        now = time.time()
+        with self._lock:
+            if item_done:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    owned = self._conn.execute(
+                        "UPDATE jobs SET done = done + 1, updated_at = ?"
+                        " WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                        (now, job_id, self.worker_id),
+                    ).rowcount == 1
+                    if owned:
+                        self._insert_event(job_id, type_, data, now)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                return owned
+            self._insert_event(job_id, type_, data, now)
+        return True
+
+    def _insert_event(self, job_id: str, type_: str, data: dict, now: float) -> None:
+        self._conn.execute(
+            "INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, type_, json.dumps(data, ensure_ascii=False), now),
+        )
+
+    def heartbeat(self, job_id: str) -> bool:
+        """Renouvelle le bail; False si le travail a été repris par un autre process."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                (now, job_id, self.worker_id),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: str, result: Any) -> bool:
+        """Termine le travail si ce process tient encore le bail (sinon: False, rien n'est écrit)."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, claimed_by = NULL, updated_at = ?"
+                " WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                (json.dumps(result, ensure_ascii=False), now, job_id, self.worker_id),
+            )
+            if cur.rowcount != 1:
+                return False
+            self._conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+        self.add_event(job_id, "done", {"status": "done"})
+        return True
+
+    def fail(self, job_id: str, error: str, backoff: float = JOBS_RETRY_BACKOFF) -> bool:
+        """Echec d'une tentative; replanifie si des tentatives restent. Retourne True si replanifié.
+
+        Sans effet (False) si le bail a été perdu entre-temps.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                    (job_id, self.worker_id),
+                ).fetchone()
+                retry = row is not None and row["attempts"] < row["max_attempts"]
+                if retry:
+                    delay = backoff * (2 ** max(0, row["attempts"] - 1))
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', error = ?, done = 0, run_after = ?, claimed_by = NULL,"
+                        " heartbeat_at = NULL, updated_at = ? WHERE id = ?",
+                        (error, now + delay, now, job_id),
+                    )
+                    # La tentative suivante republiera ses propres résultats partiels
+                    self._conn.execute("DELETE FROM job_events WHERE job_id = ? AND type = 'item'", (job_id,))
+                elif row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, claimed_by = NULL, updated_at = ? WHERE id = ?",
+                        (error, now, job_id),
+                    )
+                    self._conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+                if row is not None:
+                    self._insert_event(
+                        job_id, "retry" if retry else "failed",
+                        {"status": "queued" if retry else "failed", "error": error}, now,
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return retry
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def events_since(self, job_id: str, last_id: int = 0, types: Optional[List[str]] = None) -> List[dict]:
+        sql = "SELECT id, type, data FROM job_events WHERE job_id = ? AND id > ?"
+        args: list = [job_id, last_id]
+        if types:
+            sql += " AND type IN (" + ",".join("?" for _ in types) + ")"
+            args.extend(types)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id", args).fetchall()
+        return [{"id": r["id"], "type": r["type"], "data": json.loads(r["data"])} for r in rows]
+
+    def queued_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def release(self, job_id: str) -> bool:
+        """Rend un travail interrompu (arrêt du process) sans attendre l'expiration du bail."""
+        return self._requeue("id = ? AND claimed_by = ?", (job_id, self.worker_id), "interrompu") == 1
+
+    def requeue_expired(self, lease: float = JOBS_LEASE_SECONDS) -> int:
+        """Remet en file les travaux 'running' dont le bail n'a pas été renouvelé depuis `lease` s
+        (process arrêté ou bloqué). Les baux vivants, d'où qu'ils viennent, ne sont pas touchés."""
+        # Lignes antérieures aux baux: heartbeat_at NULL, dernier signe de vie = updated_at
+        return self._requeue("COALESCE(heartbeat_at, updated_at) < ?", (time.time() - lease,), "bail expiré")
+
+    def _requeue(self, where: str, args: tuple, reason: str) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [r["id"] for r in self._conn.execute(
+                    f"SELECT id FROM jobs WHERE status = 'running' AND {where}", args
+                ).fetchall()]
+                for job_id in ids:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', done = 0, claimed_by = NULL, heartbeat_at = NULL,"
+                        " updated_at = ? WHERE id = ?",
+                        (now, job_id),
+                    )
+                    # Comme pour une nouvelle tentative: les résultats partiels seront republiés
+                    self._conn.execute("DELETE FROM job_events WHERE job_id = ? AND type = 'item'", (job_id,))
+                    self._insert_event(job_id, "retry", {"status": "queued", "error": reason}, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(ids)
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> dict:
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "params": json.loads(row["params"]),
+            "total": row["total"],
+            "done": row["done"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+
+class JobContext:
+    """Passé aux handlers pour publier l'avancement fichier par fichier."""
+
+    def __init__(self, queue: JobQueue, job: dict) -> None:
+        self.queue = queue
+        self.job = job
+
+    async def item_done(self, data: dict) -> None:
+        # Bail perdu: le résultat n'est pas publié, le travail sera arrêté au prochain battement
+        await asyncio.to_thread(self.queue.add_event, self.job["id"], "item", data, True)
+
+
+Handler = Callable[[dict, List[dict], JobContext], Awaitable[Any]]
+
+_handlers: Dict[str, Handler] = {}
+_public_kinds: set = set()
+
+
+def register_handler(kind: str, public: bool = True, max_attempts: int = 1) -> Callable[[Handler], Handler]:
+    """Déclare le handler d'un type de travail. `public`: soumettable via POST /jobs."""
+
+    def deco(fn: Handler) -> Handler:
+        fn.max_attempts = max_attempts  # type: ignore[attr-defined]
+        _handlers[kind] = fn
+        if public:
+            _public_kinds.add(kind)
+        return fn
+
+    return deco
+
+
+class JobWorkerPool:
+    def __init__(self, queue: JobQueue, workers: int = JOBS_WORKERS) -> None:
+        self.queue = queue
+        self.workers = max(1, workers)
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reap()))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, n: int) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim, list(_handlers))
+            except Exception:
+                logger.exception("jobs: lecture de la file impossible")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(job)
+
+    async def _reap(self) -> None:
+        """Remet périodiquement en file les travaux dont le bail a expiré (tous process confondus)."""
+        while True:
+            try:
+                requeued = await asyncio.to_thread(self.queue.requeue_expired)
+            except Exception:
+                logger.exception("jobs: reprise des baux expirés impossible")
+                requeued = 0
+            if requeued:
+                logger.info("jobs: %d travail(aux) au bail expiré remis en file", requeued)
+                self.notify()
+            await asyncio.sleep(JOBS_REAP_INTERVAL)
+
+    async def _execute(self, job: dict) -> None:
+        handler = _handlers[job["kind"]]
+        # Étapes du travail étiquetées "job:<type>" dans /metrics
+        set_endpoint(f"job:{job['kind']}")
+
+        async def work():
+            files = await asyncio.to_thread(self.queue.load_files, job["id"])
+            return await handler(job, files, JobContext(self.queue, job))
+
+        task = asyncio.create_task(work())
+        try:
+            # Battement du bail tant que le handler tourne
+            while not (await asyncio.wait({task}, timeout=JOBS_HEARTBEAT_INTERVAL))[0]:
+                if not await asyncio.to_thread(self.queue.heartbeat, job["id"]):
+                    logger.warning("jobs: bail perdu pour le travail %s (%s), abandon", job["id"], job["kind"])
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    return
+            result = task.result()
+        except asyncio.CancelledError:
+            # Arrêt du process: le travail est rendu à la file immédiatement
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self.queue.release(job["id"])
+            raise
+        except Exception as e:
+            logger.exception("jobs: échec du travail %s (%s)", job["id"], job["kind"])
+            await asyncio.to_thread(self.queue.fail, job["id"], str(e) or type(e).__name__)
+            return
+        if not await asyncio.to_thread(self.queue.complete, job["id"], result):
+            logger.warning("jobs: bail perdu pour le travail %s (%s), résultat ignoré", job["id"], job["kind"])
+
+
+_queue: Optional[JobQueue] = None
+_pool: Optional[JobWorkerPool] = None
+
+
+def get_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
+
+
+def get_pool() -> JobWorkerPool:
+    global _pool
+    if _pool is None:
+        _pool = JobWorkerPool(get_queue())
+    return _pool
+
+
+def submit(kind: str, params: dict, files: List[dict] = (), total: Optional[int] = None) -> str:
+    """Met un travail en file (utilisable depuis du code serveur, hors HTTP)."""
+    handler = _handlers.get(kind)
+    max_attempts = getattr(handler, "max_attempts", 1) if handler else 1
+    job_id = get_queue().enqueue(kind, params, files, max_attempts=max_attempts, total=total)
+    get_pool().notify()
+    return job_id
+
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _job_view(job: dict, items: List[dict]) -> dict:
+    total = job["total"] or 0
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "total": total,
+        "done": job["done"],
+        "progress": round(job["done"] / total, 3) if total else (1.0 if job["status"] == "done" else 0.0),
+        "items": items,
+        "result": job["result"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+    }
+
+
+@router.post("", status_code=202)
+async def create_job(
+    kind: str = Form(..., description="extract | cv_analyze"),
+    params: str = Form("{}", description="Paramètres JSON propres au type de travail"),
+    files: List[UploadFile] = File(default=[]),
+):
+    if kind not in _public_kinds:
+        raise HTTPException(status_code=400, detail=f"Type de travail inconnu: {kind}")
+    try:
+        params_obj = json.loads(params or "{}")
+        if not isinstance(params_obj, dict):
+            raise ValueError
+    except Exception:
+        raise HTTPException(status_code=400, detail="params doit être un objet JSON")
+
+    queue = get_queue()
+    if await asyncio.to_thread(queue.queued_count) >= JOBS_MAX_QUEUED:
+        # Contre-pression: la file est pleine, le client réessaie plus tard
+        raise HTTPException(status_code=503, detail="File de traitement pleine", headers={"Retry-After": "10"})
+
+    entries = []
+    for uf in files:
+        content = await uf.read()
+        if content:
+            entries.append({"filename": uf.filename, "mime": uf.content_type or "", "content": content})
+    if not entries:
+        raise HTTPException(status_code=400, detail="Aucun fichier valide reçu")
+
+    job_id = await asyncio.to_thread(submit, kind, params_obj, entries)
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "total": len(entries)},
+        headers={"Location": f"/jobs/{job_id}"},
+    )
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    queue = get_queue()
+    job = queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Travail introuvable")
+    items = [e["data"] for e in queue.events_since(job_id, types=["item"])]
+    return _job_view(job, items)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Flux SSE: un évènement 'item' par fichier terminé, puis 'done' ou 'failed'."""
+    queue = get_queue()
+    if await asyncio.to_thread(queue.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Travail introuvable")
+    try:
+        last_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_id = 0
+
+    async def stream():
+        nonlocal last_id
+        idle = 0.0
+        while True:
+            if await request.is_disconnected():
+                return
+            events = await asyncio.to_thread(queue.events_since, job_id, last_id)
+            for ev in events:
+                last_id = ev["id"]
+                yield f"id: {ev['id']}\nevent: {ev['type']}\ndata: {json.dumps(ev['data'], ensure_ascii=False)}\n\n"
+                if ev["type"] in TERMINAL_STATUSES:
+                    return
+            if events:
+                idle = 0.0
+            else:
+                idle += 0.5
+                if idle >= 15:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from openai import AsyncOpenAI, OpenAI
+
+
+# Clients OpenAI partagés par tout le process (pool de connexions HTTP commun)
+# et exécution hors boucle asyncio du travail CPU (rendu PyMuPDF, base64...).
+
+T = TypeVar("T")
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS") or min(8, (os.cpu_count() or 1) + 2))
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY") or 32)
+
+_clients_lock = threading.Lock()
+_sync_client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
+
+_render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+# Un sémaphore par boucle d'évènements (un asyncio.Semaphore est lié à la boucle qui l'utilise)
+_model_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def get_openai_client() -> OpenAI:
+    global _sync_client
+    if _sync_client is None:
+        with _clients_lock:
+            if _sync_client is None:
+                # Le client lira OPENAI_API_KEY dans les variables d'environnement
+                _sync_client = OpenAI()
+    return _sync_client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        with _clients_lock:
+            if _async_client is None:
+                _async_client = AsyncOpenAI()
+    return _async_client
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Exécute une fonction bloquante dans le pool borné de rendu."""
+    loop = asyncio.get_running_loop()
+    # Contexte copié: les mesures faites dans le pool restent attribuées à la requête
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_render_executor, partial(ctx.run, fn, *args, **kwargs))
+
+
+def model_slot() -> asyncio.Semaphore:
+    """Limiteur du nombre d'appels modèle simultanés pour la boucle courante.
+
+    Au-delà de MODEL_CONCURRENCY, les requêtes attendent leur tour sans
+    bloquer la boucle d'évènements (/health, fichiers statiques...). Chaque
+    boucle (serveur, asyncio.run d'un script, client de test) a son propre
+    limiteur, libéré avec elle.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _model_semaphores.get(loop)
+    if semaphore is None:
+        with _clients_lock:
+            semaphore = _model_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = _model_semaphores[loop] = asyncio.Semaphore(MODEL_CONCURRENCY)
+    return semaphore
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Métriques du process au format texte Prometheus (GET /metrics), sans
+# dépendance: compteurs, jauges et histogrammes avec étiquettes.
+#
+# Durées par étape (stage_duration_seconds{stage, endpoint}): lecture de
+# l'upload, préparation du document (rastérisation PDF, base64...), appel
+# modèle, parsing JSON, normalisation, commit base, construction ReportLab,
+# stockage. `stage` s'utilise en gestionnaire de contexte (with / async with)
+# ou en décorateur (fonctions synchrones ou coroutines):
+#
+#     with stage("model_call"):
+#         ...
+#
+#     @stage("pdf_build")
+#     def render(...): ...
+#
+# L'étiquette endpoint est celle de la requête HTTP (ou du travail de fond) en
+# cours. Les rendus exécutés dans le pool de processus PDF comptent dans le
+# process qui les lance (durée mesurée côté appelant).
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Secondes: des lectures de quelques ms aux appels modèle de plusieurs dizaines de secondes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Préfixes de chemins suivis individuellement (requêtes en cours); le reste: "other"
+ENDPOINT_PREFIXES = ("/extract", "/recruitment/analyze", "/recruitment", "/contracts", "/jobs")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: étiquettes attendues {self.labelnames}, reçues {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError(f"{self.name}: un compteur ne peut que croître")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def set_function(self, fn: Callable[[], Dict[LabelValues, float]]) -> None:
+        """Valeurs calculées à chaque lecture de /metrics ({valeurs d'étiquettes: valeur})."""
+        self._function = fn
+
+    def samples(self) -> Iterable[str]:
+        if self._function is not None:
+            items = sorted(self._function().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Par série: [comptes par borne (non cumulés) + dépassement, somme]
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._series.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrique déjà déclarée: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_duration_seconds", "Durée des étapes de traitement", ("stage", "endpoint", "outcome")
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP", ("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "Requêtes HTTP en cours", ("endpoint",))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Tokens consommés (completion.usage)", ("model", "operation", "kind"))
+LLM_CALLS = REGISTRY.counter("llm_requests_total", "Appels au modèle", ("model", "operation"))
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "Consultations de cache", ("cache", "result"))
+CACHE_HIT_RATIO = REGISTRY.gauge("cache_hit_ratio", "Part des consultations servies par le cache", ("cache",))
+
+
+def _hit_ratios() -> Dict[LabelValues, float]:
+    totals: Dict[str, List[float]] = {}
+    with CACHE_REQUESTS._lock:
+        items = list(CACHE_REQUESTS._values.items())
+    for (cache, result), value in items:
+        t = totals.setdefault(cache, [0.0, 0.0])
+        t[1] += value
+        if result == "hit":
+            t[0] += value
+    return {(cache,): (hits / total if total else 0.0) for cache, (hits, total) in totals.items()}
+
+
+CACHE_HIT_RATIO.set_function(_hit_ratios)
+
+
+# --- Endpoint courant (étiquette des étapes) ---
+
+_current_endpoint: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("metrics_endpoint", default=None)
+
+
+def endpoint_group(path: str) -> str:
+    for prefix in ENDPOINT_PREFIXES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return prefix
+    return "other"
+
+
+def current_endpoint() -> str:
+    scope = _current_endpoint.get()
+    if scope is None:
+        return "none"
+    if "metrics_endpoint" in scope:
+        return scope["metrics_endpoint"]
+    # Route résolue par le routeur (même dict de scope que le middleware)
+    route = scope.get("route")
+    return getattr(route, "path", None) or endpoint_group(scope.get("path", ""))
+
+
+def set_endpoint(label: str) -> contextvars.Token:
+    """Étiquette des étapes hors requête HTTP (travaux de fond: "job:<type>")."""
+    return _current_endpoint.set({"metrics_endpoint": label})
+
+
+# --- Étapes ---
+
+class stage:
+    """Chronomètre d'étape: with / async with, ou décorateur."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._t0 = 0.0
+
+    def __enter__(self) -> "stage":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        STAGE_SECONDS.observe(
+            time.perf_counter() - self._t0,
+            stage=self.name,
+            endpoint=current_endpoint(),
+            outcome="error" if exc_type is not None else "ok",
+        )
+
+    async def __aenter__(self) -> "stage":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
+
+    def __call__(self, fn: Callable) -> Callable:
+        name = self.name
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def record_usage(completion, model: str, operation: str) -> None:
+    """Tokens de completion.usage (prompt / completion), si la réponse les fournit."""
+    LLM_CALLS.inc(model=model, operation=operation)
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if isinstance(value, int) and value > 0:
+            LLM_TOKENS.inc(value, model=model, operation=operation, kind=kind[: -len("_tokens")])
+
+
+def record_cache(cache: str, result: str, amount: int = 1) -> None:
+    """result: "hit", "miss" ou "bypass"."""
+    if amount > 0:
+        CACHE_REQUESTS.inc(amount, cache=cache, result=result)
+
+
+# --- Exposition ---
+
+def _pdf_path_families() -> List[str]:
+    # Compteurs cumulés de pdfdoc (chemin texte / hybride / vision)
+    from .pdfdoc import path_stats
+
+    stats = path_stats()
+    lines: List[str] = []
+    for field, name, documentation in (
+        ("documents", "pdf_documents_total", "PDF traités par chemin"),
+        ("pages", "pdf_pages_total", "Pages retenues par chemin"),
+        ("pages_rendered", "pdf_pages_rendered_total", "Pages rastérisées par chemin"),
+        ("text_chars", "pdf_text_chars_total", "Caractères de texte envoyés au modèle par chemin"),
+        ("seconds", "pdf_path_seconds_total", "Temps de préparation cumulé par chemin"),
+    ):
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} counter")
+        for path, values in sorted(stats.items()):
+            lines.append(f"{name}{_format_labels(('path',), (path,))} {_format_value(values[field])}")
+    return lines
+
+
+def render_metrics() -> str:
+    return REGISTRY.render() + "\n".join(_pdf_path_families()) + "\n"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: requêtes en cours, durée par route, endpoint courant des étapes."""
+
+    def __init__(self, app, exclude: Sequence[str] = ("/metrics",)) -> None:
+        self.app = app
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope.get("path") in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        group = endpoint_group(scope.get("path", ""))
+        status = {"code": 500}
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = _current_endpoint.set(scope)
+        REQUESTS_IN_FLIGHT.inc(endpoint=group)
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(endpoint=group)
+            route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, method=scope["method"], route=route, status=str(status["code"]))
+            _current_endpoint.reset(token)
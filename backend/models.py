@@ -1,12 +1,14 @@
 from datetime import datetime
-from sqlalchemy import String, Integer, DateTime
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, DateTime, Float, Text, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
 
 
 class Contract(Base):
     __tablename__ = "contracts"
+    # Pagination par clé sur (created_at, id)
+    __table_args__ = (Index("ix_contracts_created_at_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     store: Mapped[str] = mapped_column(String(20), index=True)
@@ -25,3 +27,75 @@ class Contract(Base):
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
+
+class GeneratedDocument(Base):
+    """PDF conservé sous generated_dir (voir docstore); une ligne par rendu."""
+
+    __tablename__ = "generated_documents"
+    # Document courant d'un contrat: superseded_at IS NULL
+    __table_args__ = (Index("ix_generated_documents_contract_current", "contract_id", "superseded_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    contract_id: Mapped[int] = mapped_column(ForeignKey("contracts.id", ondelete="CASCADE"))
+    path: Mapped[str] = mapped_column(String(500), unique=True)
+    size: Mapped[int] = mapped_column(Integer)
+    sha256: Mapped[str] = mapped_column(String(64))
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    # Remplacé par un rendu plus récent (candidat au ramasse-miettes après rétention)
+    superseded_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+
+
+class RecruitmentBatch(Base):
+    __tablename__ = "recruitment_batches"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    role: Mapped[str] = mapped_column(String(120), index=True)
+    mode: Mapped[str] = mapped_column(String(20), default="batch")
+    # JSON: { key: coefficient } utilisés pour le dernier classement
+    criteria: Mapped[str] = mapped_column(Text, default="{}")
+    # JSON: [{fichier, detail}] des fichiers en échec
+    errors: Mapped[str | None] = mapped_column(Text, nullable=True)
+    file_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    candidates: Mapped[list["Candidate"]] = relationship(
+        back_populates="batch", cascade="all, delete-orphan", order_by="Candidate.score.desc()"
+    )
+
+
+class Candidate(Base):
+    __tablename__ = "candidates"
+    __table_args__ = (Index("ix_candidates_batch_score", "batch_id", "score"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    batch_id: Mapped[int] = mapped_column(ForeignKey("recruitment_batches.id", ondelete="CASCADE"), index=True)
+
+    nom: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    prenom: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    email: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    telephone: Mapped[str | None] = mapped_column(String(40), nullable=True)
+    score: Mapped[float] = mapped_column(Float, default=0.0, index=True)
+    # JSON: candidat complet tel que renvoyé par l'analyse
+    data: Mapped[str] = mapped_column(Text)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    batch: Mapped[RecruitmentBatch] = relationship(back_populates="candidates")
+
+
+class CVExtraction(Base):
+    """Extraction d'un fichier CV, réutilisée tant que le fichier et le contexte sont identiques."""
+
+    __tablename__ = "cv_extractions"
+    __table_args__ = (UniqueConstraint("file_sha256", "context_key", name="uq_cv_extractions_file_context"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    file_sha256: Mapped[str] = mapped_column(String(64), index=True)
+    # Empreinte (modèle, prompt, poste, clés de critères) ayant produit l'extraction
+    context_key: Mapped[str] = mapped_column(String(64))
+    filename: Mapped[str | None] = mapped_column(String(300), nullable=True)
+    data: Mapped[str] = mapped_column(Text)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
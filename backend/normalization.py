@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import calendar
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Normalisation des champs extraits (nationalité, dates au format JJ/MM/AAAA).
+# Les formats de date sont compilés une fois en expressions régulières qui
+# reproduisent celles de datetime.strptime (mêmes alternatives par directive,
+# espaces -> \s+, insensible à la casse, correspondance en tête + fin de chaîne
+# exigée), sans le coût des exceptions levées à chaque format essayé.
+
+# Ordre d'essai historique de _normalize_fields (le premier format valide l'emporte)
+DATE_FORMATS: Tuple[str, ...] = (
+    "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d",
+    "%d.%m.%Y", "%Y.%m.%d", "%m/%d/%Y", "%d %m %Y",
+    "%d %b %Y", "%d %B %Y", "%Y%m%d",
+)
+
+_ISO_FORMAT = ("%Y-%m-%d",)
+
+NATIONALITY_KEYS = ("nationalite", "nationalité", "nationality")
+
+DATE_KEY_GROUPS: Tuple[Tuple[str, ...], ...] = (
+    ("date_naissance", "date de naissance", "birthdate", "dob"),
+    ("date_debut", "date debut", "start_date"),
+    ("date_expiration", "date expiration", "expiry", "expiration_date"),
+)
+
+# Codes pays ISO 3166 (alpha-3 de la MRZ, alpha-2) et libellés courants ->
+# nationalité (accordée avec "nationalité")
+NATIONALITIES: Dict[str, str] = {}
+for _label, _codes in {
+    "Française": ("FRA", "FR", "FRANCE", "FRANCAISE", "FRANÇAISE", "FRANCAIS", "FRANÇAIS"),
+    "Allemande": ("DEU", "DE", "D"),
+    "Belge": ("BEL", "BE"),
+    "Espagnole": ("ESP", "ES"),
+    "Italienne": ("ITA", "IT"),
+    "Portugaise": ("PRT", "PT"),
+    "Luxembourgeoise": ("LUX", "LU"),
+    "Néerlandaise": ("NLD", "NL"),
+    "Suisse": ("CHE", "CH"),
+    "Britannique": ("GBR", "GB"),
+    "Irlandaise": ("IRL", "IE"),
+    "Polonaise": ("POL", "PL"),
+    "Roumaine": ("ROU", "RO"),
+    "Bulgare": ("BGR", "BG"),
+    "Grecque": ("GRC", "GR"),
+    "Algérienne": ("DZA", "DZ"),
+    "Marocaine": ("MAR", "MA"),
+    "Tunisienne": ("TUN", "TN"),
+    "Sénégalaise": ("SEN", "SN"),
+    "Malienne": ("MLI", "ML"),
+    "Ivoirienne": ("CIV", "CI"),
+    "Turque": ("TUR", "TR"),
+    "Ukrainienne": ("UKR", "UA"),
+}.items():
+    for _code in _codes:
+        NATIONALITIES[_code] = _label
+del _label, _codes, _code
+
+# Fragments identiques à ceux de _strptime.TimeRE
+_DIRECTIVES = {
+    "d": r"(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])",
+    "m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+    "Y": r"(?P<Y>\d\d\d\d)",
+}
+_LOOSE_DATE_RE = re.compile(r"^\D*(\d{1,4})\D+(\d{1,2})\D+(\d{1,4})\D*$")
+
+
+def _month_names(names: Sequence[str]) -> Tuple[str, Dict[str, int]]:
+    lookup = {name.lower(): i for i, name in enumerate(names) if name}
+    # Les plus longs d'abord, comme strptime (évite "jun" avant "june")
+    alternatives = "|".join(re.escape(n) for n in sorted(lookup, key=len, reverse=True))
+    return alternatives, lookup
+
+
+_MONTH_ABBR, _ABBR_LOOKUP = _month_names(calendar.month_abbr)
+_MONTH_FULL, _FULL_LOOKUP = _month_names(calendar.month_name)
+_DIRECTIVES["b"] = f"(?P<b>{_MONTH_ABBR})"
+_DIRECTIVES["B"] = f"(?P<B>{_MONTH_FULL})"
+
+
+@lru_cache(maxsize=None)
+def compile_date_format(fmt: str) -> "re.Pattern[str]":
+    """Expression régulière équivalente à strptime pour `fmt` (%d, %m, %Y, %b, %B)."""
+    out = []
+    # Comme strptime: toute suite d'espaces du format accepte une suite d'espaces
+    for i, chunk in enumerate(re.split(r"%(.)", re.sub(r"\s+", " ", fmt))):
+        if i % 2:
+            if chunk not in _DIRECTIVES:
+                raise ValueError(f"Directive de date non prise en charge: %{chunk}")
+            out.append(_DIRECTIVES[chunk])
+        else:
+            out.append(re.escape(chunk).replace("\\ ", r"\s+"))
+    return re.compile("".join(out), re.IGNORECASE)
+
+
+def _fr(year: int, month: int, day: int) -> Optional[str]:
+    try:
+        d = date(year, month, day)
+    except ValueError:
+        return None
+    # strftime("%Y") ne complète pas les années < 1000
+    return f"{day:02d}/{month:02d}/{year}" if year >= 1000 else d.strftime("%d/%m/%Y")
+
+
+def _match_format(pattern: "re.Pattern[str]", value: str) -> Optional[str]:
+    m = pattern.match(value)
+    if m is None or m.end() != len(value):
+        return None
+    g = m.groupdict()
+    if "m" in g:
+        month = int(g["m"])
+    elif "b" in g:
+        month = _ABBR_LOOKUP[g["b"].lower()]
+    else:
+        month = _FULL_LOOKUP[g["B"].lower()]
+    return _fr(int(g["Y"]), month, int(g["d"]))
+
+
+def parse_fr_date(value: str, formats: Sequence[str] = DATE_FORMATS) -> Optional[str]:
+    """Date JJ/MM/AAAA selon le premier format de `formats` qui s'applique, sinon None."""
+    for fmt in formats:
+        out = _match_format(compile_date_format(fmt), value)
+        if out is not None:
+            return out
+    return None
+
+
+@lru_cache(maxsize=4096)
+def to_fr_date(value: str) -> str:
+    """Valeur de date -> JJ/MM/AAAA; la valeur (nettoyée) est rendue telle quelle si illisible."""
+    raw = value.strip()
+    if not raw:
+        return raw
+    date_part = raw.split("T")[0].split(" ")[0]
+    out = parse_fr_date(date_part)
+    if out is not None:
+        return out
+    # Dernier recours: trois groupes de chiffres, l'année (4 chiffres) en tête ou en fin
+    m = _LOOSE_DATE_RE.match(date_part)
+    if m:
+        a, b, c = m.groups()
+        if len(a) == 4:
+            out = parse_fr_date(f"{a}-{b.zfill(2)}-{c.zfill(2)}", _ISO_FORMAT)
+        elif len(c) == 4:
+            out = parse_fr_date(f"{c}-{b.zfill(2)}-{a.zfill(2)}", _ISO_FORMAT)
+    return out if out is not None else raw
+
+
+def normalize_nationality(value: str) -> str:
+    return NATIONALITIES.get(value.strip().upper(), value)
+
+
+@lru_cache(maxsize=256)
+def _plan(keys: Tuple[str, ...]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Clés à normaliser (nationalité, dates) pour un jeu de clés donné.
+
+    Les enregistrements d'un même lot partagent presque toujours leurs clés:
+    la résolution (insensible à la casse pour les dates) n'est faite qu'une fois.
+    """
+    nationality = tuple(k for k in NATIONALITY_KEYS if k in keys)
+    lower_to_key = {k.lower(): k for k in keys}
+    dates = []
+    for group in DATE_KEY_GROUPS:
+        for k in group:
+            if k in lower_to_key:
+                dates.append(lower_to_key[k])
+                break
+    return nationality, tuple(dates)
+
+
+def normalize_record(payload: dict) -> dict:
+    """Normalise en place les champs d'un enregistrement extrait et le renvoie."""
+    if not isinstance(payload, dict):
+        return payload
+    nationality, dates = _plan(tuple(payload))
+    for key in nationality:
+        val = payload[key]
+        if isinstance(val, str):
+            payload[key] = normalize_nationality(val)
+    for key in dates:
+        val = payload[key]
+        if isinstance(val, str):
+            payload[key] = to_fr_date(val)
+    return payload
+
+
+def normalize_records(records: Iterable[dict]) -> List[dict]:
+    """Version lot de normalize_record (CV, imports): une seule passe sur les enregistrements."""
+    return [normalize_record(r) for r in records]
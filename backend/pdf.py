@@ -1,8 +1,16 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from io import BytesIO
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm, cm
@@ -13,6 +21,10 @@ from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 from reportlab.lib.colors import black
 import re
 
+from .metrics import stage
+from .normalization import parse_fr_date
+from .settings import get_settings
+
 MONTHS_IN_YEAR = 12
 
 def _add_months(dt, months):
@@ -23,24 +35,13 @@ def _add_months(dt, months):
     return _dt(year, month, day)
 
 
-def _load_config() -> dict:
-    try:
-        with open("config.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"pdf": {"title": "Contrat", "footer_text": ""}, "generated_dir": "generated"}
-
-
 def ensure_generated_dir() -> Path:
-    cfg = _load_config()
-    gen = Path(cfg.get("generated_dir", "generated"))
-    gen.mkdir(parents=True, exist_ok=True)
-    return gen
+    # Dossier créé au chargement de la configuration
+    return get_settings().generated_dir
 
 
 def _load_template_path(store: str | None) -> Path | None:
-    cfg = _load_config()
-    templates = cfg.get("templates", {}) or {}
+    templates = get_settings().templates
     if store and store in templates:
         p = Path(templates[store])
         if p.exists():
@@ -75,8 +76,7 @@ def _load_txt_template_path(store: str | None) -> Path | None:
         return template_file
     
     # Fallback: chercher dans config.json
-    cfg = _load_config()
-    templates = cfg.get("templates", {}) or {}
+    templates = get_settings().templates
     if store in templates:
         template_path = templates[store]
         p = Path(template_path)
@@ -88,106 +88,158 @@ def _load_txt_template_path(store: str | None) -> Path | None:
     return None
 
 
-def _generate_pdf_from_text_template(template_path: Path, variables: dict, out_path: Path) -> str:
-    """Génère un PDF à partir d'un template texte avec formatage professionnel"""
-    # Lire le template
-    try:
-        with open(template_path, "r", encoding="utf-8") as f:
-            template_text = f.read()
-    except Exception:
-        with open(template_path, "r", encoding="latin-1") as f:
-            template_text = f.read()
-    
-    # Remplacer les balises
-    for token, value in variables.items():
-        template_text = template_text.replace(token, str(value))
-    
-    # Créer les styles ReportLab
-    styles = getSampleStyleSheet()
-    
-    # Style pour le titre principal (centré, gras)
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Normal'],
-        fontSize=16,
-        textColor=black,
-        spaceAfter=36,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold',
-        leading=20
-    )
-    
-    # Style pour les titres d'articles (gras et souligné)
-    article_title_style = ParagraphStyle(
-        'ArticleTitle',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor=black,
-        spaceBefore=16,
-        spaceAfter=12,
-        fontName='Helvetica-Bold',
-        leading=16
-    )
-    
+# Styles ReportLab, construits une seule fois (lecture seule pendant le rendu)
+_STYLES: dict | None = None
+
+
+def _pdf_styles() -> dict:
+    global _STYLES
+    if _STYLES is not None:
+        return _STYLES
+    base = getSampleStyleSheet()['Normal']
     # Style pour le texte normal
     normal_style = ParagraphStyle(
         'Normal',
-        parent=styles['Normal'],
+        parent=base,
         fontSize=10,
         textColor=black,
         spaceAfter=0,
         alignment=TA_JUSTIFY,
         leading=16
     )
-    # Variante sans espace après (avant "d'une part,")
-    normal_tight_style = ParagraphStyle(
-        'NormalTight',
-        parent=normal_style,
-        spaceAfter=0
-    )
-    # Style pour marqueurs d'intro (pas d'espace avant, espace après)
-    marker_style = ParagraphStyle(
-        'Marker',
-        parent=normal_style,
-        spaceBefore=0,
-        spaceAfter=0
-    )
-    
-    # Créer le document PDF
-    doc = SimpleDocTemplate(
-        str(out_path),
-        pagesize=A4,
-        rightMargin=2.5*cm,
-        leftMargin=2.5*cm,
-        topMargin=2.5*cm,
-        bottomMargin=2.5*cm
-    )
-    
-    # Contenu du document
-    story = []
-    
-    # Parser le texte ligne par ligne
+    _STYLES = {
+        # Titre principal (centré, gras)
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=base,
+            fontSize=16,
+            textColor=black,
+            spaceAfter=36,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold',
+            leading=20
+        ),
+        # Titres d'articles (gras et souligné)
+        "article": ParagraphStyle(
+            'ArticleTitle',
+            parent=base,
+            fontSize=11,
+            textColor=black,
+            spaceBefore=16,
+            spaceAfter=12,
+            fontName='Helvetica-Bold',
+            leading=16
+        ),
+        "normal": normal_style,
+        # Variante sans espace après (avant "d'une part,")
+        "tight": ParagraphStyle('NormalTight', parent=normal_style, spaceAfter=0),
+        # Marqueurs d'intro (pas d'espace avant, espace après)
+        "marker": ParagraphStyle('Marker', parent=normal_style, spaceBefore=0, spaceAfter=0),
+    }
+    return _STYLES
+
+
+_PLACEHOLDER_RE = re.compile(r"\{\{[^{}\n]+\}\}")
+_ARTICLE_RE = re.compile(r'^ARTICLE\s+(\d+)\s*[–\-—]\s*(.+)$', re.IGNORECASE)
+# Sentinelle insérée à la place des balises pendant la compilation (inchangée par l'échappement HTML)
+_SLOT = "\x00"
+
+
+def _escape(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _value_markup(value) -> str:
+    """Valeur d'une balise: None -> vide; plusieurs lignes -> retours à la ligne dans le paragraphe."""
+    if value is None:
+        return ""
+    text = str(value)
+    if "\n" not in text and "\r" not in text:
+        return _escape(text)
+    # Comme les lignes du template: nettoyées, les lignes vides ne produisent rien
+    return "<br/>".join(_escape(line.strip()) for line in text.splitlines() if line.strip())
+
+
+@dataclass(frozen=True)
+class _Block:
+    """Bloc compilé: espace vertical ou paragraphe dont le balisage contient des emplacements.
+
+    `parts` alterne texte (déjà échappé) et nom de balise: parts[0], tok, parts[2], tok...
+    `blank`: pour une ligne faite uniquement de balises, hauteur de l'espace qui
+    la remplace si elle est vide une fois remplie (0: rien), comme une ligne vide.
+    """
+    kind: str  # "spacer" | "paragraph"
+    height: float = 0
+    style: str = "normal"
+    parts: tuple = ()
+    blank: Optional[float] = None
+
+    def values(self, variables: dict) -> list:
+        # Balise absente des variables: elle reste telle quelle dans le contrat
+        return [
+            _value_markup(variables[tok]) if tok in variables else _escape(tok)
+            for tok in self.parts[1::2]
+        ]
+
+    def markup(self, variables: dict) -> str:
+        out = [self.parts[0]]
+        for value, text in zip(self.values(variables), self.parts[2::2]):
+            out += [value, text]
+        return "".join(out)
+
+
+def _paragraph_block(markup: str, style: str, tokens: list, blank: Optional[float] = None) -> _Block:
+    chunks = markup.split(_SLOT)
+    parts = [chunks[0]]
+    for tok, chunk in zip(tokens, chunks[1:]):
+        parts += [tok, chunk]
+    return _Block("paragraph", style=style, parts=tuple(parts), blank=blank)
+
+
+def _compile_template_text(template_text: str) -> list:
+    """Transforme le texte du template en liste de blocs (sans substitution des variables).
+
+    La classification des lignes se fait sur le texte brut: les balises ne
+    changent ni la casse, ni les débuts/fins de ligne des templates livrés.
+    """
+    normal_leading = _pdf_styles()["normal"].leading
+    blocks: list = []
     lines = template_text.split('\n')
     title_done = False
-    
-    for i, line in enumerate(lines):
-        line_stripped = line.strip()
-        
-        # Calculer la prochaine ligne non vide
-        j = i + 1
-        next_non_empty = ""
-        while j < len(lines) and not lines[j].strip():
-            j += 1
-        if j < len(lines):
-            next_non_empty = lines[j].strip().lower()
-        
-        # Calculer la précédente ligne non vide
-        k = i - 1
-        prev_non_empty = ""
-        while k >= 0 and not lines[k].strip():
-            k -= 1
-        if k >= 0:
-            prev_non_empty = lines[k].strip().lower()
+
+    def paragraph(text: str, style: str, wrap: str = "{}", blank: Optional[float] = None) -> None:
+        tokens = _PLACEHOLDER_RE.findall(text)
+        markup = wrap.format(_escape(_PLACEHOLDER_RE.sub(_SLOT, text)))
+        blocks.append(_paragraph_block(markup, style, tokens, blank))
+
+    def spacer(height: float) -> None:
+        blocks.append(_Block("spacer", height=height))
+
+    def drop_spacer() -> None:
+        # Supprimer tout Spacer résiduel juste avant le marqueur
+        if blocks and blocks[-1].kind == "spacer":
+            blocks.pop()
+
+    # Un seul passage: lignes nettoyées, puis précédente/prochaine ligne non vide
+    # pré-calculées (évite de rebalayer les séries de lignes vides pour chaque ligne)
+    stripped = [line.strip() for line in lines]
+    n = len(stripped)
+    next_non_empty_of = [""] * n
+    following = ""
+    for i in range(n - 1, -1, -1):
+        next_non_empty_of[i] = following
+        if stripped[i]:
+            following = stripped[i].lower()
+    prev_non_empty_of = [""] * n
+    preceding = ""
+    for i in range(n):
+        prev_non_empty_of[i] = preceding
+        if stripped[i]:
+            preceding = stripped[i].lower()
+
+    for i, line_stripped in enumerate(stripped):
+        next_non_empty = next_non_empty_of[i]
+        prev_non_empty = prev_non_empty_of[i]
         
         # Normalisation flags
         next_is_dune_part = ("d'une part" in next_non_empty) or ("d’une part" in next_non_empty)
@@ -197,103 +249,134 @@ def _generate_pdf_from_text_template(template_path: Path, variables: dict, out_p
         if not line_stripped:
             if next_is_dune_part:
                 continue
-            story.append(Spacer(1, 10))
+            spacer(10)
             continue
         
         # Détecter le titre principal (première ligne non vide en majuscules, longue)
         if not title_done and line_stripped.isupper() and len(line_stripped) > 30:
-            # Échapper HTML et mettre en gras
-            escaped = line_stripped.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(f"<b>{escaped}</b>", title_style))
-            story.append(Spacer(1, 28))
+            paragraph(line_stripped, "title", "<b>{}</b>")
+            spacer(28)
             title_done = True
             continue
         
         # Détecter les titres d'articles (ARTICLE X – ... ou ARTICLE X - ...)
-        article_match = re.match(r'^ARTICLE\s+(\d+)\s*[–\-—]\s*(.+)$', line_stripped, re.IGNORECASE)
+        article_match = _ARTICLE_RE.match(line_stripped)
         if article_match:
             article_num = article_match.group(1)
             article_title = article_match.group(2).strip()
-            # Échapper HTML
-            article_title_escaped = article_title.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            # Gras et souligné
-            story.append(Paragraph(f"<b><u>ARTICLE {article_num} – {article_title_escaped}</u></b>", article_title_style))
+            paragraph(article_title, "article", f"<b><u>ARTICLE {article_num} – {{}}</u></b>")
             continue
         
         # Marqueurs d'intro spécifiques
         low = line_stripped.lower()
-        if this_is_dune_part:
-            # Supprimer tout Spacer résiduel juste avant le marqueur
-            if story and isinstance(story[-1], Spacer):
-                story.pop()
-            escaped = line_stripped.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(escaped, marker_style))
-            story.append(Spacer(1, normal_style.leading))
-            story.append(Spacer(1, normal_style.leading))
-            continue
-        if low == 'et,' or low.startswith('et,'):
-            if story and isinstance(story[-1], Spacer):
-                story.pop()
-            escaped = line_stripped.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(escaped, marker_style))
-            story.append(Spacer(1, normal_style.leading))
-            story.append(Spacer(1, normal_style.leading))
-            continue
-        if low.startswith("d'autre part") or low.startswith("d’autre part"):
-            if story and isinstance(story[-1], Spacer):
-                story.pop()
-            escaped = line_stripped.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(escaped, marker_style))
-            story.append(Spacer(1, normal_style.leading))
-            story.append(Spacer(1, normal_style.leading))
+        if (
+            this_is_dune_part
+            or low == 'et,' or low.startswith('et,')
+            or low.startswith("d'autre part") or low.startswith("d’autre part")
+        ):
+            drop_spacer()
+            paragraph(line_stripped, "marker")
+            spacer(normal_leading)
+            spacer(normal_leading)
             continue
         
         # Détecter les puces (commencent par · ou -)
         if line_stripped.startswith('·') or (line_stripped.startswith('-') and len(line_stripped) > 2):
-            escaped = line_stripped.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(f"&nbsp;&nbsp;&nbsp;&nbsp;{escaped}", normal_style))
+            paragraph(line_stripped, "normal", "&nbsp;&nbsp;&nbsp;&nbsp;{}")
             continue
         
-        # Texte normal (avec style resserré si la prochaine ligne est "d'une part,")
-        escaped = line_stripped.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-        use_tight = next_is_dune_part
-        story.append(Paragraph(escaped, normal_tight_style if use_tight else normal_style))
+        # Texte normal (avec style resserré si la prochaine ligne est "d'une part,").
+        # Ligne faite uniquement de balises: traitée comme une ligne vide si elles sont vides
+        slot_only = not _PLACEHOLDER_RE.sub("", line_stripped).strip()
+        blank = (0 if next_is_dune_part else 10) if slot_only else None
+        paragraph(line_stripped, "tight" if next_is_dune_part else "normal", blank=blank)
         
         # Ajout d'un petit espace supplémentaire après les lignes de type en-tête terminées par ':'
         if line_stripped.endswith(':'):
-            story.append(Spacer(1, 6))
+            spacer(6)
         
         # Saut de 2 lignes après la mention de signature du président (fin de document uniquement)
         if 'Monsieur Anthony BOUSKILA, Président' in line_stripped:
             if prev_non_empty == 'pour la société aejb,':
-                story.append(Spacer(1, 16))
-                story.append(Spacer(1, 16))
-        
-        # Règles spécifiques d'intro (supprimées car gérées par marker_style)
-        # if "d'une part" in low:
-        #     story.append(Spacer(1, 12))
-        # if low == 'et,' or low.startswith('et,'):
-        #     story.append(Spacer(1, 12))
-        # if "d'autre part" in low:
-        #     story.append(Spacer(1, 12))
+                spacer(16)
+                spacer(16)
+
+    return blocks
+
+
+# Templates compilés: chemin -> ((mtime_ns, taille), blocs)
+_compiled_templates: dict = {}
+_compiled_lock = threading.Lock()
+
+
+def _compile_template(template_path: Path) -> list:
+    """Blocs du template, recompilés seulement si le fichier a changé sur disque."""
+    st = os.stat(template_path)
+    key = str(template_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _compiled_templates.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    # Lire le template
+    try:
+        with open(template_path, "r", encoding="utf-8") as f:
+            template_text = f.read()
+    except Exception:
+        with open(template_path, "r", encoding="latin-1") as f:
+            template_text = f.read()
+    blocks = _compile_template_text(template_text)
+    with _compiled_lock:
+        _compiled_templates[key] = (stamp, blocks)
+    return blocks
+
+
+def _build_story(blocks: list, variables: dict) -> list:
+    styles = _pdf_styles()
+    story = []
+    for b in blocks:
+        if b.kind == "spacer":
+            story.append(Spacer(1, b.height))
+        elif b.blank is not None and not "".join(b.values(variables)).strip():
+            if b.blank:
+                story.append(Spacer(1, b.blank))
+        else:
+            story.append(Paragraph(b.markup(variables), styles[b.style]))
+    return story
+
+
+def _generate_pdf_from_text_template(template_path: Path, variables: dict, out_path) -> str:
+    """Génère un PDF à partir d'un template texte avec formatage professionnel
+
+    `out_path`: chemin de fichier ou flux binaire (BytesIO...).
+    """
+    story = _build_story(_compile_template(template_path), variables)
+    
+    # Créer le document PDF
+    doc = SimpleDocTemplate(
+        out_path if hasattr(out_path, "write") else str(out_path),
+        pagesize=A4,
+        rightMargin=2.5*cm,
+        leftMargin=2.5*cm,
+        topMargin=2.5*cm,
+        bottomMargin=2.5*cm
+    )
     
     # Générer le PDF
     doc.build(story)
     return str(out_path)
 
 
+# Formats acceptés pour les dates des contrats (ordre d'essai)
+_CONTRACT_DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y", "%m/%d/%Y")
+
+
 def _format_fr_date(s: str) -> str:
     if not s:
         return s
-    from datetime import datetime as _dt
     s = str(s).strip()
-    fmts = ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y", "%m/%d/%Y"]
-    for f in fmts:
-        try:
-            dt = _dt.strptime(s, f)
-            return dt.strftime("%d/%m/%Y")
-        except Exception:
-            pass
+    out = parse_fr_date(s, _CONTRACT_DATE_FORMATS)
+    if out is not None:
+        return out
     # try loose parse
     try:
         from dateutil import parser  # optional
@@ -302,13 +385,7 @@ def _format_fr_date(s: str) -> str:
         return s
 
 
-def generate_contract_pdf(contract: dict) -> str:
-    cfg = _load_config()
-
-    out_dir = ensure_generated_dir()
-    filename = f"contrat_{contract['id']}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.pdf"
-    out_path = out_dir / filename
-
+def _contract_variables(contract: dict) -> dict:
     # Build variables mapping in template style
     date_debut_raw = contract.get("date_debut") or ""
     dd_str = _format_fr_date(date_debut_raw)
@@ -320,7 +397,7 @@ def generate_contract_pdf(contract: dict) -> str:
     except Exception:
         fin_str = dd_str
 
-    variables = {
+    return {
         "{{Prénom}}": contract.get("prenom", ""),
         "{{Nom}}": contract.get("nom", ""),
         "{{Date_de_naissance}}": _format_fr_date(contract.get("date_naissance", "")),
@@ -332,6 +409,12 @@ def generate_contract_pdf(contract: dict) -> str:
         "{{Date_fin_periode_essai}}": fin_str,
     }
 
+
+@stage("pdf_build")
+def render_contract_pdf(contract: dict) -> tuple[str, bytes]:
+    """Rend le contrat en mémoire. Retourne (nom de fichier, contenu PDF)."""
+    filename = f"contrat_{contract['id']}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.pdf"
+
     # UNIQUEMENT templates texte - AUCUN fallback PDF/DOCX
     store = contract.get("store")
     if not store:
@@ -344,10 +427,194 @@ def generate_contract_pdf(contract: dict) -> str:
             f"Vérifiez que le fichier 'templates/{store}_CDI_VENDEUR.txt' existe."
         )
     
+    buf = BytesIO()
     try:
-        return _generate_pdf_from_text_template(txt_template, variables, out_path)
+        _generate_pdf_from_text_template(txt_template, _contract_variables(contract), buf)
     except Exception as e:
         raise RuntimeError(f"Erreur lors de la génération du PDF: {str(e)}") from e
+    return filename, buf.getvalue()
+
+
+# --- Destination des PDF générés ---
+# PDF_SINK=local (défaut): dossier generated_dir (rangé et indexé, voir docstore), servi sous /files
+# PDF_SINK=storage: upload direct des octets vers le stockage objet (URL publique)
+# PDF_SINK=stream: rien n'est conservé, GET /contracts/{id}/pdf rend à la demande
+#                  (réplicas sans volume partagé)
+
+STREAM_PATH = "/contracts/{id}/pdf"
+
+
+class LocalFileSink:
+    @property
+    def store(self):
+        # Rangement par mois / empreinte + index en base (voir docstore)
+        from .docstore import DocumentStore
+        return DocumentStore(ensure_generated_dir())
+
+    @stage("pdf_store")
+    def save(self, contract: dict, filename: str, data: bytes) -> str:
+        return self.store.put(contract["id"], filename, data)
+
+    @stage("pdf_store")
+    def save_many(self, contracts: list, rendered: list) -> list:
+        """Écriture + indexation groupées des rendus [((filename, data) | None, erreur | None)]."""
+        todo = [i for i, (out, _) in enumerate(rendered) if out is not None]
+        results = [(None, err) for _, err in rendered]
+        try:
+            paths = self.store.put_many([(contracts[i]["id"], *rendered[i][0]) for i in todo])
+        except Exception as e:
+            for i in todo:
+                results[i] = (None, str(e))
+            return results
+        for i, path in zip(todo, paths):
+            results[i] = (path, None)
+        return results
+
 
-    # Code obsolète supprimé (anciens fallbacks non utilisés)
+class StorageSink:
+    def __init__(self, client=None) -> None:
+        from .storage import SupabaseStorageClient
+        self.client = client or SupabaseStorageClient()
 
+    @staticmethod
+    def _object_name(contract: dict, filename: str) -> str:
+        # Dossier logique par magasin pour lisibilité
+        store = (contract.get("store") or "STORE").upper()
+        return f"{store}/{filename}"
+
+    @stage("pdf_store")
+    def save(self, contract: dict, filename: str, data: bytes) -> str:
+        return self.client.upload_bytes(self._object_name(contract, filename), data, content_type="application/pdf")
+
+    @stage("pdf_store")
+    def save_many(self, contracts: list, rendered: list) -> list:
+        """Upload groupé des rendus [((filename, data) | None, erreur | None)]."""
+        todo = [i for i, (out, _) in enumerate(rendered) if out is not None]
+        uploaded = self.client.upload_many(
+            [(self._object_name(contracts[i], rendered[i][0][0]), rendered[i][0][1]) for i in todo]
+        )
+        results = [(None, err) for _, err in rendered]
+        for i, res in zip(todo, uploaded):
+            results[i] = res
+        return results
+
+
+class StreamSink:
+    def save(self, contract: dict, filename: str, data: bytes) -> str:
+        return STREAM_PATH.format(id=contract["id"])
+
+
+_SINKS = {"local": LocalFileSink, "storage": StorageSink, "stream": StreamSink}
+_sink = None
+
+
+def get_pdf_sink():
+    global _sink
+    if _sink is None:
+        name = (os.getenv("PDF_SINK") or "local").strip().lower()
+        if name not in _SINKS:
+            raise RuntimeError(f"PDF_SINK inconnu: {name} (local | storage | stream)")
+        _sink = _SINKS[name]()
+    return _sink
+
+
+def generate_contract_pdf(contract: dict) -> str:
+    """Rend le contrat puis le confie au sink configuré. Retourne son emplacement (chemin ou URL)."""
+    filename, data = render_contract_pdf(contract)
+    return get_pdf_sink().save(contract, filename, data)
+
+
+# Rendu en parallèle (lots de contrats): ReportLab est du pur Python lié au CPU,
+# des processus séparés passent outre le GIL. Chaque processus garde son propre
+# cache de templates compilés.
+PDF_RENDER_PROCESSES = int(os.getenv("PDF_RENDER_PROCESSES") or os.cpu_count() or 1)
+# Processus neufs ("spawn", ou "forkserver"): le pool est créé à la demande dans un
+# process qui fait déjà tourner des threads (surveillance de la configuration et
+# des prompts, workers de travaux, uploads); un fork y hériterait de verrous
+# (logging, httpx, sqlite) pris par ces threads et pourrait se bloquer.
+PDF_RENDER_START_METHOD = os.getenv("PDF_RENDER_START_METHOD") or "spawn"
+
+_render_pool: ProcessPoolExecutor | None = None
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context(PDF_RENDER_START_METHOD),
+                initializer=_init_render_worker,
+            )
+        return _render_pool
+
+
+def _init_render_worker() -> None:
+    """Démarrage d'un processus du pool: état propre au process remis à zéro."""
+    global _render_pool, _sink
+    # Pool et sink du parent: sans objet ici (et invalides s'ils proviennent d'un fork)
+    _render_pool = None
+    _sink = None
+    # Styles ReportLab et configuration chargés avant le premier rendu
+    _pdf_styles()
+    get_settings()
+
+
+def shutdown_render_pool() -> None:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+def _render_one(contract: dict) -> tuple:
+    try:
+        return generate_contract_pdf(contract), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _render_bytes(contract: dict) -> tuple:
+    try:
+        return render_contract_pdf(contract), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _map_render(fn, contracts: list) -> list:
+    if len(contracts) <= 1 or PDF_RENDER_PROCESSES <= 1:
+        return [fn(c) for c in contracts]
+    try:
+        # Mesuré ici: les étapes chronométrées dans les processus du pool n'y remontent pas
+        with stage("pdf_build_batch"):
+            return list(_get_render_pool().map(fn, contracts))
+    except BrokenProcessPool:
+        # Processus tué (mémoire...): on repart d'un pool neuf au prochain lot
+        shutdown_render_pool()
+        return [fn(c) for c in contracts]
+
+
+def generate_contract_pdfs(contracts: list) -> list:
+    """Génère les PDF d'un lot de contrats. Retourne [(chemin | None, erreur | None)] dans l'ordre."""
+    sink = get_pdf_sink()
+    if hasattr(sink, "save_many"):
+        # Rendu dans le pool, puis enregistrement groupé dans le process principal
+        # (connexions HTTP partagées, index des documents en base)
+        return sink.save_many(contracts, _map_render(_render_bytes, contracts))
+    return _map_render(_render_one, contracts)
+
+
+async def agenerate_contract_pdf(contract: dict) -> str:
+    """generate_contract_pdf hors boucle asyncio (pool de processus, ou thread si désactivé)."""
+    if PDF_RENDER_PROCESSES <= 1:
+        return await asyncio.to_thread(generate_contract_pdf, contract)
+    loop = asyncio.get_running_loop()
+    try:
+        with stage("pdf_build"):
+            filename, data = await loop.run_in_executor(_get_render_pool(), render_contract_pdf, contract)
+    except BrokenProcessPool:
+        shutdown_render_pool()
+        raise RuntimeError("Processus de rendu PDF interrompu")
+    return await asyncio.to_thread(get_pdf_sink().save, contract, filename, data)
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from .imaging import DEFAULT_OPTIONS, ImageOptions, image_part, pdf_page_images
+
+
+# PDF nés numériques (CV exportés, attestations...): si la couche texte est
+# exploitable, on l'envoie au modèle à la place des images, sans rendu.
+#
+# PDF_TEXT_PATH:
+#   "text"   (défaut) texte seul si toutes les pages retenues ont du texte exploitable
+#   "hybrid" image de la 1re page + texte des suivantes
+#   "off"    toujours des images (comportement historique)
+
+logger = logging.getLogger(__name__)
+
+PDF_TEXT_PATH = (os.getenv("PDF_TEXT_PATH") or "text").lower()
+# Nombre minimal de caractères utiles pour considérer une page comme "texte"
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS") or 200)
+
+# Compteurs par chemin choisi (process), voir path_stats()
+_stats_lock = threading.Lock()
+_path_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _usable(text: str) -> bool:
+    """Texte exploitable: assez long et pas une bouillie d'encodage (polices sans ToUnicode)."""
+    stripped = text.strip()
+    if len(stripped) < PDF_TEXT_MIN_CHARS:
+        return False
+    good = sum(1 for ch in stripped if ch.isalnum() or ch.isspace() or ch in ".,;:'’-/()@+&%€")
+    return good / len(stripped) >= 0.8 and stripped.count("�") < 5
+
+
+def _text_part(page_no: int, text: str) -> dict:
+    return {"type": "text", "text": f"[PDF page {page_no}]\n{text.strip()}"}
+
+
+def _record(path: str, pages: int, text_chars: int, rendered: int, elapsed: float) -> None:
+    with _stats_lock:
+        s = _path_stats.setdefault(path, {"documents": 0, "pages": 0, "text_chars": 0, "pages_rendered": 0, "seconds": 0.0})
+        s["documents"] += 1
+        s["pages"] += pages
+        s["text_chars"] += text_chars
+        s["pages_rendered"] += rendered
+        s["seconds"] += elapsed
+
+
+def path_stats() -> Dict[str, Dict[str, float]]:
+    """Cumul par chemin ("text", "hybrid", "vision"): documents, pages, pages rendues, temps."""
+    with _stats_lock:
+        return {k: dict(v) for k, v in _path_stats.items()}
+
+
+# --- Sélection des pages ---
+# Politique par type de document, surchargeable par PDF_PAGES_<TYPE> (ex: PDF_PAGES_CV="most_text:3"):
+#   first_n:N      les N premières pages
+#   most_text:N    les N pages ayant le plus de texte (ordre du document conservé)
+#   recto_verso    pages 1-2 si elles forment une paire (même format), sinon page 1
+#   budget:T       pages dans l'ordre tant que l'estimation de tokens reste sous T
+
+DEFAULT_PAGE_POLICIES = {
+    "cni": "recto_verso",
+    "secu": "first_n:2",
+    "domicile": "first_n:2",
+    "cv": "budget:6000",
+}
+_DEFAULT_POLICY = "first_n:2"
+
+
+@dataclass(frozen=True)
+class PagePolicy:
+    kind: str
+    # Nombre de pages (first_n, most_text) ou budget de tokens (budget)
+    n: int = 2
+
+    @classmethod
+    def parse(cls, spec: str) -> "PagePolicy":
+        kind, _, arg = spec.strip().partition(":")
+        kind = kind.strip().lower()
+        if kind not in ("first_n", "most_text", "recto_verso", "budget"):
+            raise ValueError(f"Politique de pages inconnue: {spec}")
+        if kind == "recto_verso":
+            return cls(kind, 2)
+        return cls(kind, max(1, int(arg or 2)))
+
+
+def page_policy(doc_type: Optional[str]) -> PagePolicy:
+    key = (doc_type or "").lower()
+    spec = os.getenv(f"PDF_PAGES_{key.upper()}") if key else None
+    return PagePolicy.parse(spec or DEFAULT_PAGE_POLICIES.get(key, _DEFAULT_POLICY))
+
+
+def estimate_image_tokens(width: float, height: float, opts: ImageOptions) -> int:
+    """Coût d'une image pour le modèle (tuiles de 512 px après mise à l'échelle)."""
+    if opts.detail == "low":
+        return 85
+    scale = min(1.0, opts.target_edge / max(width, height, 1))
+    w, h = width * scale, height * scale
+    fit = min(1.0, 2048 / max(w, h))
+    w, h = w * fit, h * fit
+    short = min(1.0, 768 / min(w, h))
+    w, h = w * short, h * short
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+def _same_format(a: "fitz.Rect", b: "fitz.Rect") -> bool:
+    return abs(a.width - b.width) <= 0.05 * a.width and abs(a.height - b.height) <= 0.05 * a.height
+
+
+def select_pages(doc: "fitz.Document", policy: PagePolicy, opts: ImageOptions, use_text: bool) -> Tuple[List[int], Dict[int, str]]:
+    """Indices des pages retenues et textes déjà extraits (réutilisés pour le chemin texte)."""
+    count = len(doc)
+    texts: Dict[int, str] = {}
+
+    def text(i: int) -> str:
+        if i not in texts:
+            texts[i] = doc[i].get_text() if use_text else ""
+        return texts[i]
+
+    if count == 0:
+        return [], texts
+    if policy.kind == "first_n":
+        return list(range(min(count, policy.n))), texts
+    if policy.kind == "recto_verso":
+        if count >= 2 and _same_format(doc[0].rect, doc[1].rect):
+            return [0, 1], texts
+        return [0], texts
+    if policy.kind == "most_text":
+        ranked = sorted(range(count), key=lambda i: (-len(text(i).strip()), i))
+        return sorted(ranked[: policy.n]), texts
+    # budget: on s'arrête avant la page qui ferait dépasser (au moins une page)
+    pages: List[int] = []
+    spent = 0
+    for i in range(count):
+        t = text(i)
+        cost = len(t) // 4 if use_text and _usable(t) else estimate_image_tokens(doc[i].rect.width, doc[i].rect.height, opts)
+        if pages and spent + cost > policy.n:
+            break
+        pages.append(i)
+        spent += cost
+    return pages, texts
+
+
+def pdf_parts(
+    pdf_bytes: bytes,
+    doc_type: Optional[str] = None,
+    opts: Optional[ImageOptions] = None,
+    mode: Optional[str] = None,
+    policy: Optional[PagePolicy] = None,
+) -> Tuple[List[dict], str]:
+    """Blocs de message d'un PDF et chemin retenu ("text", "hybrid" ou "vision")."""
+    opts = opts or DEFAULT_OPTIONS
+    mode = (mode or PDF_TEXT_PATH).lower()
+    policy = policy or page_policy(doc_type)
+    use_text = mode != "off"
+    t0 = time.perf_counter()
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        pages, texts = select_pages(doc, policy, opts, use_text)
+        if use_text:
+            for i in pages:
+                if i not in texts:
+                    texts[i] = doc[i].get_text()
+    finally:
+        doc.close()
+    usable = [use_text and _usable(texts[i]) for i in pages]
+
+    if pages and all(usable) and mode == "text":
+        parts, path, rendered = [_text_part(i + 1, texts[i]) for i in pages], "text", 0
+    elif len(pages) > 1 and all(usable[1:]) and mode in ("text", "hybrid"):
+        # Première page en image (mise en page, photo...), la suite en texte
+        images = pdf_page_images(pdf_bytes, opts=opts, pages=pages[:1])
+        parts = [image_part(b, m, opts) for b, m in images]
+        parts += [_text_part(i + 1, texts[i]) for i in pages[1:]]
+        path, rendered = "hybrid", len(images)
+    else:
+        images = pdf_page_images(pdf_bytes, opts=opts, pages=pages)
+        parts, path, rendered = [image_part(b, m, opts) for b, m in images], "vision", len(images)
+
+    elapsed = time.perf_counter() - t0
+    text_chars = sum(len(p["text"]) for p in parts if p["type"] == "text")
+    _record(path, len(pages), text_chars, rendered, elapsed)
+    logger.info(
+        "pdfdoc: chemin=%s pages=%s (%s) rendues=%d texte=%d car. en %.1f ms",
+        path, [i + 1 for i in pages], policy.kind, rendered, text_chars, elapsed * 1000,
+    )
+    return parts, path
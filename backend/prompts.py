@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+# Registre des prompts: tous les fichiers de prompts/ sont lus une fois au
+# démarrage, puis rechargés en arrière-plan quand l'un d'eux change sur disque
+# (aucune lecture de fichier pendant les requêtes).
+#
+# Nommage: "<nom>.prompt.md" (version 1) ou "<nom>.v<N>.prompt.md" (version N).
+# La version servie est la plus haute, sauf épinglage via
+# PROMPT_VERSIONS="id_card=1,cv_analyzer=2". Un épinglage vers une version
+# absente est une erreur au chargement (donc au démarrage de l'application).
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = os.getenv("PROMPTS_DIR") or "prompts"
+# Intervalle de vérification des fichiers (secondes); 0 désactive le rechargement
+PROMPTS_RELOAD_INTERVAL = float(os.getenv("PROMPTS_RELOAD_INTERVAL") or 2.0)
+
+# Types de documents acceptés par /extract -> prompt
+DOC_TYPE_PROMPTS = {
+    "cni": "id_card",
+    "domicile": "domicile",
+    "secu": "secu",
+}
+
+_FILE_RE = re.compile(r"^(?P<name>[\w\-]+?)(?:\.v(?P<version>\d+))?\.prompt\.md$")
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    version: int
+    text: str
+    path: str
+    sha256: str
+
+
+def prompt_name_from_path(path: str) -> str:
+    m = _FILE_RE.match(Path(path).name)
+    if not m:
+        raise ValueError(f"Nom de fichier de prompt invalide: {path}")
+    return m.group("name")
+
+
+def _pinned_versions() -> Dict[str, int]:
+    pins = {}
+    for item in (os.getenv("PROMPT_VERSIONS") or "").split(","):
+        name, _, version = item.partition("=")
+        if name.strip() and version.strip().isdigit():
+            pins[name.strip()] = int(version)
+    return pins
+
+
+class PromptRegistry:
+    def __init__(self, directory: str = PROMPTS_DIR) -> None:
+        self.directory = directory
+        self._prompts: Dict[Tuple[str, int], Prompt] = {}
+        self._active: Dict[str, Prompt] = {}
+        self._stamp: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reload()
+
+    def _scan(self) -> Dict[str, int]:
+        stamp = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and _FILE_RE.match(entry.name):
+                    stamp[entry.path] = entry.stat().st_mtime_ns
+        return stamp
+
+    def reload(self) -> bool:
+        """Relit le dossier si un fichier a changé (ajout, suppression, modification)."""
+        stamp = self._scan()
+        if stamp == self._stamp:
+            return False
+        prompts: Dict[Tuple[str, int], Prompt] = {}
+        for path in stamp:
+            m = _FILE_RE.match(os.path.basename(path))
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            p = Prompt(
+                name=m.group("name"),
+                version=int(m.group("version") or 1),
+                text=text,
+                path=path,
+                sha256=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            )
+            prompts[(p.name, p.version)] = p
+        pins = _pinned_versions()
+        missing = [f"{name} v{version}" for name, version in sorted(pins.items()) if (name, version) not in prompts]
+        if missing:
+            if self._prompts:
+                # Rechargement: l'état en mémoire reste servi, pas de nouvel essai avant la prochaine modification
+                self._stamp = stamp
+            raise ValueError(f"PROMPT_VERSIONS: version(s) introuvable(s) dans {self.directory}: {', '.join(missing)}")
+        active: Dict[str, Prompt] = {}
+        for p in sorted(prompts.values(), key=lambda p: p.version):
+            if pins.get(p.name, p.version) == p.version:
+                active[p.name] = p
+        with self._lock:
+            # Remplacement d'un bloc: les lecteurs voient l'ancien ou le nouvel état
+            self._prompts, self._active, self._stamp = prompts, active, stamp
+        logger.info("prompts: %d fichier(s) chargé(s) depuis %s", len(prompts), self.directory)
+        return True
+
+    def get(self, name: str, version: Optional[int] = None) -> Prompt:
+        if version is None:
+            prompt = self._active.get(name)
+        else:
+            prompt = self._prompts.get((name, version))
+        if prompt is None:
+            raise KeyError(f"Prompt inconnu: {name}" + (f" v{version}" if version else ""))
+        return prompt
+
+    def text(self, name: str) -> str:
+        return self.get(name).text
+
+    def for_doc_type(self, doc_type: str) -> Prompt:
+        """Prompt d'extraction du type de document; ValueError si le type est inconnu."""
+        name = DOC_TYPE_PROMPTS.get(doc_type)
+        if name is None:
+            raise ValueError(f"doc_type inconnu: {doc_type}")
+        return self.get(name)
+
+    def versions(self) -> Dict[str, list]:
+        out: Dict[str, list] = {}
+        for name, version in sorted(self._prompts):
+            out.setdefault(name, []).append(version)
+        return out
+
+    # --- Rechargement à chaud ---
+
+    def start_watcher(self, interval: float = PROMPTS_RELOAD_INTERVAL) -> None:
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval,), name="prompts-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.reload()
+            except Exception:
+                # Fichier en cours d'écriture, supprimé...: on garde la version en mémoire
+                logger.exception("prompts: rechargement impossible")
+
+
+_registry: Optional[PromptRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> PromptRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry()
+    return _registry
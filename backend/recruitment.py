@@ -1,25 +1,54 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import os
 from typing import List, Optional
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
-from .cv import CVAnalyzer
+from .cv import get_cv_analyzer, merge_batch
+from .database import SessionLocal, get_db
+from .ingestion import UnsupportedDocument
+from .jobs import JobContext, register_handler
+from .metrics import record_cache
+from .models import Candidate, CVExtraction, RecruitmentBatch
+from .schemas import (
+    RecruitmentBatchDetail,
+    RecruitmentBatchRead,
+    RecruitmentBatchesListResponse,
+    RescoreRequest,
+)
+from .scoring import rank_candidates
 
 
 router = APIRouter(prefix="/recruitment", tags=["recruitment"])
 
+# Au-delà de ce nombre de fichiers, le mode "auto" passe en analyse par lot
+CV_BATCH_THRESHOLD = int(os.getenv("CV_BATCH_THRESHOLD") or 3)
+# Nombre maximal d'extractions simultanées pour un même lot
+CV_BATCH_CONCURRENCY = int(os.getenv("CV_BATCH_CONCURRENCY") or 8)
+
 
 def _parse_criteria(criteria_json: Optional[str]) -> dict:
     try:
-        obj = json.loads(criteria_json or "{}")
-        # expect: { key: { label, coefficient }, ... }
+        return _flatten_criteria(json.loads(criteria_json or "{}"))
+    except Exception:
+        return {}
+
+
+def _flatten_criteria(obj) -> dict:
+    try:
+        # expect: { key: { label, coefficient }, ... } (or { key: coefficient })
         # flatten to { key: coefficient }
         out = {}
         for k, v in (obj.items() if isinstance(obj, dict) else []):
             try:
-                coef = int(v.get("coefficient", 0))
+                coef = int(v.get("coefficient", 0) if isinstance(v, dict) else v)
             except Exception:
                 coef = 0
             if coef < 0:
@@ -32,14 +61,148 @@ def _parse_criteria(criteria_json: Optional[str]) -> dict:
         return {}
 
 
+def _load_known_extractions(db: Session, context_key: str, file_entries: List[dict]) -> dict:
+    hashes = list({f["sha256"] for f in file_entries})
+    if not hashes:
+        return {}
+    rows = db.execute(
+        select(CVExtraction.file_sha256, CVExtraction.data).where(
+            CVExtraction.context_key == context_key,
+            CVExtraction.file_sha256.in_(hashes),
+        )
+    ).all()
+    known = {}
+    for sha, data in rows:
+        try:
+            known[sha] = json.loads(data)
+        except Exception:
+            continue
+    return known
+
+
+def _save_extractions(db: Session, context_key: str, file_entries: List[dict], results: list, known: dict) -> None:
+    saved = set(known)
+    for f, res in zip(file_entries, results):
+        if isinstance(res, BaseException) or f["sha256"] in saved:
+            continue
+        saved.add(f["sha256"])
+        db.add(CVExtraction(
+            file_sha256=f["sha256"],
+            context_key=context_key,
+            filename=f["filename"],
+            data=json.dumps(res, ensure_ascii=False),
+        ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Même fichier extrait en parallèle par une autre requête
+        db.rollback()
+
+
+def _save_batch(db: Session, result: dict, mode: str, file_count: int) -> RecruitmentBatch:
+    batch = RecruitmentBatch(
+        role=result.get("role") or "",
+        mode=mode,
+        criteria=json.dumps(result.get("criteres") or {}, ensure_ascii=False),
+        errors=json.dumps(result.get("erreurs"), ensure_ascii=False) if result.get("erreurs") else None,
+        file_count=file_count,
+    )
+    for c in result.get("candidats") or []:
+        if not isinstance(c, dict):
+            continue
+        score = c.get("score")
+        batch.candidates.append(
+            Candidate(
+                nom=c.get("nom"),
+                prenom=c.get("prenom"),
+                email=c.get("email"),
+                telephone=c.get("telephone"),
+                score=float(score) if isinstance(score, (int, float)) else 0.0,
+                data=json.dumps(c, ensure_ascii=False),
+            )
+        )
+    db.add(batch)
+    db.commit()
+    db.refresh(batch)
+    return batch
+
+
+def _batch_read(b: RecruitmentBatch, candidate_count: int) -> RecruitmentBatchRead:
+    return RecruitmentBatchRead(
+        id=b.id,
+        role=b.role,
+        mode=b.mode,
+        criteres=json.loads(b.criteria or "{}"),
+        file_count=b.file_count,
+        candidate_count=candidate_count,
+        created_at=b.created_at,
+    )
+
+
+def _candidate_dicts(b: RecruitmentBatch) -> List[dict]:
+    out = []
+    for c in b.candidates:
+        d = json.loads(c.data)
+        d["id"] = c.id
+        d["score"] = c.score
+        out.append(d)
+    return out
+
+
+async def run_analysis(
+    db: Session,
+    role: str,
+    criteria_payload: dict,
+    file_entries: List[dict],
+    mode: str = "auto",
+    concurrency: Optional[int] = None,
+    on_result=None,
+) -> dict:
+    """Analyse (lot ou appel unique), puis enregistre le lot. `on_result`: voir aextract_candidates.
+
+    Les accès à la base (synchrones) passent par un thread: une écriture en
+    attente sur SQLite ne bloque pas les autres requêtes ni les flux SSE.
+    """
+    analyzer = get_cv_analyzer()
+    for f in file_entries:
+        f.setdefault("sha256", hashlib.sha256(f["content"]).hexdigest())
+
+    use_batch = mode == "batch" or (mode == "auto" and len(file_entries) > CV_BATCH_THRESHOLD)
+    if use_batch:
+        # Les fichiers déjà extraits (même contenu, même contexte) ne repartent pas au modèle
+        context_key = analyzer.extraction_context(role, criteria_payload)
+        known = await asyncio.to_thread(_load_known_extractions, db, context_key, file_entries)
+        hits = sum(1 for f in file_entries if f["sha256"] in known)
+        record_cache("cv_extraction", "hit", hits)
+        record_cache("cv_extraction", "miss", len(file_entries) - hits)
+        results = await analyzer.aextract_candidates(
+            role=role,
+            criteria_payload=criteria_payload,
+            files=file_entries,
+            concurrency=concurrency or CV_BATCH_CONCURRENCY,
+            known=known,
+            on_result=on_result,
+        )
+        await asyncio.to_thread(_save_extractions, db, context_key, file_entries, results, known)
+        result = merge_batch(role, criteria_payload, file_entries, results)
+    else:
+        result = await analyzer.aanalyze(role=role, criteria_payload=criteria_payload, files=file_entries)
+
+    if isinstance(result, dict) and isinstance(result.get("candidats"), list):
+        batch = await asyncio.to_thread(_save_batch, db, result, "batch" if use_batch else "single", len(file_entries))
+        result["batch_id"] = batch.id
+    return result
+
+
 @router.post("/analyze")
 async def analyze(
     role: str = Form(...),
     criteria: str = Form("{}"),
     files: List[UploadFile] = File(...),
+    mode: str = Form("auto", description="auto | batch | single"),
+    concurrency: Optional[int] = Form(None, ge=1, le=32),
+    db: Session = Depends(get_db),
 ):
-    analyzer = CVAnalyzer(system_prompt_path="prompts/cv_analyzer.prompt.md")
-
     # Build criteria payload
     criteria_payload = _parse_criteria(criteria)
 
@@ -61,11 +224,109 @@ async def analyze(
         raise HTTPException(status_code=400, detail="Aucun fichier valide reçu")
 
     try:
-        result = analyzer.analyze(role=role, criteria_payload=criteria_payload, files=file_entries)
+        return await run_analysis(db, role, criteria_payload, file_entries, mode=mode, concurrency=concurrency)
+    except UnsupportedDocument as e:
+        # Mode appel unique: un fichier non transmissible invalide la requête
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return result
 
+@register_handler("cv_analyze")
+async def _analyze_job(job: dict, files: List[dict], ctx: JobContext) -> dict:
+    """Travail asynchrone: params {"role", "criteria", "mode"?, "concurrency"?}; progression par fichier."""
+    params = job["params"]
+    criteria = params.get("criteria") or {}
+    criteria_payload = _parse_criteria(criteria) if isinstance(criteria, str) else _flatten_criteria(criteria)
+    mode = params.get("mode") or "batch"
+
+    async def on_result(i: int, f: dict, res) -> None:
+        item = {"index": i, "fichier": f.get("filename") or "fichier", "success": not isinstance(res, BaseException)}
+        if isinstance(res, BaseException):
+            item["error"] = str(res) or type(res).__name__
+        else:
+            item["data"] = res
+        await ctx.item_done(item)
+
+    db = SessionLocal()
+    try:
+        return await run_analysis(
+            db,
+            params.get("role") or "",
+            criteria_payload,
+            files,
+            mode=mode,
+            concurrency=params.get("concurrency"),
+            on_result=on_result,
+        )
+    finally:
+        db.close()
+
+
+@router.post("/rescore")
+def rescore(payload: RescoreRequest, db: Session = Depends(get_db)):
+    """Re-classe un lot avec de nouveaux coefficients, sans appel au modèle."""
+    coefficients = _flatten_criteria(payload.criteria)
+    batch = None
+    if payload.batch_id is not None:
+        batch = db.get(RecruitmentBatch, payload.batch_id)
+        if not batch:
+            raise HTTPException(status_code=404, detail="Lot introuvable")
+        candidates, role = _candidate_dicts(batch), batch.role
+    elif payload.candidats is not None:
+        candidates, role = payload.candidats, None
+    else:
+        raise HTTPException(status_code=400, detail="batch_id ou candidats requis")
+
+    ranked = rank_candidates(candidates, coefficients)
+
+    if batch is not None and payload.save:
+        by_id = {c.id: c for c in batch.candidates}
+        for c in ranked:
+            row = by_id.get(c.get("id"))
+            if row is not None:
+                row.score = c["score"]
+        batch.criteria = json.dumps(coefficients, ensure_ascii=False)
+        db.commit()
+
+    return {"batch_id": payload.batch_id, "role": role, "criteres": coefficients, "candidats": ranked}
+
+
+@router.get("/batches", response_model=RecruitmentBatchesListResponse)
+def list_batches(
+    db: Session = Depends(get_db),
+    role: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    stmt = select(RecruitmentBatch)
+    if role:
+        stmt = stmt.where(RecruitmentBatch.role == role)
+    total = db.scalar(select(func.count()).select_from(stmt.subquery()))
+    rows = db.execute(stmt.order_by(RecruitmentBatch.created_at.desc()).limit(limit).offset(offset)).scalars().all()
+
+    counts = {}
+    if rows:
+        counts = dict(
+            db.execute(
+                select(Candidate.batch_id, func.count())
+                .where(Candidate.batch_id.in_([b.id for b in rows]))
+                .group_by(Candidate.batch_id)
+            ).all()
+        )
+    items = [_batch_read(b, counts.get(b.id, 0)) for b in rows]
+    return RecruitmentBatchesListResponse(items=items, total=total or 0)
 
 
+@router.get("/batches/{batch_id}", response_model=RecruitmentBatchDetail)
+def get_batch(batch_id: int, db: Session = Depends(get_db)):
+    b = db.get(RecruitmentBatch, batch_id)
+    if not b:
+        raise HTTPException(status_code=404, detail="Lot introuvable")
+    candidates = _candidate_dicts(b)
+    base = _batch_read(b, len(candidates))
+    return RecruitmentBatchDetail(
+        **base.model_dump(),
+        erreurs=json.loads(b.errors) if b.errors else [],
+        candidats=candidates,
+    )
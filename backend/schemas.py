@@ -30,9 +30,29 @@ class ContractRead(ContractBase):
         from_attributes = True
 
 
+class ContractsBulkCreate(BaseModel):
+    items: list[ContractCreate] = Field(min_length=1, max_length=500)
+
+
+class ContractBulkItemResult(BaseModel):
+    index: int
+    success: bool
+    contract: Optional[ContractRead] = None
+    error: Optional[str] = None
+
+
+class ContractsBulkResponse(BaseModel):
+    items: list[ContractBulkItemResult]
+    generated: int
+    failed: int
+
+
 class ContractsListResponse(BaseModel):
     items: list[ContractRead]
-    total: int
+    # None si total_mode=none
+    total: Optional[int] = None
+    # A repasser en ?cursor= pour la page suivante (None: dernière page)
+    next_cursor: Optional[str] = None
 
 
 # --- Recrutement ---
@@ -67,3 +87,33 @@ class CandidateOutput(BaseModel):
 class AnalyzeCVResponse(BaseModel):
     role: str
     candidates: list[CandidateOutput]
+
+
+class RescoreRequest(BaseModel):
+    batch_id: Optional[int] = None
+    # { key: { label, coefficient } } ou { key: coefficient }
+    criteria: dict = Field(default_factory=dict)
+    # Alternative à batch_id: candidats déjà extraits (ex: historique local)
+    candidats: Optional[list[dict]] = None
+    # Enregistre les nouveaux scores et coefficients sur le lot
+    save: bool = False
+
+
+class RecruitmentBatchRead(BaseModel):
+    id: int
+    role: str
+    mode: str
+    criteres: dict
+    file_count: int
+    candidate_count: int
+    created_at: datetime
+
+
+class RecruitmentBatchDetail(RecruitmentBatchRead):
+    erreurs: list[dict] = Field(default_factory=list)
+    candidats: list[dict]
+
+
+class RecruitmentBatchesListResponse(BaseModel):
+    items: list[RecruitmentBatchRead]
+    total: int
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:  # optionnel: accélère les gros lots, le calcul pur Python reste le repli
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
+
+
+# Score local et déterministe des candidats: mêmes normalisations que celles
+# décrites dans prompts/cv_analyzer.prompt.md, appliquées aux champs structurés
+# extraits par fichier. Re-classer avec d'autres coefficients ne nécessite
+# donc plus aucun appel au modèle.
+
+NEUTRAL = 0.5
+
+DIPLOME_SCORES = {"aucun": 0.0, "CAP/BEP": 0.3, "Bac": 0.5, "Bac+2/3": 0.7, "Bac+4/5": 1.0}
+LANGUES_SCORES = {"aucune": 0.0, "FR": 0.6, "EN": 0.4, "FR+EN": 1.0}
+
+
+def _clamp(x: float) -> float:
+    return min(max(float(x), 0.0), 1.0)
+
+
+def _num(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", ".").strip())
+        except ValueError:
+            return None
+    return None
+
+
+def _experience(c: dict) -> float:
+    years = _num(c.get("experience_annees"))
+    return NEUTRAL if years is None else _clamp(min(years, 10.0) / 10.0)
+
+
+def _diplome(c: dict) -> float:
+    return DIPLOME_SCORES.get(c.get("diplome"), NEUTRAL)
+
+
+def _distance(c: dict) -> float:
+    km = _num(c.get("distance_km"))
+    return NEUTRAL if km is None else _clamp(1.0 - min(km, 30.0) / 30.0)
+
+
+def _weekend(c: dict) -> float:
+    v = c.get("disponibilite_weekend")
+    if v is True:
+        return 1.0
+    if v is False:
+        return 0.0
+    return NEUTRAL
+
+
+def _langues(c: dict) -> float:
+    return LANGUES_SCORES.get(c.get("langues_fr_en"), NEUTRAL)
+
+
+FEATURES: Dict[str, Callable[[dict], float]] = {
+    "experience_annees": _experience,
+    "diplome": _diplome,
+    "distance_km": _distance,
+    "disponibilite_weekend": _weekend,
+    "langues_fr_en": _langues,
+}
+
+
+def _feature_value(c: dict, key: str) -> float:
+    fn = FEATURES.get(key)
+    if fn is not None:
+        return fn(c)
+    # Critère libre: note 0..1 donnée par le modèle lors de l'extraction
+    val = _num((c.get("evaluations") or {}).get(key))
+    return NEUTRAL if val is None else _clamp(val)
+
+
+class FeatureMatrix:
+    """Matrice candidats x critères des valeurs normalisées (0..1).
+
+    Construite une fois par lot; `scores()` n'est ensuite qu'un produit
+    matrice-vecteur avec les coefficients.
+    """
+
+    def __init__(self, keys: List[str], rows: List[List[float]]) -> None:
+        self.keys = keys
+        self.index = {k: i for i, k in enumerate(keys)}
+        self.rows = rows
+        self._array = np.asarray(rows, dtype=float).reshape(len(rows), len(keys)) if np is not None else None
+
+    @classmethod
+    def from_candidates(cls, candidates: List[dict], keys: Iterable[str] = ()) -> "FeatureMatrix":
+        all_keys = list(FEATURES)
+        for k in list(keys) + [k for c in candidates for k in (c.get("evaluations") or {})]:
+            if k not in all_keys:
+                all_keys.append(k)
+        rows = [[_feature_value(c, k) for k in all_keys] for c in candidates]
+        return cls(all_keys, rows)
+
+    def scores(self, coefficients: Dict[str, float]) -> List[float]:
+        weights = [0.0] * len(self.keys)
+        constant = 0.0
+        for key, coef in coefficients.items():
+            i = self.index.get(key)
+            if i is None:
+                constant += coef * NEUTRAL
+            else:
+                weights[i] = float(coef)
+        if self._array is not None:
+            return [round(float(s), 2) for s in self._array @ np.asarray(weights) + constant]
+        return [round(sum(v * w for v, w in zip(row, weights)) + constant, 2) for row in self.rows]
+
+
+def rank_candidates(candidates: List[dict], coefficients: Dict[str, float], matrix: Optional[FeatureMatrix] = None) -> List[dict]:
+    """Retourne des copies des candidats avec "score", triées par score décroissant."""
+    matrix = matrix or FeatureMatrix.from_candidates(candidates, coefficients)
+    scores = matrix.scores(coefficients)
+    out = [dict(c, score=s) for c, s in zip(candidates, scores)]
+    out.sort(key=lambda c: c["score"], reverse=True)
+    return out
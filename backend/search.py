@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import logging
+import re
+import unicodedata
+from typing import List, Optional
+
+from sqlalchemy import event, inspect, or_, text
+from sqlalchemy.engine import Connection, Engine
+
+from .models import Contract
+
+
+# Index de recherche des contrats, tenu à jour à chaque insert/update ORM:
+# - SQLite: table virtuelle FTS5 "contracts_fts" (rowid = id du contrat);
+# - PostgreSQL: table "contract_search" + index GIN tsvector et trigrammes.
+# Le texte est normalisé côté Python (minuscules, sans accents), ce qui rend la
+# recherche insensible aux accents sans extension "unaccent".
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# NIR: 13 caractères, 2A/2B pour la Corse, suivis ou non de la clé de 2 chiffres
+_SECU_RE = re.compile(r"^[12][0-9]{4}(?:[0-9]{2}|2A|2B)[0-9]{6}(?P<key>[0-9]{2})?$")
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contracts_fts USING fts5("
+    " noms, adresse, secu,"
+    " tokenize = 'unicode61 remove_diacritics 2',"
+    " prefix = '2 3')",
+]
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE TABLE IF NOT EXISTS contract_search ("
+    " contract_id INTEGER PRIMARY KEY REFERENCES contracts(id) ON DELETE CASCADE,"
+    " document TEXT NOT NULL,"
+    " secu VARCHAR(32) NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_contract_search_tsv ON contract_search USING GIN (to_tsvector('simple', document))",
+    "CREATE INDEX IF NOT EXISTS ix_contract_search_trgm ON contract_search USING GIN (document gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_contract_search_secu ON contract_search (secu)",
+    # Recherche par préfixe (NIR sans clé) quelle que soit la collation
+    "CREATE INDEX IF NOT EXISTS ix_contract_search_secu_prefix ON contract_search (secu varchar_pattern_ops)",
+]
+
+# Dialecte de l'index actif ("sqlite" / "postgresql"), None: repli ILIKE
+_backend: Optional[str] = None
+
+
+def normalize_text(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    txt = unicodedata.normalize("NFKD", value)
+    txt = "".join(ch for ch in txt if not unicodedata.combining(ch)).lower()
+    return " ".join(_TOKEN_RE.findall(txt))
+
+
+def normalize_secu(value: Optional[str]) -> str:
+    """NIR sans espaces/ponctuation (conserve 2A/2B pour la Corse)."""
+    if not value:
+        return ""
+    return re.sub(r"[^0-9AB]", "", value.upper())
+
+
+def _row_params(contract_id: int, prenom, nom, adresse, numero_secu) -> dict:
+    return {
+        "id": contract_id,
+        "noms": normalize_text(f"{prenom or ''} {nom or ''}"),
+        "adresse": normalize_text(adresse),
+        "secu": normalize_secu(numero_secu),
+    }
+
+
+def _upsert(conn: Connection, rows: List[dict]) -> None:
+    if not rows:
+        return
+    if _backend == "sqlite":
+        conn.execute(text("DELETE FROM contracts_fts WHERE rowid = :id"), rows)
+        conn.execute(
+            text("INSERT INTO contracts_fts (rowid, noms, adresse, secu) VALUES (:id, :noms, :adresse, :secu)"),
+            rows,
+        )
+    elif _backend == "postgresql":
+        conn.execute(
+            text(
+                "INSERT INTO contract_search (contract_id, document, secu)"
+                " VALUES (:id, :noms || ' ' || :adresse || ' ' || lower(:secu), :secu)"
+                " ON CONFLICT (contract_id) DO UPDATE SET document = EXCLUDED.document, secu = EXCLUDED.secu"
+            ),
+            rows,
+        )
+
+
+def _delete(conn: Connection, contract_id: int) -> None:
+    if _backend == "sqlite":
+        conn.execute(text("DELETE FROM contracts_fts WHERE rowid = :id"), {"id": contract_id})
+    elif _backend == "postgresql":
+        conn.execute(text("DELETE FROM contract_search WHERE contract_id = :id"), {"id": contract_id})
+
+
+_INDEXED_ATTRS = ("prenom", "nom", "adresse", "numero_secu")
+
+
+@event.listens_for(Contract, "after_insert")
+def _after_insert(mapper, connection, target: Contract) -> None:
+    if _backend:
+        _upsert(connection, [_row_params(target.id, target.prenom, target.nom, target.adresse, target.numero_secu)])
+
+
+@event.listens_for(Contract, "after_update")
+def _after_update(mapper, connection, target: Contract) -> None:
+    if not _backend:
+        return
+    state = inspect(target)
+    # Les changements de statut / chemin PDF ne touchent pas l'index
+    if any(state.attrs[a].history.has_changes() for a in _INDEXED_ATTRS):
+        _upsert(connection, [_row_params(target.id, target.prenom, target.nom, target.adresse, target.numero_secu)])
+
+
+@event.listens_for(Contract, "after_delete")
+def _after_delete(mapper, connection, target: Contract) -> None:
+    if _backend:
+        _delete(connection, target.id)
+
+
+def ensure_search_index(engine: Engine, batch_size: int = 1000) -> None:
+    """Crée l'index s'il manque et y ajoute les contrats non encore indexés."""
+    global _backend
+    dialect = engine.dialect.name
+    ddl = {"sqlite": _SQLITE_DDL, "postgresql": _POSTGRES_DDL}.get(dialect)
+    if ddl is None:
+        return
+    try:
+        with engine.begin() as conn:
+            for stmt in ddl:
+                conn.execute(text(stmt))
+    except Exception:
+        logger.exception("search: index plein texte indisponible (%s), repli sur ILIKE", dialect)
+        _backend = None
+        return
+    _backend = dialect
+
+    indexed = "SELECT rowid FROM contracts_fts" if dialect == "sqlite" else "SELECT contract_id FROM contract_search"
+    missing = text(
+        "SELECT id, prenom, nom, adresse, numero_secu FROM contracts"
+        f" WHERE id > :last_id AND id NOT IN ({indexed}) ORDER BY id LIMIT :n"
+    )
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(missing, {"last_id": last_id, "n": batch_size}).all()
+            if not rows:
+                break
+            _upsert(conn, [_row_params(*r) for r in rows])
+        last_id = rows[-1][0]
+
+
+def search_filter(q: str):
+    """Condition SQLAlchemy sur Contract pour la recherche `q`.
+
+    Un NIR complet (15 caractères) est cherché exactement, un NIR sans clé
+    (13 caractères) par préfixe; sinon chaque mot est un préfixe (nom, prénom,
+    adresse ou début de numéro de sécu).
+    """
+    compact = re.sub(r"[\s.\-]", "", q).upper()
+    m = _SECU_RE.match(compact)
+    secu = compact if m else ""
+    exact = bool(m and m.group("key"))
+    tokens = _TOKEN_RE.findall(normalize_text(q))
+
+    if _backend == "sqlite":
+        if secu:
+            match = f'secu : "{secu}"' if exact else f'secu : "{secu}"*'
+        elif tokens:
+            match = " AND ".join(f'"{t}"*' for t in tokens)
+        else:
+            return Contract.id.is_(None)
+        return Contract.id.in_(
+            text("SELECT rowid FROM contracts_fts WHERE contracts_fts MATCH :fts_q").bindparams(fts_q=match)
+        )
+
+    if _backend == "postgresql":
+        if secu:
+            cond = "secu = :secu_q" if exact else "secu LIKE :secu_q || '%'"
+            return Contract.id.in_(
+                text(f"SELECT contract_id FROM contract_search WHERE {cond}").bindparams(secu_q=secu)
+            )
+        if not tokens:
+            return Contract.id.is_(None)
+        return Contract.id.in_(
+            text(
+                "SELECT contract_id FROM contract_search"
+                " WHERE to_tsvector('simple', document) @@ to_tsquery('simple', :ts_q)"
+                " OR document LIKE :like_q"
+            ).bindparams(ts_q=" & ".join(f"{t}:*" for t in tokens), like_q=f"%{' '.join(tokens)}%")
+        )
+
+    # Pas d'index: comportement historique
+    like = f"%{q}%"
+    return or_(
+        Contract.prenom.ilike(like),
+        Contract.nom.ilike(like),
+        Contract.numero_secu.ilike(like),
+        Contract.adresse.ilike(like),
+    )
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import signal
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+
+# Configuration de l'application: config.json (chemin: CONFIG_PATH) complété
+# par les variables d'environnement, qui l'emportent:
+#   GENERATED_DIR, STORES="AEJB,JAB", PDF_TITLE, PDF_FOOTER_TEXT,
+#   TEMPLATE_<STORE>=chemin du template texte du magasin
+#
+# Lue et validée une fois; rechargée sur SIGHUP ou quand le fichier change
+# (vérification en tâche de fond, aucune lecture pendant les requêtes). Une
+# configuration invalide au rechargement est ignorée: la précédente reste active.
+# Le dossier servi sous /files est monté au démarrage: changer generated_dir
+# demande un redémarrage pour cette route.
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv("CONFIG_PATH") or "config.json"
+# Intervalle de vérification du fichier (secondes); 0 désactive le rechargement automatique
+SETTINGS_RELOAD_INTERVAL = float(os.getenv("SETTINGS_RELOAD_INTERVAL") or 2.0)
+
+
+@dataclass(frozen=True)
+class PdfSettings:
+    title: str = "Contrat"
+    footer_text: str = ""
+
+
+@dataclass(frozen=True)
+class Settings:
+    stores: Tuple[str, ...] = ()
+    generated_dir: Path = Path("generated")
+    pdf: PdfSettings = field(default_factory=PdfSettings)
+    # Magasin -> chemin du template texte
+    templates: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    pdf_templates: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    docx_templates: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    # Fichier d'origine (None: valeurs par défaut + environnement)
+    source: Optional[str] = None
+
+    @property
+    def generated_base(self) -> str:
+        """Chemin absolu de generated_dir (préfixe des chemins servis sous /files)."""
+        return os.path.abspath(str(self.generated_dir))
+
+    @classmethod
+    def parse(cls, data: dict, env: Mapping[str, str] = os.environ, source: Optional[str] = None) -> "Settings":
+        """Valide le contenu de config.json et applique les surcharges d'environnement.
+
+        ValueError si une valeur n'a pas le type attendu.
+        """
+        if not isinstance(data, dict):
+            raise ValueError("config: un objet JSON est attendu")
+
+        stores = data.get("stores", [])
+        if env.get("STORES"):
+            stores = [s.strip() for s in env["STORES"].split(",") if s.strip()]
+        if not isinstance(stores, list) or not all(isinstance(s, str) and s for s in stores):
+            raise ValueError("config: 'stores' doit être une liste de noms de magasins")
+
+        generated_dir = env.get("GENERATED_DIR") or data.get("generated_dir", "generated")
+        if not isinstance(generated_dir, str) or not generated_dir.strip():
+            raise ValueError("config: 'generated_dir' doit être un chemin non vide")
+
+        pdf = data.get("pdf", {}) or {}
+        if not isinstance(pdf, dict):
+            raise ValueError("config: 'pdf' doit être un objet")
+        title = env.get("PDF_TITLE") or pdf.get("title", PdfSettings.title)
+        footer_text = env.get("PDF_FOOTER_TEXT") or pdf.get("footer_text", PdfSettings.footer_text)
+        if not isinstance(title, str) or not isinstance(footer_text, str):
+            raise ValueError("config: 'pdf.title' et 'pdf.footer_text' doivent être des chaînes")
+
+        def mapping(key: str) -> dict:
+            value = data.get(key, {}) or {}
+            if not isinstance(value, dict) or not all(isinstance(k, str) and isinstance(v, str) for k, v in value.items()):
+                raise ValueError(f"config: '{key}' doit associer un magasin à un chemin")
+            return dict(value)
+
+        templates = mapping("templates")
+        for name, value in env.items():
+            if name.startswith("TEMPLATE_") and value:
+                templates[name[len("TEMPLATE_"):]] = value
+
+        return cls(
+            stores=tuple(stores),
+            generated_dir=Path(generated_dir),
+            pdf=PdfSettings(title=title, footer_text=footer_text),
+            templates=MappingProxyType(templates),
+            pdf_templates=MappingProxyType(mapping("pdf_templates")),
+            docx_templates=MappingProxyType(mapping("docx_templates")),
+            source=source,
+        )
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class SettingsManager:
+    def __init__(self, path: str = CONFIG_PATH) -> None:
+        self.path = path
+        self._settings: Optional[Settings] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _read(self) -> Tuple[Settings, Optional[Tuple[int, int]]]:
+        stamp = _stamp(self.path)
+        if stamp is None:
+            logger.warning("settings: %s introuvable, valeurs par défaut", self.path)
+            settings = Settings.parse({})
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                settings = Settings.parse(json.load(f), source=self.path)
+        settings.generated_dir.mkdir(parents=True, exist_ok=True)
+        return settings, stamp
+
+    def get(self) -> Settings:
+        settings = self._settings
+        if settings is None:
+            with self._lock:
+                if self._settings is None:
+                    # Premier accès: une configuration invalide est une erreur (pas de repli silencieux)
+                    self._settings, self._stamp = self._read()
+                    # Processus sans hook de démarrage (pool de rendu PDF): surveillance démarrée ici
+                    self.start_watcher()
+                settings = self._settings
+        return settings
+
+    def reload(self, force: bool = False) -> bool:
+        """Relit la configuration si le fichier a changé (ou si `force`). True si elle a été remplacée."""
+        current = _stamp(self.path)
+        if not force and self._settings is not None and current == self._stamp:
+            return False
+        try:
+            settings, stamp = self._read()
+        except Exception:
+            logger.exception("settings: configuration %s invalide, la précédente reste active", self.path)
+            # Pas de nouvel essai (ni de nouveau log) avant la prochaine modification du fichier
+            self._stamp = current
+            return False
+        with self._lock:
+            self._settings, self._stamp = settings, stamp
+        logger.info("settings: configuration rechargée depuis %s", self.path)
+        return True
+
+    # --- Rechargement ---
+
+    def start_watcher(self, interval: Optional[float] = None) -> None:
+        if interval is None:
+            interval = SETTINGS_RELOAD_INTERVAL
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval,), name="settings-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.reload()
+
+    def _after_fork(self) -> None:
+        # Processus enfant d'un fork: le thread de surveillance n'y existe pas et
+        # le verrou a pu être copié pris; configuration relue au prochain accès
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._settings = None
+        self._stamp = None
+
+    def install_sighup(self) -> bool:
+        """Rechargement forcé sur SIGHUP (thread principal, plateformes POSIX uniquement)."""
+        if not hasattr(signal, "SIGHUP") or threading.current_thread() is not threading.main_thread():
+            return False
+        previous = signal.getsignal(signal.SIGHUP)
+
+        def handler(signum, frame) -> None:
+            # Hors du gestionnaire de signal: la relecture prend un verrou et fait des E/S
+            threading.Thread(target=self.reload, kwargs={"force": True}, name="settings-sighup", daemon=True).start()
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signal.SIGHUP, handler)
+        return True
+
+
+_manager: Optional[SettingsManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_settings_manager() -> SettingsManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = SettingsManager()
+    return _manager
+
+
+def get_settings() -> Settings:
+    """Configuration courante; utilisable comme dépendance FastAPI (Depends(get_settings))."""
+    return get_settings_manager().get()
+
+
+def _reset_after_fork() -> None:
+    global _manager_lock
+    _manager_lock = threading.Lock()
+    if _manager is not None:
+        _manager._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    # Processus forkés (workers, pool "fork"): leur propre chargement et leur propre surveillance
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+try:  # optionnel: sans le module brotli, seules les variantes gzip sont servies
+    import brotli
+except Exception:  # pragma: no cover
+    brotli = None
+
+
+# Frontend (index.html, /assets) servi depuis la mémoire: chaque fichier est lu
+# une fois, compressé à l'avance (brotli, gzip) et identifié par un ETag fort
+# (empreinte du contenu). Les tablettes des magasins revalident index.html
+# (304 sans corps) et gardent en cache, sans requête, les assets appelés avec
+# ?v=<empreinte>. Un fichier modifié sur disque est relu à la requête suivante.
+
+logger = logging.getLogger(__name__)
+
+# Assets versionnés (?v= égal à l'empreinte courante): cache navigateur d'un an
+IMMUTABLE = "public, max-age=31536000, immutable"
+# index.html et assets non versionnés: revalidation à chaque chargement
+REVALIDATE = "no-cache"
+
+# En dessous, la compression ne fait rien gagner (en-têtes, paquet unique)
+_MIN_COMPRESS_SIZE = 512
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml", "application/manifest+json")
+_ENCODINGS = ("br", "gzip")
+
+
+@dataclass(frozen=True)
+class Asset:
+    content_type: str
+    digest: str
+    # Corps par encodage: "identity" toujours, "br"/"gzip" si plus petits
+    bodies: Dict[str, bytes]
+    stamp: Tuple[int, int]
+
+    @property
+    def version(self) -> str:
+        return self.digest[:12]
+
+    def etag(self, encoding: str = "identity") -> str:
+        # Un ETag fort par représentation (les octets diffèrent selon l'encodage)
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest[:24]}{suffix}"'
+
+
+def _compressible(content_type: str) -> bool:
+    return content_type.startswith(_COMPRESSIBLE)
+
+
+def _encode(data: bytes, content_type: str) -> Dict[str, bytes]:
+    bodies = {"identity": data}
+    if len(data) < _MIN_COMPRESS_SIZE or not _compressible(content_type):
+        return bodies
+    candidates = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        candidates["br"] = brotli.compress(data, quality=11)
+    for encoding, body in candidates.items():
+        if len(body) < len(data):
+            bodies[encoding] = body
+    return bodies
+
+
+def _accepted(accept_encoding: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        token, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: Optional[str], available) -> str:
+    """Meilleur encodage disponible accepté par le client (br > gzip > identity)."""
+    if not accept_encoding:
+        return "identity"
+    accepted = _accepted(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in _ENCODINGS:
+        if encoding in available and accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: Optional[str], etags: Iterable[str]) -> bool:
+    """En-tête If-None-Match satisfait par l'un des `etags` (réponse 304)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Comparaison faible (RFC 9110 §13.1.2): le préfixe W/ est ignoré
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return any(etag in tags for etag in etags)
+
+
+class PrecompressedFiles:
+    """Fichiers d'un dossier servis depuis la mémoire, précompressés.
+
+    Utilisable comme application ASGI (montage à la place de StaticFiles) ou
+    via response() depuis une route.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        url_prefix: str = "",
+        transform: Optional[Callable[[str, bytes], bytes]] = None,
+        preload: bool = True,
+    ) -> None:
+        self.directory = Path(directory).resolve()
+        self.url_prefix = url_prefix.rstrip("/")
+        self.transform = transform
+        self._assets: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+        if preload:
+            self.preload()
+
+    def preload(self) -> None:
+        raw = compressed = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                name = (Path(root) / filename).relative_to(self.directory).as_posix()
+                asset = self.get(name)
+                if asset is not None:
+                    raw += len(asset.bodies["identity"])
+                    compressed += min(len(b) for b in asset.bodies.values())
+        logger.info("static: %d fichier(s) de %s, %d o -> %d o compressés", len(self._assets), self.directory, raw, compressed)
+
+    def _resolve(self, name: str) -> Optional[Path]:
+        path = (self.directory / name.lstrip("/")).resolve()
+        if path != self.directory and self.directory not in path.parents:
+            return None
+        return path
+
+    def _load(self, name: str, path: Path, stamp: Tuple[int, int]) -> Asset:
+        data = path.read_bytes()
+        if self.transform is not None:
+            data = self.transform(name, data)
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        return Asset(
+            content_type=content_type,
+            digest=hashlib.sha256(data).hexdigest(),
+            bodies=_encode(data, content_type),
+            stamp=stamp,
+        )
+
+    def get(self, name: str) -> Optional[Asset]:
+        """Fichier `name` (relatif au dossier), relu si modifié sur disque; None s'il n'existe pas."""
+        path = self._resolve(name)
+        if path is None:
+            return None
+        try:
+            st = path.stat()
+        except OSError:
+            self._assets.pop(name, None)
+            return None
+        if not path.is_file():
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        asset = self._assets.get(name)
+        if asset is None or asset.stamp != stamp:
+            with self._lock:
+                asset = self._assets.get(name)
+                if asset is None or asset.stamp != stamp:
+                    asset = self._load(name, path, stamp)
+                    self._assets[name] = asset
+        return asset
+
+    def url(self, name: str) -> str:
+        """URL versionnée du fichier (`?v=<empreinte>`), à mettre en cache sans revalidation."""
+        asset = self.get(name)
+        base = f"{self.url_prefix}/{name.lstrip('/')}"
+        return f"{base}?v={asset.version}" if asset is not None else base
+
+    def response(self, request: Request, name: str, cache_control: Optional[str] = None) -> Response:
+        asset = self.get(name)
+        if asset is None:
+            return PlainTextResponse("Not Found", status_code=404)
+        if cache_control is None:
+            cache_control = IMMUTABLE if request.query_params.get("v") == asset.version else REVALIDATE
+        encoding = choose_encoding(request.headers.get("accept-encoding"), asset.bodies)
+        headers = {"ETag": asset.etag(encoding), "Cache-Control": cache_control}
+        if len(asset.bodies) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(request.headers.get("if-none-match"), (asset.etag(e) for e in asset.bodies)):
+            return Response(status_code=304, headers=headers)
+        body = asset.bodies[encoding]
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(body, media_type=asset.content_type, headers=headers)
+
+    async def __call__(self, scope, receive, send) -> None:
+        assert scope["type"] == "http"
+        request = Request(scope, receive)
+        if request.method not in ("GET", "HEAD"):
+            response: Response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            # Chemin relatif au point de montage (comme StaticFiles)
+            path, root = scope["path"], scope.get("root_path", "")
+            response = self.response(request, path[len(root):] if path.startswith(root) else path)
+        await response(scope, receive, send)
+
+
+def versioned_html(assets: PrecompressedFiles) -> Callable[[str, bytes], bytes]:
+    """Transformation des pages HTML: références "<préfixe>/<fichier>" -> URL versionnées."""
+    ref_re = re.compile(r"""(["'(])""" + re.escape(assets.url_prefix) + r"""/([^"'()?#\s]+)""")
+
+    def versioned(m: "re.Match[str]") -> str:
+        return m.group(1) + assets.url(m.group(2)) if assets.get(m.group(2)) else m.group(0)
+
+    def transform(name: str, data: bytes) -> bytes:
+        if not name.endswith(".html"):
+            return data
+        return ref_re.sub(versioned, data.decode("utf-8")).encode("utf-8")
+
+    return transform
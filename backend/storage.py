@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
+
+import httpx
+
+from .metrics import stage
+
+try:  # HTTP/2 (multiplexage sur une seule connexion) si le paquet h2 est installé
+    import h2  # noqa: F401
+    _HTTP2 = True
+except Exception:  # pragma: no cover
+    _HTTP2 = False
+
+
+logger = logging.getLogger(__name__)
+
+# Clients HTTP partagés par le process: connexions TCP/TLS réutilisées (keep-alive)
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS") or 20)
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT") or 30.0)
+# Tentatives supplémentaires sur erreur 5xx / réseau, backoff exponentiel
+STORAGE_RETRIES = int(os.getenv("STORAGE_RETRIES") or 3)
+STORAGE_BACKOFF = float(os.getenv("STORAGE_BACKOFF") or 0.5)
+# Taille des morceaux lus depuis un fichier pour l'upload en flux
+STORAGE_CHUNK_SIZE = 64 * 1024
+
+_clients_lock = threading.Lock()
+_sync_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=STORAGE_MAX_CONNECTIONS, max_keepalive_connections=STORAGE_MAX_CONNECTIONS)
+
+
+def get_http_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _clients_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(http2=_HTTP2, limits=_limits(), timeout=STORAGE_TIMEOUT)
+    return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        with _clients_lock:
+            if _async_client is None:
+                _async_client = httpx.AsyncClient(http2=_HTTP2, limits=_limits(), timeout=STORAGE_TIMEOUT)
+    return _async_client
+
+
+def close_http_clients() -> None:
+    """Ferme le client synchrone (le client async se ferme avec aclose_http_clients)."""
+    global _sync_client
+    with _clients_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+        _sync_client = None
+
+
+async def aclose_http_clients() -> None:
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+    close_http_clients()
+
+
+def _retryable(resp: Optional[httpx.Response]) -> bool:
+    return resp is None or resp.status_code >= 500
+
+
+def _delay(attempt: int) -> float:
+    return STORAGE_BACKOFF * (2 ** attempt)
+
+
+def _iter_file(fh: BinaryIO):
+    while True:
+        chunk = fh.read(STORAGE_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+Payload = Union[bytes, Path]
+
+
+class SupabaseStorageClient:
+    def __init__(self) -> None:
+        self.base_url: Optional[str] = os.getenv("SUPABASE_URL")
+        self.service_key: Optional[str] = os.getenv("SUPABASE_SERVICE_ROLE")
+        self.bucket: str = os.getenv("SUPABASE_BUCKET", "generated")
+
+    def is_configured(self) -> bool:
+        return bool(self.base_url and self.service_key and self.bucket)
+
+    def _check(self) -> None:
+        if not self.is_configured():
+            raise RuntimeError("Supabase Storage non configuré")
+
+    def _object_url(self, object_name: str) -> str:
+        # Endpoint: POST /storage/v1/object/{bucket}/{object}
+        return f"{self.base_url.rstrip('/')}/storage/v1/object/{self.bucket}/{object_name.lstrip('/')}"
+
+    def public_url(self, object_name: str) -> str:
+        # Public URL (bucket public)
+        return f"{self.base_url.rstrip('/')}/storage/v1/object/public/{self.bucket}/{object_name.lstrip('/')}"
+
+    def _headers(self, content_type: str, length: Optional[int] = None) -> dict:
+        headers = {
+            "Authorization": f"Bearer {self.service_key}",
+            "Content-Type": content_type,
+            "x-upsert": "true",
+        }
+        if length is not None:
+            headers["Content-Length"] = str(length)
+        return headers
+
+    def _result(self, object_name: str, resp: Optional[httpx.Response], error: Optional[Exception]) -> str:
+        if resp is None:
+            raise RuntimeError(f"Echec upload Supabase: {error}")
+        if resp.status_code not in (200, 201):
+            raise RuntimeError(f"Echec upload Supabase: {resp.status_code} {resp.text}")
+        return self.public_url(object_name)
+
+    # --- Synchrone ---
+
+    @stage("storage_upload")
+    def _post(self, object_name: str, content_type: str, open_body) -> str:
+        """POST avec reprises; `open_body()` fournit (corps, longueur) à chaque tentative."""
+        self._check()
+        client = get_http_client()
+        url = self._object_url(object_name)
+        resp, error = None, None
+        for attempt in range(STORAGE_RETRIES + 1):
+            body, length, close = open_body()
+            try:
+                resp, error = client.post(url, headers=self._headers(content_type, length), content=body), None
+            except httpx.TransportError as e:
+                resp, error = None, e
+            finally:
+                close()
+            if not _retryable(resp) or attempt == STORAGE_RETRIES:
+                break
+            logger.warning("storage: tentative %d échouée pour %s (%s)", attempt + 1, object_name,
+                           error or resp.status_code)
+            time.sleep(_delay(attempt))
+        return self._result(object_name, resp, error)
+
+    def upload_bytes(self, object_name: str, data: bytes, content_type: str = "application/pdf") -> str:
+        """
+        Uploads bytes to Supabase Storage (upsert) and returns a public URL.
+        Assumes the bucket is public. If not public, this will still upload but the URL may not be accessible.
+        """
+        return self._post(object_name, content_type, lambda: (data, None, lambda: None))
+
+    def upload_file(self, file_path: Path, object_name: Optional[str] = None, content_type: str = "application/pdf") -> str:
+        """Upload en flux depuis le fichier (par morceaux, sans le charger entièrement)."""
+        file_path = Path(file_path)
+        object_name = object_name or file_path.name
+
+        def open_body():
+            fh = open(file_path, "rb")
+            return _iter_file(fh), os.fstat(fh.fileno()).st_size, fh.close
+
+        return self._post(object_name, content_type, open_body)
+
+    def upload_many(
+        self,
+        items: Iterable[Tuple[str, Payload]],
+        content_type: str = "application/pdf",
+        concurrency: int = 8,
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        """Upload d'un lot [(object_name, octets | chemin)] sur le client partagé.
+
+        Retourne [(url | None, erreur | None)] dans l'ordre des éléments.
+        """
+        def one(item: Tuple[str, Payload]):
+            name, payload = item
+            try:
+                if isinstance(payload, (bytes, bytearray)):
+                    return self.upload_bytes(name, payload, content_type), None
+                return self.upload_file(payload, name, content_type), None
+            except Exception as e:
+                return None, str(e)
+
+        items = list(items)
+        if len(items) <= 1:
+            return [one(it) for it in items]
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as ex:
+            return list(ex.map(one, items))
+
+    # --- Asynchrone ---
+
+    @stage("storage_upload")
+    async def _apost(self, object_name: str, content_type: str, open_body) -> str:
+        self._check()
+        client = get_async_http_client()
+        url = self._object_url(object_name)
+        resp, error = None, None
+        for attempt in range(STORAGE_RETRIES + 1):
+            body, length, close = open_body()
+            try:
+                resp, error = await client.post(url, headers=self._headers(content_type, length), content=body), None
+            except httpx.TransportError as e:
+                resp, error = None, e
+            finally:
+                close()
+            if not _retryable(resp) or attempt == STORAGE_RETRIES:
+                break
+            logger.warning("storage: tentative %d échouée pour %s (%s)", attempt + 1, object_name,
+                           error or resp.status_code)
+            await asyncio.sleep(_delay(attempt))
+        return self._result(object_name, resp, error)
+
+    async def aupload_bytes(self, object_name: str, data: bytes, content_type: str = "application/pdf") -> str:
+        return await self._apost(object_name, content_type, lambda: (data, None, lambda: None))
+
+    async def aupload_file(self, file_path: Path, object_name: Optional[str] = None, content_type: str = "application/pdf") -> str:
+        file_path = Path(file_path)
+        object_name = object_name or file_path.name
+
+        def open_body():
+            fh = open(file_path, "rb")
+
+            async def chunks():
+                while True:
+                    chunk = await asyncio.to_thread(fh.read, STORAGE_CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+
+            return chunks(), os.fstat(fh.fileno()).st_size, fh.close
+
+        return await self._apost(object_name, content_type, open_body)
+
+    async def aupload_many(
+        self,
+        items: Iterable[Tuple[str, Payload]],
+        content_type: str = "application/pdf",
+        concurrency: int = 8,
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(name: str, payload: Payload):
+            async with sem:
+                try:
+                    if isinstance(payload, (bytes, bytearray)):
+                        return await self.aupload_bytes(name, payload, content_type), None
+                    return await self.aupload_file(payload, name, content_type), None
+                except Exception as e:
+                    return None, str(e)
+
+        return list(await asyncio.gather(*(one(n, p) for n, p in items)))
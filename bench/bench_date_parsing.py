@@ -0,0 +1,140 @@
+"""Normalisation d'un lot de 100 000 enregistrements extraits (normalization.normalize_records).
+
+    python bench/bench_date_parsing.py [--records 100000] [--distinct 5000] [--repeat 3]
+
+Chaque enregistrement porte trois dates (ISO, JJ/MM/AAAA, JJ.MM.AAAA) tirées
+d'un ensemble de `--distinct` valeurs, et une nationalité. Référence: l'ancien
+_normalize_fields de app.py (boucle datetime.strptime sur DATE_FORMATS, une
+exception par format essayé), reproduit ci-dessous. Les résultats des deux
+versions sont comparés avant la mesure.
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import os
+import random
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from backend import normalization  # noqa: E402
+from backend.normalization import DATE_FORMATS, DATE_KEY_GROUPS, normalize_records  # noqa: E402
+
+
+def legacy_to_dd_mm_yyyy(value: str):
+    """Conversion de date de l'ancien _normalize_fields."""
+    if not isinstance(value, str):
+        return value
+    raw = value.strip()
+    if not raw:
+        return raw
+    date_part = raw.split("T")[0].split(" ")[0]
+    for fmt in DATE_FORMATS:
+        try:
+            dt = datetime.strptime(date_part, fmt)
+            return dt.strftime("%d/%m/%Y")
+        except Exception:
+            pass
+    m = re.match(r"^\D*(\d{1,4})\D+(\d{1,2})\D+(\d{1,4})\D*$", date_part)
+    if m:
+        a, b, c = m.groups()
+        if len(a) == 4:
+            yyyy, mm, dd = a, b.zfill(2), c.zfill(2)
+        elif len(c) == 4:
+            dd, mm, yyyy = a.zfill(2), b.zfill(2), c
+        else:
+            return raw
+        try:
+            dt = datetime.strptime(f"{yyyy}-{mm}-{dd}", "%Y-%m-%d")
+            return dt.strftime("%d/%m/%Y")
+        except Exception:
+            return raw
+    return raw
+
+
+def legacy_normalize(records: list) -> list:
+    """Ancienne boucle: _normalize_fields appelé enregistrement par enregistrement."""
+    for payload in records:
+        for key in ("nationalite", "nationalité", "nationality"):
+            if key in payload and isinstance(payload[key], str):
+                if payload[key].strip().upper() in ("FRA", "FR"):
+                    payload[key] = "Française"
+        lower_to_key = {k.lower(): k for k in payload.keys()}
+        for group in DATE_KEY_GROUPS:
+            for k in group:
+                if k.lower() in lower_to_key:
+                    real_key = lower_to_key[k.lower()]
+                    payload[real_key] = legacy_to_dd_mm_yyyy(payload[real_key])
+                    break
+    return records
+
+
+def build_batch(n_records: int, n_distinct: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    start = date(1950, 1, 1)
+    days = [start + timedelta(days=rng.randrange(365 * 70)) for _ in range(n_distinct)]
+    return [
+        {
+            "nom": f"NOM{i}",
+            "nationalite": rng.choice(("FRA", "FR", "ITA", "Française")),
+            "date_naissance": rng.choice(days).isoformat(),
+            "date_debut": rng.choice(days).strftime("%d/%m/%Y"),
+            "date_expiration": rng.choice(days).strftime("%d.%m.%Y"),
+        }
+        for i in range(n_records)
+    ]
+
+
+def best_of(fn, batch: list, repeat: int) -> float:
+    """Meilleur temps sur `repeat` passes, chaque passe sur une copie neuve et caches vidés."""
+    best = float("inf")
+    for _ in range(repeat):
+        records = copy.deepcopy(batch)
+        normalization.to_fr_date.cache_clear()
+        normalization._plan.cache_clear()
+        t0 = time.perf_counter()
+        fn(records)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def without_memo(records: list) -> list:
+    cached = normalization.to_fr_date
+    normalization.to_fr_date = cached.__wrapped__
+    try:
+        return normalize_records(records)
+    finally:
+        normalization.to_fr_date = cached
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--distinct", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    batch = build_batch(args.records, args.distinct)
+    # Mêmes dates en sortie (les nationalités hors FRA/FR ne sont pas comparables)
+    keys = [k for group in DATE_KEY_GROUPS for k in group[:1]]
+    new = normalize_records(copy.deepcopy(batch))
+    old = legacy_normalize(copy.deepcopy(batch))
+    assert [[r[k] for k in keys] for r in new] == [[r[k] for k in keys] for r in old]
+
+    legacy = best_of(legacy_normalize, batch, args.repeat)
+    plain = best_of(without_memo, batch, args.repeat)
+    memo = best_of(normalize_records, batch, args.repeat)
+    print(f"{args.records} enregistrements, 3 dates chacun, {args.distinct} dates distinctes")
+    print(f"  ancienne boucle strptime       {legacy * 1000:8.1f} ms")
+    print(f"  normalize_records sans mémo    {plain * 1000:8.1f} ms  (x{legacy / plain:.1f})")
+    print(f"  normalize_records              {memo * 1000:8.1f} ms  (x{legacy / memo:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compilation d'un template texte synthétique de 10 000 lignes (pdf._compile_template_text).
+
+    python bench/bench_template_parser.py [--lines 10000] [--repeat 5]
+
+Deux formes de template: paragraphes séparés par de courtes séries de lignes
+vides, et une seule longue série de lignes vides (cas quadratique de l'ancien
+parseur, qui rebalayait les lignes vides voisines pour chaque ligne). La
+recherche des voisins non vides de l'ancien parseur est mesurée à titre de
+référence.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from backend import pdf  # noqa: E402
+
+
+def short_runs(n_lines: int) -> str:
+    """Paragraphes, articles et puces séparés par 4 lignes vides."""
+    lines = ["CONTRAT DE TRAVAIL A DUREE INDETERMINEE A TEMPS COMPLET"]
+    i = 0
+    while len(lines) < n_lines:
+        lines.append(f"ARTICLE {i} – Dispositions {i}")
+        lines.append(f"Le salarié {{{{Prénom}}}} {{{{Nom}}}} exerce la fonction numéro {i}:")
+        lines.append(f"- obligation {i}")
+        lines.extend([""] * 4)
+        i += 1
+    return "\n".join(lines[:n_lines])
+
+
+def one_long_run(n_lines: int) -> str:
+    """Un en-tête, n_lines - 2 lignes vides, une signature."""
+    return "\n".join(["Entre les soussignés :"] + [""] * (n_lines - 2) + ["d'une part,"])
+
+
+def legacy_neighbours(template_text: str) -> int:
+    """Recherche des lignes non vides voisines telle que la faisait l'ancien parseur."""
+    lines = template_text.split("\n")
+    found = 0
+    for i in range(len(lines)):
+        j = i + 1
+        while j < len(lines) and not lines[j].strip():
+            j += 1
+        k = i - 1
+        while k >= 0 and not lines[k].strip():
+            k -= 1
+        found += (j < len(lines)) + (k >= 0)
+    return found
+
+
+def best_of(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, build in (("séries de 4 lignes vides", short_runs), ("une seule série vide", one_long_run)):
+        text = build(args.lines)
+        compiled = best_of(pdf._compile_template_text, text, args.repeat)
+        # Quadratique: une seule mesure suffit
+        legacy = best_of(legacy_neighbours, text, 1)
+        blocks = len(pdf._compile_template_text(text))
+        print(
+            f"{name:<26} {args.lines} lignes, {blocks} blocs: "
+            f"compilation {compiled * 1000:8.1f} ms | voisins (ancien parseur) {legacy * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+
+# Environnement isolé, fixé avant tout import de backend (variables lues à l'import):
+# base SQLite, file de travaux et PDF générés dans un dossier temporaire.
+# Chemins relatifs (prompts/, templates/, config.json) résolus depuis la racine du dépôt.
+
+ROOT = Path(__file__).resolve().parent.parent
+_TMP = Path(tempfile.mkdtemp(prefix="backend-tests-"))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP / 'test.db'}"
+os.environ["JOBS_DB_PATH"] = str(_TMP / "jobs.db")
+os.environ["GENERATED_DIR"] = str(_TMP / "generated")
+os.environ["EXTRACT_CACHE_BACKEND"] = "memory"
+os.environ["DOCS_GC_INTERVAL"] = "0"
+os.environ["SETTINGS_RELOAD_INTERVAL"] = "0"
+os.environ["PROMPTS_RELOAD_INTERVAL"] = "0"
+os.environ["PDF_RENDER_PROCESSES"] = "1"
+
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _database():
+    from backend.database import Base, engine
+    from backend import models  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    from backend.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+from backend import app as app_module, pdfdoc
+from backend.cache import MemoryCacheBackend, ExtractionCache, SQLiteCacheBackend, make_cache_key
+from backend.ingestion import ingestion_key
+
+PDF_BYTES = b"%PDF-1.4\n1 0 obj\n<<>>\nendobj\ntrailer\n<<>>\n%%EOF\n"
+
+
+def _key(data: bytes, mime: str) -> str:
+    return make_cache_key(data, "cni", "prompt", "gpt-4o-mini", ingestion_key(data, mime))
+
+
+def test_key_depends_on_declared_type_when_content_is_not_recognised():
+    data = b"Nom: DUPONT\nPrenom: Jean\n"
+    assert _key(data, "text/plain") != _key(data, "application/octet-stream")
+
+
+def test_key_follows_sniffed_type_not_browser_label():
+    # Signature PDF: le type déclaré (souvent vide ou faux) ne change pas le traitement
+    assert _key(PDF_BYTES, "application/pdf") == _key(PDF_BYTES, "")
+    assert _key(PDF_BYTES, "application/pdf") == _key(PDF_BYTES, "image/jpeg")
+
+
+def test_key_depends_on_pdf_path(monkeypatch):
+    text_key = _key(PDF_BYTES, "application/pdf")
+    monkeypatch.setattr(pdfdoc, "PDF_TEXT_PATH", "off")
+    assert _key(PDF_BYTES, "application/pdf") != text_key
+
+
+def test_cache_roundtrip_returns_fresh_copy():
+    cache = ExtractionCache(MemoryCacheBackend(max_entries=2, ttl=60))
+    key = _key(b"data", "text/plain")
+    assert cache.set(key, {"nom": "DUPONT"})
+    value, ttl = cache.get(key)
+    value["nom"] = "changé"
+    assert cache.get(key)[0] == {"nom": "DUPONT"}
+    assert 0 < ttl <= 60
+    assert not cache.set(key, {"raw": "pas du JSON"})
+
+
+def test_sqlite_prunes_without_counting_every_insert(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries=20, ttl=60, prune_interval=3600)
+    counts = []
+    backend._conn.set_trace_callback(lambda sql: counts.append(sql) if "COUNT(*)" in sql else None)
+
+    for i in range(100):
+        backend.set(f"k{i}", "{}")
+    rows = backend._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+    assert 18 <= rows <= 20
+    # Recompté au dépassement de max_entries (table ramenée à 18), pas à chaque écriture
+    assert len(counts) <= 100 // 2
+    # Les plus récemment lues sont conservées
+    assert backend.get("k99") is not None and backend.get("k0") is None
+
+
+def test_sqlite_prunes_expired_on_timer(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries=100, ttl=-1, prune_interval=0)
+    backend.set("a", "{}")
+    backend.set("b", "{}")
+    assert backend._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0] == 0
+
+
+class _ThreadRecordingBackend(MemoryCacheBackend):
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value):
+        self.threads.append(threading.get_ident())
+        super().set(key, value)
+
+
+def test_extract_cache_io_runs_off_the_event_loop(monkeypatch):
+    backend = _ThreadRecordingBackend()
+    monkeypatch.setattr(app_module, "EXTRACT_CACHE", ExtractionCache(backend))
+
+    async def aextract(content, mime, system_prompt=None, doc_type="cni"):
+        return {"nom": "DUPONT"}
+
+    monkeypatch.setattr(app_module.EXTRACTOR, "aextract", aextract)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        first = await app_module._extract_document(b"Nom: DUPONT", "text/plain", "cni")
+        second = await app_module._extract_document(b"Nom: DUPONT", "text/plain", "cni")
+        return loop_thread, first, second
+
+    loop_thread, (_, miss), (_, hit) = asyncio.run(main())
+    assert "fwd=miss; stored" in miss and "hit" in hit
+    assert len(backend.threads) == 3 and loop_thread not in backend.threads
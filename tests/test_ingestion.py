@@ -0,0 +1,50 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend import ingestion
+from backend.ingestion import UnsupportedDocument, document_parts, iter_parts, sniff_mime
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_sniff_ignores_declared_type():
+    assert sniff_mime(_png(), "application/pdf") == "image/png"
+    assert sniff_mime(b"%PDF-1.4\n", "image/jpeg") == ingestion.PDF
+
+
+def test_text_and_image_parts():
+    assert document_parts(b"Jean DUPONT", filename="cv.txt", declared_mime="text/plain") == [
+        {"type": "text", "text": "[TEXTE:cv.txt]\nJean DUPONT"},
+    ]
+    parts = document_parts(_png(), filename="cni.png", declared_mime="image/png")
+    assert [p["type"] for p in parts] == ["image_url"]
+
+
+@pytest.mark.parametrize("data, mime", [
+    (b"\x00\x01binaire", "application/octet-stream"),
+    (b"pas une image", "image/png"),
+])
+def test_unsupported_raises_at_call(data, mime):
+    # Refus à l'appel, avant tout parcours des blocs
+    with pytest.raises(UnsupportedDocument, match="piece.bin"):
+        iter_parts(data, filename="piece.bin", declared_mime=mime)
+
+
+def test_extract_returns_400_for_unsupported():
+    from backend.app import app
+
+    with TestClient(app) as client:
+        r = client.post(
+            "/extract",
+            files={"file": ("piece.bin", b"\x00\x01binaire", "application/octet-stream")},
+            data={"doc_type": "cni"},
+        )
+    assert r.status_code == 400
+    assert "non pris en charge" in r.json()["detail"]
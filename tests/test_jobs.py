@@ -0,0 +1,230 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import jobs
+from backend.jobs import JobQueue, JobWorkerPool, register_handler
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), worker_id="A")
+
+
+def _other(queue, worker_id="B"):
+    # Autre process partageant le même jobs.db
+    return JobQueue(queue.path, worker_id=worker_id)
+
+
+def _types(queue, job_id):
+    return [e["type"] for e in queue.events_since(job_id)]
+
+
+# --- File ---
+
+def test_enqueue_and_claim_oldest_ready(queue):
+    first = queue.enqueue("t_echo", {"n": 1}, [{"filename": "a.txt", "mime": "text/plain", "content": b"a"}])
+    second = queue.enqueue("t_echo", {"n": 2})
+    assert queue.claim(["autre"]) is None
+
+    job = queue.claim(["t_echo"])
+    assert (job["id"], job["status"], job["attempts"], job["params"]) == (first, "running", 1, {"n": 1})
+    assert queue.load_files(first) == [{"filename": "a.txt", "mime": "text/plain", "content": b"a"}]
+    assert queue.claim(["t_echo"])["id"] == second
+    assert queue.claim(["t_echo"]) is None
+    assert queue.queued_count() == 2
+
+
+def test_fail_backoff_then_final_failure(queue):
+    job_id = queue.enqueue("t_echo", {}, [{"filename": "a", "content": b"a"}], max_attempts=2)
+    queue.claim(["t_echo"])
+    queue.add_event(job_id, "item", {"i": 0}, item_done=True)
+
+    before = time.time()
+    assert queue.fail(job_id, "boom", backoff=30) is True
+    job = queue.get(job_id)
+    assert (job["status"], job["done"], job["error"]) == ("queued", 0, "boom")
+    # Replanifié après le délai: pas repris tout de suite, résultats partiels effacés
+    assert queue.claim(["t_echo"]) is None
+    assert _types(queue, job_id) == ["retry"]
+
+    queue._conn.execute("UPDATE jobs SET run_after = ? WHERE id = ?", (before, job_id))
+    assert queue.claim(["t_echo"])["attempts"] == 2
+    assert queue.fail(job_id, "encore") is False
+    assert queue.get(job_id)["status"] == "failed"
+    assert queue.load_files(job_id) == []
+    assert _types(queue, job_id) == ["retry", "failed"]
+
+
+def test_backoff_doubles_per_attempt(queue):
+    job_id = queue.enqueue("t_echo", {}, max_attempts=3)
+    delays = []
+    for _ in range(2):
+        queue._conn.execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+        queue.claim(["t_echo"])
+        now = time.time()
+        queue.fail(job_id, "x", backoff=10)
+        run_after = queue._conn.execute("SELECT run_after FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        delays.append(round(run_after - now))
+    assert delays == [10, 20]
+
+
+# --- Baux ---
+
+def test_live_lease_is_not_requeued_by_another_process(queue):
+    job_id = queue.enqueue("t_echo", {})
+    queue.claim(["t_echo"])
+
+    starting = _other(queue)
+    assert starting.requeue_expired(lease=60) == 0
+    assert starting.claim(["t_echo"]) is None
+    assert queue.heartbeat(job_id) is True
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_expired_lease_is_requeued_and_old_owner_loses_it(queue):
+    job_id = queue.enqueue("t_echo", {}, [{"filename": "a", "content": b"a"}])
+    queue.claim(["t_echo"])
+    queue.add_event(job_id, "item", {"i": 0}, item_done=True)
+    queue._conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 120, job_id))
+
+    other = _other(queue)
+    assert other.requeue_expired(lease=60) == 1
+    assert queue.get(job_id)["done"] == 0
+    assert other.claim(["t_echo"])["attempts"] == 2
+
+    # L'ancien titulaire ne peut plus rien écrire
+    assert queue.heartbeat(job_id) is False
+    assert queue.add_event(job_id, "item", {"i": 9}, item_done=True) is False
+    assert queue.complete(job_id, {"from": "A"}) is False
+    assert queue.fail(job_id, "x") is False
+
+    assert other.complete(job_id, {"from": "B"}) is True
+    job = queue.get(job_id)
+    assert (job["status"], job["result"]) == ("done", {"from": "B"})
+    assert _types(queue, job_id) == ["retry", "done"]
+
+
+def test_release_requeues_own_job_only(queue):
+    job_id = queue.enqueue("t_echo", {})
+    queue.claim(["t_echo"])
+    assert _other(queue).release(job_id) is False
+    assert queue.release(job_id) is True
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_pool_start_does_not_steal_running_jobs(queue):
+    job_id = queue.enqueue("t_echo", {})
+    queue.claim(["t_echo"])
+
+    async def start_and_stop():
+        pool = JobWorkerPool(_other(queue), workers=1)
+        pool.start()
+        await asyncio.sleep(0.05)
+        await pool.stop()
+
+    asyncio.run(start_and_stop())
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"]) == ("running", 1)
+
+
+_stopped = []
+
+
+@register_handler("t_slow", public=False)
+async def _slow_handler(job, files, ctx):
+    try:
+        await asyncio.sleep(10)
+    except asyncio.CancelledError:
+        _stopped.append(job["id"])
+        raise
+    return {}
+
+
+def test_worker_stops_when_lease_is_lost(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_HEARTBEAT_INTERVAL", 0.02)
+    monkeypatch.setattr(jobs, "JOBS_POLL_INTERVAL", 0.01)
+    job_id = queue.enqueue("t_slow", {})
+
+    async def main():
+        pool = JobWorkerPool(queue, workers=1)
+        pool.start()
+        try:
+            while queue.get(job_id)["status"] != "running":
+                await asyncio.sleep(0.01)
+            # Un autre process juge le bail expiré et reprend le travail
+            other = _other(queue)
+            assert await asyncio.to_thread(other.requeue_expired, -1) == 1
+            assert other.claim(["t_slow"]) is not None
+            while job_id not in _stopped:
+                await asyncio.sleep(0.01)
+        finally:
+            await pool.stop()
+
+    asyncio.run(main())
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"]) == ("running", 2)
+
+
+# --- Exécution et SSE ---
+
+_failures = {}
+
+
+@register_handler("t_items", public=False, max_attempts=2)
+async def _items_handler(job, files, ctx):
+    for f in files:
+        await ctx.item_done({"fichier": f["filename"]})
+    if _failures.pop(job["id"], False):
+        raise RuntimeError("panne")
+    return {"n": len(files)}
+
+
+def _run_pool_until_done(queue, job_id):
+    async def main():
+        pool = JobWorkerPool(queue, workers=1)
+        pool.start()
+        try:
+            while queue.get(job_id)["status"] not in jobs.TERMINAL_STATUSES:
+                await asyncio.sleep(0.01)
+        finally:
+            await pool.stop()
+
+    asyncio.run(main())
+
+
+def test_sse_event_order_with_retry(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_RETRY_BACKOFF", 0.0)
+    monkeypatch.setattr(jobs, "JOBS_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(jobs, "_queue", queue)
+    files = [{"filename": f"f{i}.pdf", "content": b"x"} for i in range(2)]
+    job_id = queue.enqueue("t_items", {}, files, max_attempts=2)
+    _failures[job_id] = True
+
+    _run_pool_until_done(queue, job_id)
+
+    app = FastAPI()
+    app.include_router(jobs.router)
+    with TestClient(app) as client:
+        with client.stream("GET", f"/jobs/{job_id}/events") as r:
+            body = r.read().decode()
+        view = client.get(f"/jobs/{job_id}").json()
+
+    events = [
+        dict(line.split(": ", 1) for line in block.splitlines())
+        for block in body.strip().split("\n\n")
+    ]
+    # Première tentative: items effacés à la replanification, puis seconde tentative complète
+    assert [e["event"] for e in events] == ["retry", "item", "item", "done"]
+    assert [int(e["id"]) for e in events] == sorted(int(e["id"]) for e in events)
+    assert (view["status"], view["done"], view["attempts"], view["result"]) == ("done", 2, 2, {"n": 2})
+    assert [i["fichier"] for i in view["items"]] == ["f0.pdf", "f1.pdf"]
+
+    # Reprise SSE après le dernier id reçu: seulement la suite
+    with TestClient(app) as client:
+        with client.stream("GET", f"/jobs/{job_id}/events", headers={"Last-Event-ID": events[1]["id"]}) as r:
+            resumed = r.read().decode()
+    assert [l.split(": ", 1)[1] for l in resumed.splitlines() if l.startswith("event:")] == ["item", "done"]
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+from backend import llm
+
+
+async def _contend(n_tasks: int) -> int:
+    """Lance n_tasks appels simulés; retourne le nombre maximal d'appels simultanés."""
+    active = peak = 0
+
+    async def call():
+        nonlocal active, peak
+        async with llm.model_slot():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(call() for _ in range(n_tasks)))
+    return peak
+
+
+def test_model_slot_limits_concurrency(monkeypatch):
+    monkeypatch.setattr(llm, "MODEL_CONCURRENCY", 2)
+    assert asyncio.run(_contend(6)) == 2
+
+
+def test_model_slot_works_across_event_loops(monkeypatch):
+    monkeypatch.setattr(llm, "MODEL_CONCURRENCY", 1)
+    # Boucles successives (asyncio.run) puis boucle d'un autre thread (pool de travaux)
+    assert asyncio.run(_contend(3)) == 1
+    assert asyncio.run(_contend(3)) == 1
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(asyncio.run(_contend(3))))
+    thread.start()
+    thread.join(10)
+    assert results == [1]
+
+
+def test_model_slot_is_shared_within_a_loop():
+    async def main():
+        return llm.model_slot() is llm.model_slot()
+
+    assert asyncio.run(main())
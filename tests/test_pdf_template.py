@@ -0,0 +1,115 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+from reportlab.platypus import Paragraph, Spacer
+
+from backend import pdf
+
+
+# Mise en page des templates livrés figée (flowables ReportLab: texte, style,
+# tailles, espacements), ainsi que celle d'un template réduit rempli avec des
+# valeurs None, vides ou sur plusieurs lignes. Régénérer après un changement voulu:
+#   UPDATE_GOLDEN=1 python -m pytest tests/test_pdf_template.py
+
+GOLDEN_DIR = Path(__file__).parent / "golden"
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+
+VARIABLES = {
+    "{{Prénom}}": "Jean",
+    "{{Nom}}": "DUPONT",
+    "{{Date_de_naissance}}": "01/01/1990",
+    "{{Lieu de naissance}}": "Paris",
+    "{{Adresse}}": "1 rue <des> & Lilas",
+    "{{Nationalité}}": "Française",
+    "{{Numéro de secu}}": "190017512345678",
+    "{{Date_debut}}": "01/11/2026",
+    "{{Date_fin_periode_essai}}": "01/01/2027",
+}
+
+
+def _describe(flowable) -> list:
+    if isinstance(flowable, Spacer):
+        return ["spacer", flowable.height]
+    assert isinstance(flowable, Paragraph)
+    s = flowable.style
+    return ["paragraph", s.name, flowable.text, s.fontName, s.fontSize, s.leading, s.spaceBefore, s.spaceAfter, s.alignment]
+
+
+def _layout(text: str, variables: dict = VARIABLES) -> list:
+    return [_describe(f) for f in pdf._build_story(pdf._compile_template_text(text), variables)]
+
+
+def _check_golden(layout: list, golden: Path) -> None:
+    layout = json.loads(json.dumps(layout, ensure_ascii=False))
+    if os.getenv("UPDATE_GOLDEN"):
+        rows = ",\n".join(" " + json.dumps(row, ensure_ascii=False) for row in layout)
+        golden.write_text(f"[\n{rows}\n]\n", encoding="utf-8")
+    expected = json.loads(golden.read_text(encoding="utf-8"))
+    assert len(layout) == len(expected)
+    for i, (got, want) in enumerate(zip(layout, expected)):
+        assert got == want, f"flowable {i}"
+
+
+@pytest.mark.parametrize("store", ["AEJB", "JAB"])
+def test_template_layout_matches_golden(store):
+    text = (TEMPLATES_DIR / f"{store}_CDI_VENDEUR.txt").read_text(encoding="utf-8")
+    _check_golden(_layout(text), GOLDEN_DIR / f"{store}_CDI_VENDEUR.layout.json")
+
+
+# Lignes faites uniquement de balises, balises en milieu de ligne, dans un titre
+# d'article et une puce, balise inconnue, ligne de balises avant "d'une part,"
+EDGE_TEMPLATE = """CONTRAT DE TRAVAIL A DUREE INDETERMINEE A TEMPS COMPLET
+
+Entre les soussignés :
+La société X, au capital de 1000 euros
+d'une part,
+
+Et,
+{{Prénom}} {{Nom}}
+Demeurant au {{Adresse}}
+{{Adresse}}
+Né(e) le {{Date_de_naissance}} à {{Lieu de naissance}}
+{{Inconnue}}
+{{Nom}}
+d'une part,
+
+ARTICLE 1 – Engagement de {{Nom}}
+- poste de {{Nom}} au magasin
+Fin du contrat.
+"""
+
+EDGE_VARIABLES = {
+    # None: champ vide, jamais "None" ni la balise
+    "none": {"{{Prénom}}": None, "{{Nom}}": None, "{{Adresse}}": None,
+             "{{Date_de_naissance}}": None, "{{Lieu de naissance}}": "Paris"},
+    # Vide: une ligne de balises vide devient un saut de ligne (rien avant "d'une part,")
+    "empty": {"{{Prénom}}": "", "{{Nom}}": "", "{{Adresse}}": "  ",
+              "{{Date_de_naissance}}": "01/01/1990", "{{Lieu de naissance}}": ""},
+    # Plusieurs lignes: retours à la ligne dans le paragraphe, lignes vides ignorées
+    "multiline": {"{{Prénom}}": "Jean", "{{Nom}}": "DUPONT",
+                  "{{Adresse}}": "12 rue des Lilas\n\n  Bât. <B> & C  \r\n75011 Paris",
+                  "{{Date_de_naissance}}": "01/01/1990", "{{Lieu de naissance}}": "Paris"},
+}
+
+
+@pytest.mark.parametrize("case", sorted(EDGE_VARIABLES))
+def test_variable_edge_cases_match_golden(case):
+    _check_golden(_layout(EDGE_TEMPLATE, EDGE_VARIABLES[case]), GOLDEN_DIR / f"edge_{case}.layout.json")
+
+
+def test_none_and_empty_never_leave_markers():
+    for case in ("none", "empty"):
+        texts = [d[2] for d in _layout(EDGE_TEMPLATE, EDGE_VARIABLES[case]) if d[0] == "paragraph"]
+        assert not any("None" in t or "{{Nom}}" in t or "{{Adresse}}" in t for t in texts), case
+        # Balise inconnue des variables: laissée telle quelle
+        assert "{{Inconnue}}" in texts
+
+
+def test_blank_runs_before_dune_part():
+    # Longues séries de lignes vides: aucune ne produit d'espace avant "d'une part,"
+    text = "ENTRE LES SOUSSIGNES LA SOCIETE ET LE SALARIE\n" + "Société X\n" + "\n" * 500 + "d'une part,\n" + "\n" * 3 + "Et,\n"
+    kinds = [(d[0], d[1]) for d in _layout(text)]
+    assert kinds[:3] == [("paragraph", "CustomTitle"), ("spacer", 28), ("paragraph", "NormalTight")]
+    assert kinds[3] == ("paragraph", "Marker")
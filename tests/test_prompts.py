@@ -0,0 +1,43 @@
+import pytest
+
+from backend.prompts import PromptRegistry
+
+
+@pytest.fixture
+def prompts_dir(tmp_path):
+    (tmp_path / "id_card.prompt.md").write_text("v1", encoding="utf-8")
+    (tmp_path / "id_card.v2.prompt.md").write_text("v2", encoding="utf-8")
+    (tmp_path / "secu.prompt.md").write_text("secu", encoding="utf-8")
+    return tmp_path
+
+
+def test_highest_version_is_served(prompts_dir, monkeypatch):
+    monkeypatch.delenv("PROMPT_VERSIONS", raising=False)
+    registry = PromptRegistry(str(prompts_dir))
+    assert registry.text("id_card") == "v2"
+    assert registry.versions() == {"id_card": [1, 2], "secu": [1]}
+
+
+def test_pinned_version_is_served(prompts_dir, monkeypatch):
+    monkeypatch.setenv("PROMPT_VERSIONS", "id_card=1")
+    registry = PromptRegistry(str(prompts_dir))
+    assert registry.text("id_card") == "v1"
+    assert registry.get("id_card", 2).text == "v2"
+
+
+def test_pin_to_missing_version_fails_at_load(prompts_dir, monkeypatch):
+    monkeypatch.setenv("PROMPT_VERSIONS", "id_card=3,secu=1")
+    with pytest.raises(ValueError, match="id_card v3"):
+        PromptRegistry(str(prompts_dir))
+
+
+def test_reload_keeps_prompts_when_pinned_file_disappears(prompts_dir, monkeypatch):
+    monkeypatch.setenv("PROMPT_VERSIONS", "id_card=1")
+    registry = PromptRegistry(str(prompts_dir))
+    (prompts_dir / "id_card.prompt.md").unlink()
+
+    with pytest.raises(ValueError):
+        registry.reload()
+    assert registry.text("id_card") == "v1"
+    # Même état du dossier: pas de nouvelle tentative (ni de nouveau log) à chaque vérification
+    assert registry.reload() is False
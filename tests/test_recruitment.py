@@ -0,0 +1,117 @@
+import asyncio
+import json
+from types import SimpleNamespace as NS
+
+import pytest
+
+from backend import recruitment
+from backend.cv import get_cv_analyzer
+from backend.schemas import RescoreRequest
+
+
+# Critères envoyés par l'interface (frontend/index.html, getCriteriaConfig)
+UI_CRITERIA = {
+    "experience_alim_restauration": 3,
+    "experience_naturalia_monoprix": 2,
+    "francais_maternel": 1,
+    "fiabilite_tenure": 2,
+    "motivation_pertinence": 1,
+}
+
+
+def _candidate(nom, email, evaluations, score):
+    return {"nom": nom, "prenom": "A", "email": email, "telephone": None, "evaluations": evaluations, "score": score}
+
+
+SINGLE_RESPONSE = {
+    "role": "Vendeur polyvalent",
+    "criteres": UI_CRITERIA,
+    "candidats": [
+        _candidate("MARTIN", "m@example.com", {
+            "experience_alim_restauration": 0.2, "experience_naturalia_monoprix": 0.0,
+            "francais_maternel": 1.0, "fiabilite_tenure": 0.4, "motivation_pertinence": 0.5,
+        }, 9.0),
+        _candidate("DURAND", "d@example.com", {
+            "experience_alim_restauration": 0.9, "experience_naturalia_monoprix": 1.0,
+            "francais_maternel": 1.0, "fiabilite_tenure": 0.8, "motivation_pertinence": 0.7,
+        }, 1.0),
+        _candidate("PETIT", "p@example.com", {
+            "experience_alim_restauration": 0.6, "experience_naturalia_monoprix": 0.2,
+            "francais_maternel": 0.0, "fiabilite_tenure": 0.9, "motivation_pertinence": 0.9,
+        }, 5.0),
+    ],
+}
+
+
+class FakeCompletions:
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def create(self, **kwargs):
+        message = NS(content=json.dumps(self.payload))
+        return NS(choices=[NS(message=message)], usage=NS(prompt_tokens=10, completion_tokens=5))
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    a = get_cv_analyzer()
+    monkeypatch.setattr(a, "aclient", NS(chat=NS(completions=FakeCompletions(SINGLE_RESPONSE))))
+    return a
+
+
+def _files():
+    return [
+        {"filename": f"cv{i}.txt", "content": f"CV numero {i}".encode(), "mime": "text/plain"}
+        for i in range(3)
+    ]
+
+
+def test_single_mode_rescore_keeps_order(analyzer, db):
+    result = asyncio.run(recruitment.run_analysis(db, "Vendeur polyvalent", dict(UI_CRITERIA), _files(), mode="single"))
+    analyzed = [c["nom"] for c in result["candidats"]]
+    # Classement local (evaluations x coefficients), pas le score libre du modèle
+    assert analyzed == ["DURAND", "PETIT", "MARTIN"]
+    assert result["candidats"][0]["score"] == pytest.approx(8.0)
+
+    body = recruitment.rescore(RescoreRequest(batch_id=result["batch_id"], criteria=UI_CRITERIA), db=db)
+    assert [c["nom"] for c in body["candidats"]] == analyzed
+    assert [c["score"] for c in body["candidats"]] == [c["score"] for c in result["candidats"]]
+    # Des scores distincts: les critères de l'interface sont bien évalués
+    assert len({c["score"] for c in body["candidats"]}) == 3
+
+
+def test_single_mode_rescore_follows_coefficients(analyzer, db):
+    result = asyncio.run(recruitment.run_analysis(db, "Vendeur polyvalent", dict(UI_CRITERIA), _files(), mode="single"))
+    only_french = {k: 0 for k in UI_CRITERIA}
+    only_french["francais_maternel"] = 3
+    only_french["motivation_pertinence"] = 1
+
+    body = recruitment.rescore(RescoreRequest(batch_id=result["batch_id"], criteria=only_french), db=db)
+    assert [c["nom"] for c in body["candidats"]] == ["DURAND", "MARTIN", "PETIT"]
+
+
+class FakeExtractions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        header = json.loads(kwargs["messages"][1]["content"][0]["text"])
+        i = int(header["fichier"][2])
+        payload = {"nom": f"NOM{i}", "email": f"c{i}@example.com", "evaluations": {k: i / 4 for k in UI_CRITERIA}}
+        return NS(choices=[NS(message=NS(content=json.dumps(payload)))], usage=None)
+
+
+def test_batch_mode_reuses_saved_extractions(monkeypatch, db):
+    fake = FakeExtractions()
+    monkeypatch.setattr(get_cv_analyzer(), "aclient", NS(chat=NS(completions=fake)))
+
+    first = asyncio.run(recruitment.run_analysis(db, "Caissier", dict(UI_CRITERIA), _files(), mode="batch"))
+    assert [c["nom"] for c in first["candidats"]] == ["NOM2", "NOM1", "NOM0"]
+    assert fake.calls == 3
+
+    # Extractions relues en base: aucun nouvel appel au modèle
+    second = asyncio.run(recruitment.run_analysis(db, "Caissier", dict(UI_CRITERIA), _files(), mode="batch"))
+    assert fake.calls == 3
+    assert [c["nom"] for c in second["candidats"]] == ["NOM2", "NOM1", "NOM0"]
+    assert second["batch_id"] != first["batch_id"]
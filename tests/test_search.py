@@ -0,0 +1,77 @@
+import pytest
+
+from backend import search
+from backend.models import Contract
+from backend.search import search_filter
+
+
+NIR = "290017512345678"
+
+
+@pytest.fixture
+def contracts(db):
+    from backend.database import engine
+
+    search.ensure_search_index(engine)
+    assert search._backend == "sqlite"
+    rows = [
+        Contract(store="AEJB", prenom="Hélène", nom="Bézier", date_naissance="01/01/1990", lieu_naissance="Paris",
+                 adresse="12 rue de l'Église, Lyon", nationalite="Française", numero_secu="2 90 01 75 123 456 78",
+                 date_debut="01/09/2024"),
+        Contract(store="JAB", prenom="Marc", nom="Helmut", date_naissance="02/02/1985", lieu_naissance="Nice",
+                 adresse="3 avenue Foch, Nice", nationalite="Française", numero_secu="185022A12345612",
+                 date_debut="01/10/2024"),
+    ]
+    db.add_all(rows)
+    db.commit()
+    try:
+        yield rows
+    finally:
+        for r in rows:
+            db.delete(r)
+        db.commit()
+
+
+def _found(db, contracts, q):
+    ids = {c.id: c.nom for c in contracts}
+    return sorted(ids[c.id] for c in db.query(Contract).filter(search_filter(q)) if c.id in ids)
+
+
+@pytest.mark.parametrize("q", [NIR, "2 90 01 75 123 456 78", "2.90.01.75.123.456.78"])
+def test_full_nir_exact(db, contracts, q):
+    assert _found(db, contracts, q) == ["Bézier"]
+
+
+def test_full_nir_wrong_key_finds_nothing(db, contracts):
+    assert _found(db, contracts, NIR[:13] + "00") == []
+
+
+@pytest.mark.parametrize("q", [NIR[:13], "2 90 01 75 123 456", "1 85 02 2A 123 456"])
+def test_nir_without_key_is_prefix(db, contracts, q):
+    expected = ["Helmut"] if "2A" in q else ["Bézier"]
+    assert _found(db, contracts, q) == expected
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("helene", ["Bézier"]),
+    ("HÉLÈ", ["Bézier"]),
+    ("bez hel", ["Bézier"]),
+    ("hel", ["Bézier", "Helmut"]),
+    ("eglise", ["Bézier"]),
+    ("église lyon", ["Bézier"]),
+])
+def test_names_accent_insensitive_prefix(db, contracts, q, expected):
+    assert _found(db, contracts, q) == expected
+
+
+def test_postgres_nir_queries(monkeypatch):
+    monkeypatch.setattr(search, "_backend", "postgresql")
+
+    def sql(q):
+        clause = search_filter(q).right.element
+        return str(clause), clause.compile().params
+
+    exact_sql, params = sql("2 90 01 75 123 456 78")
+    assert "secu = :secu_q" in exact_sql and params["secu_q"] == NIR
+    prefix_sql, params = sql(NIR[:13])
+    assert "secu LIKE :secu_q || '%'" in prefix_sql and params["secu_q"] == NIR[:13]
@@ -0,0 +1,47 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from backend import settings
+from backend.settings import SettingsManager
+
+
+def _write(path, stores):
+    path.write_text(json.dumps({"stores": stores, "generated_dir": str(path.parent / "generated")}), encoding="utf-8")
+
+
+def _child(conn) -> None:
+    manager = settings.get_settings_manager()
+    conn.send((manager._settings is None, manager._thread is None, list(settings.get_settings().stores), manager._thread is not None))
+    conn.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "register_at_fork"), reason="fork indisponible")
+def test_forked_child_reloads_settings(tmp_path, monkeypatch):
+    cfg = tmp_path / "config.json"
+    _write(cfg, ["AEJB"])
+    manager = SettingsManager(str(cfg))
+    monkeypatch.setattr(settings, "_manager", manager)
+    monkeypatch.setattr(settings, "SETTINGS_RELOAD_INTERVAL", 60.0)
+    assert manager.get().stores == ("AEJB",)
+    manager.start_watcher(interval=60.0)
+    try:
+        # Modifié après le chargement du parent, avant le fork
+        _write(cfg, ["JAB"])
+        os.utime(cfg, ns=(1, 1))
+        ctx = multiprocessing.get_context("fork")
+        parent_conn, child_conn = ctx.Pipe()
+        p = ctx.Process(target=_child, args=(child_conn,))
+        p.start()
+        reset, no_thread, stores, watching = parent_conn.recv()
+        p.join(10)
+    finally:
+        manager.stop_watcher()
+
+    assert reset and no_thread
+    assert stores == ["JAB"]
+    assert watching
+    # Le parent garde sa configuration jusqu'à son propre rechargement
+    assert manager.get().stores == ("AEJB",)
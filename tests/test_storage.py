@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from backend import storage
+from backend.storage import SupabaseStorageClient
+
+
+# Serveur HTTP/1.1 local tenant lieu de Supabase Storage: enregistre chaque
+# requête (chemin, empreinte du corps, port client = connexion TCP) et répond
+# selon des règles par objet (503 pour les N premières tentatives, statut fixe).
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        server = self.server
+        body = self._read_body()
+        name = self.path.split("/storage/v1/object/", 1)[-1].split("/", 1)[-1]
+        with server.lock:
+            server.requests.append(SimpleNamespace(
+                name=name,
+                port=self.client_address[1],
+                size=len(body),
+                sha256=hashlib.sha256(body).hexdigest(),
+                headers=dict(self.headers),
+            ))
+            attempts = server.attempts[name] = server.attempts.get(name, 0) + 1
+        status = server.status.get(name, 200)
+        if attempts <= server.fail_first.get(name, 0):
+            status = 503
+        payload = b'{"Key": "ok"}' if status == 200 else b'{"error": "nope"}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            out = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return out
+                out += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+
+@pytest.fixture
+def server(monkeypatch):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    srv.lock = threading.Lock()
+    srv.requests, srv.attempts, srv.status, srv.fail_first = [], {}, {}, {}
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setenv("SUPABASE_URL", f"http://127.0.0.1:{srv.server_address[1]}")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE", "service-key")
+    monkeypatch.setenv("SUPABASE_BUCKET", "generated")
+    monkeypatch.setattr(storage, "STORAGE_RETRIES", 3)
+    monkeypatch.setattr(storage, "STORAGE_BACKOFF", 0.001)
+    storage.close_http_clients()
+    storage._async_client = None
+    try:
+        yield srv
+    finally:
+        storage.close_http_clients()
+        storage._async_client = None
+        srv.shutdown()
+        srv.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(storage, "time", SimpleNamespace(sleep=delays.append))
+    return delays
+
+
+def _run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await storage.aclose_http_clients()
+
+    return asyncio.run(main())
+
+
+# --- Reprises ---
+
+def test_retries_503_with_exponential_backoff(server, sleeps):
+    server.fail_first["a.pdf"] = 2
+    url = SupabaseStorageClient().upload_bytes("a.pdf", b"%PDF-1.4 data")
+
+    assert url.endswith("/storage/v1/object/public/generated/a.pdf")
+    assert server.attempts["a.pdf"] == 3
+    assert sleeps == [storage.STORAGE_BACKOFF, storage.STORAGE_BACKOFF * 2]
+    # Même corps à chaque tentative
+    assert len({r.sha256 for r in server.requests}) == 1
+
+
+def test_gives_up_after_retries(server, sleeps):
+    server.fail_first["b.pdf"] = 100
+    with pytest.raises(RuntimeError, match="503"):
+        SupabaseStorageClient().upload_bytes("b.pdf", b"data")
+    assert server.attempts["b.pdf"] == storage.STORAGE_RETRIES + 1
+    assert len(sleeps) == storage.STORAGE_RETRIES
+
+
+def test_client_errors_are_not_retried(server, sleeps):
+    server.status["c.pdf"] = 400
+    with pytest.raises(RuntimeError, match="400"):
+        SupabaseStorageClient().upload_bytes("c.pdf", b"data")
+    assert server.attempts["c.pdf"] == 1
+    assert sleeps == []
+
+
+def test_async_retries_503(server):
+    server.fail_first["a.pdf"] = 2
+    url = _run(SupabaseStorageClient().aupload_bytes("a.pdf", b"%PDF-1.4 data"))
+    assert url.endswith("/generated/a.pdf")
+    assert server.attempts["a.pdf"] == 3
+
+
+# --- Upload en flux ---
+
+def _big_file(tmp_path):
+    # Plusieurs morceaux de STORAGE_CHUNK_SIZE, dernier morceau partiel
+    data = bytes(range(256)) * (storage.STORAGE_CHUNK_SIZE * 3 // 256) + b"fin"
+    path = tmp_path / "contrat.pdf"
+    path.write_bytes(data)
+    return path, hashlib.sha256(data).hexdigest(), len(data)
+
+
+def test_streamed_file_upload_integrity(server, sleeps, tmp_path):
+    path, digest, size = _big_file(tmp_path)
+    server.fail_first["contrat.pdf"] = 1
+    SupabaseStorageClient().upload_file(path)
+
+    # Fichier relu depuis le début à la reprise: deux corps identiques et complets
+    assert [(r.size, r.sha256) for r in server.requests] == [(size, digest)] * 2
+    assert server.requests[-1].headers["Content-Length"] == str(size)
+
+
+def test_async_streamed_file_upload_integrity(server, tmp_path):
+    path, digest, size = _big_file(tmp_path)
+    server.fail_first["contrat.pdf"] = 1
+    _run(SupabaseStorageClient().aupload_file(path))
+    assert [(r.size, r.sha256) for r in server.requests] == [(size, digest)] * 2
+
+
+# --- Connexions ---
+
+def test_sync_uploads_reuse_connection(server):
+    client = SupabaseStorageClient()
+    for i in range(5):
+        client.upload_bytes(f"doc{i}.pdf", b"x" * 100)
+    assert len(server.requests) == 5
+    assert len({r.port for r in server.requests}) == 1
+
+
+def test_async_uploads_reuse_connection(server):
+    client = SupabaseStorageClient()
+
+    async def sequential():
+        for i in range(5):
+            await client.aupload_bytes(f"doc{i}.pdf", b"x" * 100)
+
+    _run(sequential())
+    assert len({r.port for r in server.requests}) == 1
+
+
+# --- Lots ---
+
+def _batch(tmp_path):
+    return [
+        ("ok1.pdf", b"un"),
+        ("bad.pdf", b"deux"),
+        ("ok2.pdf", tmp_path / "absent.pdf"),
+        ("ok3.pdf", b"quatre"),
+    ]
+
+
+def _check_pairs(results):
+    assert len(results) == 4
+    (url1, err1), (url2, err2), (url3, err3), (url4, err4) = results
+    assert url1.endswith("/ok1.pdf") and err1 is None
+    assert url2 is None and "400" in err2
+    assert url3 is None and "absent.pdf" in err3
+    assert url4.endswith("/ok3.pdf") and err4 is None
+
+
+def test_upload_many_pairs_results_with_items(server, sleeps, tmp_path):
+    server.status["bad.pdf"] = 400
+    _check_pairs(SupabaseStorageClient().upload_many(_batch(tmp_path), concurrency=4))
+
+
+def test_aupload_many_pairs_results_with_items(server, tmp_path):
+    server.status["bad.pdf"] = 400
+    _check_pairs(_run(SupabaseStorageClient().aupload_many(_batch(tmp_path), concurrency=4)))